@@ -1,18 +1,14 @@
 #2 body 2D gravitation simulator with verlet integration
 import numpy as np
-import pygame
-from pygame import Vector2
+import os
 import sys
+from bodystore import Body, BodyStore
+import checkpoint
+import integrators
+import nbody
+import trajectory
 
-class Body:
-    def __init__(self, mass, position, velocity, color):
-        self.mass = mass
-        self.position = np.array(position, dtype=float)
-        self.velocity = np.array(velocity, dtype=float)
-        self.acceleration = np.array([0.0, 0.0])
-        self.color = color
-
-class GravitationalSystem:
+class GravitationalSystem(nbody.GravitationalSystem):
     G = 6.67428e-11 
     def __init__(self):
         au = 1.496e11
@@ -21,46 +17,19 @@ class GravitationalSystem:
         earthmass = 5.9722e24
         p_earthvel = 3e4 #velocity at perihelion = 30,000m/s
         #e.g. two bodies - earth and sun
-        self.bodies = [
+        self.bodies = BodyStore([
             #Body(2.0e30, [0, 0], [0, 0], (255, 255, 0)),  # static sun
             Body(sunmass, [0, 0], [0,0], (255, 255, 0)),  # sun
             Body(earthmass, [perihelion, 0], [0, p_earthvel], (0, 255, 255))  # planet 
             #Body(1.0e30, [1.5e11, 0], [0, 15000], (0, 255, 255))  # sun2
-        ]
+        ])
         # SIMULATION PARAMS
         self.dt = 360000  # time step (10 hour)
         self.scale = 1e9  # pixels per billion m
+        self.integrator = integrators.VelocityVerlet(self.calculate_acceleration)
         
-    def calculate_acceleration(self, body1, body2):
-        r = body2.position - body1.position
-        r_mag = np.linalg.norm(r)
-        
-        force_mag = self.G * body1.mass * body2.mass / (r_mag ** 2)
-        force = force_mag * r / r_mag
-        
-        acc1 = force / body1.mass
-        acc2 = -force / body2.mass
-        
-        return acc1, acc2
-    
-    def verlet_step(self):
-        acc1, acc2 = self.calculate_acceleration(self.bodies[0], self.bodies[1])
-        self.bodies[0].acceleration = acc1
-        self.bodies[1].acceleration = acc2
-        
-        for body in self.bodies:
-            body.position += body.velocity * self.dt + 0.5 * body.acceleration * self.dt**2
-            
-            old_acc = body.acceleration.copy()
-            
-            acc1, acc2 = self.calculate_acceleration(self.bodies[0], self.bodies[1])
-            self.bodies[0].acceleration = acc1
-            self.bodies[1].acceleration = acc2
-            
-            body.velocity += 0.5 * (old_acc + body.acceleration) * self.dt
-
 class Simulator:
-    def __init__(self, width=800, height=600):
+    def __init__(self, width=800, height=600, threaded=False, checkpoint_path=None, replay_path=None):
         pygame.init()
         self.width = width
         self.height = height
@@ -68,37 +37,69 @@ class Simulator:
         pygame.display.set_caption("Two-Body Gravitational Simulation")
         
         self.system = GravitationalSystem()
-        self.clock = pygame.time.Clock()
+        # carry on from a checkpoint (see checkpoint.py) if there is one, saved
+        # every minute and on quit
+        self.autosave = checkpoint.Autosave(checkpoint_path) if checkpoint_path and not replay_path else None
+        if self.autosave and os.path.exists(checkpoint_path):
+            checkpoint.restore(self.system, checkpoint_path)
+        # the old pace of one 10 hour step per frame at 60 fps, now independent of the
+        # frame rate: bodies are drawn between steps (see scheduler.FrameScheduler)
+        # threaded: the physics runs on its own thread at the same pace, see worker.PhysicsWorker
+        if replay_path:
+            # play a recorded run back instead (see replay.Replay), nothing is integrated
+            self.scheduler = replay.Replay(trajectory.Trajectory(replay_path), fps=60)
+        elif threaded:
+            self.scheduler = worker.PhysicsWorker(self.system, fps=60, pace=60 * self.system.dt).start()
+        else:
+            self.scheduler = scheduler.FrameScheduler(fps=60, pace=60 * self.system.dt)
+        self.view = render.Camera(width, height, self.system.scale)
+        self.sprites = render.BodySprites(self.body_radii)
         
-    def world_to_screen(self, position):
-        # Convert world coordinates to screen coordinates
-        screen_x = position[0] / self.system.scale + self.width // 2
-        screen_y = position[1] / self.system.scale + self.height // 2
-        return int(screen_x), int(screen_y)
+    def world_to_screen(self, positions):
+        # world coordinates -> integer screen coordinates, a whole (N,3) array at once
+        return self.view.to_screen(positions)
+
+    def body_radii(self, masses):
+        # Size based on mass (logarithmic scale)
+        return (np.log10(masses) - 20).astype(int)
     
     def run(self):
         while True:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    self.scheduler.stop()
+                    if self.autosave:
+                        self.autosave.save(self.system)
                     pygame.quit()
                     sys.exit()
+                self.view.handle(event)
+                self.scheduler.handle(event)
             
             # Physics update
-            self.system.verlet_step()
+            # what to draw: positions (between the last two steps when paced), trails, HUD values
+            if self.autosave and self.autosave.due():
+                with self.scheduler.paused():
+                    self.autosave.save(self.system)
+            frame = self.scheduler.frame(self.system)
+            self.view.update(self.system.bodies, frame.position)
             
             # Drawing
             self.screen.fill((0, 0, 0))
             
             # Draw bodies
-            for body in self.system.bodies:
-                pos = self.world_to_screen(body.position)
-                # Size based on mass (logarithmic scale)
-                radius = int(np.log10(body.mass) - 20)
-                pygame.draw.circle(self.screen, body.color, pos, radius)
+            self.sprites.draw(self.screen, self.view, self.system.bodies, frame.position)
             
             pygame.display.flip()
-            self.clock.tick(60)
 
 if __name__ == "__main__":
-    sim = Simulator()
+    # the window's modules are only loaded here, importing the script for its
+    # GravitationalSystem (headless.py, ensemble.py) never touches pygame
+    import cli
+    import pygame
+    import render
+    import replay
+    import scheduler
+    import worker
+    args = cli.parser("2 body 2D gravitation simulator").parse_args()
+    sim = Simulator(threaded=args.threaded, checkpoint_path=args.checkpoint, replay_path=args.replay)
     sim.run()
@@ -0,0 +1,180 @@
+#barnes-hut tree gravity
+#the tree is rebuilt every call from flat (N,d) position and (N,) mass arrays:
+#bodies are sorted along a morton (z-order) curve so every cell is a
+#contiguous run of the sorted arrays, and both the build and the walk work
+#on whole levels / whole frontiers of (target, cell) pairs at once
+#works for d = 2 (quadtree) and d = 3 (octree)
+import numpy as np
+
+# bits per axis of the morton grid
+LEVELS = {2: 31, 3: 21}
+# targets walked together, bounds the size of the interaction frontier
+TARGET_CHUNK = 2048
+
+def _morton(q, levels):
+    codes = np.zeros(len(q), dtype=np.uint64)
+    dim = q.shape[1]
+    for bit in range(levels):
+        for axis in range(dim):
+            codes |= ((q[:, axis] >> np.uint64(bit)) & np.uint64(1)) << np.uint64(dim * bit + axis)
+    return codes
+
+def _expand(first, count):
+    # item ranges [first, first+count) flattened, with the owning row of each item
+    owner = np.repeat(np.arange(len(first)), count)
+    offsets = np.arange(len(owner)) - np.repeat(np.cumsum(count) - count, count)
+    return owner, np.repeat(first, count) + offsets
+
+def _segment_reduce(ufunc, values, start, count):
+    # ufunc over values[start:start+count] for every segment (segments may have gaps)
+    padded = np.concatenate([values, values[:1]])
+    bounds = np.empty(2 * len(start), dtype=np.intp)
+    bounds[0::2] = start
+    bounds[1::2] = start + count
+    return ufunc.reduceat(padded, bounds, axis=0)[0::2]
+
+class Tree:
+    def __init__(self, positions, masses, leaf_size=8):
+        positions = np.ascontiguousarray(positions, dtype=float)
+        masses = np.asarray(masses, dtype=float)
+        n, dim = positions.shape
+        levels = LEVELS[dim]
+        self.dim = dim
+        self.levels = levels
+
+        # root cell: the bounding cube of all bodies
+        lo = positions.min(axis=0)
+        width = float(np.max(positions.max(axis=0) - lo))
+        if width == 0.0:
+            width = 1.0
+        width *= 1.0 + 1e-12
+        self.lo = lo
+        self.width = width
+        cells = 1 << levels
+        q = np.minimum((positions - lo) / width * cells, cells - 1).astype(np.uint64)
+
+        order = np.argsort(_morton(q, levels), kind="stable")
+        self.order = order
+        self.positions = positions[order]
+        self.masses = masses[order]
+        self.q = q[order]
+        moments = self.masses[:, np.newaxis] * self.positions
+
+        # build level by level, only bodies in cells that still need
+        # splitting take part in the next level
+        starts, counts, level_of = [], [], []
+        active = np.arange(n)
+        for level in range(levels + 1):
+            if len(active) == 0:
+                break
+            shift = np.uint64(levels - level)
+            cell = self.q[active] >> shift
+            new = np.ones(len(active), dtype=bool)
+            new[1:] = np.any(cell[1:] != cell[:-1], axis=1) | (np.diff(active) != 1)
+            first = np.flatnonzero(new)
+            count = np.diff(np.append(first, len(active)))
+            starts.append(active[first])
+            counts.append(count)
+            level_of.append(np.full(len(first), level))
+            split = count > leaf_size if level < levels else np.zeros(len(count), dtype=bool)
+            active = active[np.repeat(split, count)]
+
+        self.start = np.concatenate(starts)
+        self.count = np.concatenate(counts)
+        self.level = np.concatenate(level_of)
+        self.leaf = np.ones(len(self.start), dtype=bool)
+        self.child_first = np.zeros(len(self.start), dtype=np.intp)
+        self.child_count = np.zeros(len(self.start), dtype=np.intp)
+        offset = 0
+        for parent, child in zip(starts[:-1], starts[1:]):
+            rows = slice(offset, offset + len(parent))
+            parent_end = parent + self.count[rows]
+            first = np.searchsorted(child, parent)
+            self.child_first[rows] = offset + len(parent) + first
+            self.child_count[rows] = np.searchsorted(child, parent_end) - first
+            self.leaf[rows] = self.child_count[rows] == 0
+            offset += len(parent)
+
+        self.mass = _segment_reduce(np.add, self.masses, self.start, self.count)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.com = _segment_reduce(np.add, moments, self.start, self.count) / self.mass[:, np.newaxis]
+        # massless cells pull on nothing, park their com anywhere finite
+        self.com[self.mass == 0] = self.positions[self.start[self.mass == 0]]
+        self.size = width / (1 << self.level).astype(float)
+        self.shift = (levels - self.level).astype(np.uint64)
+        self.cell = _segment_reduce(np.minimum, self.q, self.start, self.count) >> self.shift[:, np.newaxis]
+
+    def __len__(self):
+        return len(self.start)
+
+    def accelerations(self, G, theta=0.5, index=None):
+        # index: only the accelerations of those (distinct) bodies, (k,d) in that order
+        n, dim = self.positions.shape
+        if index is not None:
+            # the walk takes targets in tree order
+            rank = np.empty(n, dtype=np.intp)
+            rank[self.order] = np.arange(n)
+            targets = np.sort(rank[index])
+            acc = np.zeros((len(targets), dim))
+            for chunk in range(0, len(targets), TARGET_CHUNK):
+                stop = min(chunk + TARGET_CHUNK, len(targets))
+                self._walk(targets[chunk:stop], acc[chunk:stop], theta)
+            acc *= G
+            return acc[np.searchsorted(targets, rank[index])]
+        acc = np.zeros((n, dim))
+        for chunk in range(0, n, TARGET_CHUNK):
+            stop = min(chunk + TARGET_CHUNK, n)
+            self._walk(np.arange(chunk, stop), acc[chunk:stop], theta)
+        acc *= G
+        out = np.empty_like(acc)
+        out[self.order] = acc
+        return out
+
+    def _walk(self, targets, acc, theta):
+        # acc holds one row per target (sorted, in tree order), a contiguous
+        # run of targets is looked up by offset
+        theta2 = theta * theta
+        contiguous = targets[-1] - targets[0] == len(targets) - 1
+
+        def row(t):
+            return t - targets[0] if contiguous else np.searchsorted(targets, t)
+
+        t = targets
+        node = np.zeros(len(t), dtype=np.intp)
+        while len(t):
+            r = self.com[node] - self.positions[t]
+            r2 = np.einsum('ij,ij->i', r, r)
+            # a cell is far enough for its monopole if size/distance < theta and
+            # it does not contain the target (only possible for theta > 1/sqrt(d))
+            far = self.size[node] ** 2 < theta2 * r2
+            if theta2 * self.dim > 1:
+                candidates = np.flatnonzero(far)
+                shift = self.shift[node[candidates]][:, np.newaxis]
+                inside = np.all((self.q[t[candidates]] >> shift) == self.cell[node[candidates]], axis=1)
+                far[candidates[inside]] = False
+            if far.any():
+                self._accumulate(acc, row(t[far]), r[far], r2[far], self.mass[node[far]])
+
+            near = ~far
+            leaf = near & self.leaf[node]
+            if leaf.any():
+                owner, body = _expand(self.start[node[leaf]], self.count[node[leaf]])
+                lt = t[leaf][owner]
+                keep = body != lt
+                lt, body = lt[keep], body[keep]
+                rb = self.positions[body] - self.positions[lt]
+                self._accumulate(acc, row(lt), rb, np.einsum('ij,ij->i', rb, rb), self.masses[body])
+
+            split = near & ~self.leaf[node]
+            owner, node = _expand(self.child_first[node[split]], self.child_count[node[split]])
+            t = t[split][owner]
+
+    def _accumulate(self, acc, t, r, r2, mass):
+        weights = mass / (r2 * np.sqrt(r2))
+        for axis in range(acc.shape[1]):
+            acc[:, axis] += np.bincount(t, weights * r[:, axis], minlength=len(acc))
+
+def accelerations(positions, masses, G, theta=0.5, leaf_size=8, index=None):
+    # positions (N,d), masses (N,) -> approximate accelerations (N,d), or (k,d)
+    # of just the bodies in index
+    return Tree(positions, masses, leaf_size).accelerations(G, theta, index)
@@ -0,0 +1,58 @@
+#barnes-hut vs direct sum: cost and accuracy against the opening angle theta
+#scenario: sun + 8 planets + main-belt and kuiper-belt objects
+#usage: python bench_barnes_hut.py [max_n]
+import sys
+import time
+import numpy as np
+import barnes_hut
+import gravity
+
+G = 6.67430e-11
+AU = 1.496e11
+# the direct-sum reference is never run on all n targets: the error is measured
+# on up to SAMPLE randomly picked bodies, no more than DIRECT_PAIRS pairs in all,
+# and the direct time is extrapolated from them
+SAMPLE = 500
+DIRECT_PAIRS = 10**7
+
+def belt_system(n, rng):
+    planets = [
+        (1.989e30, 0.0), (0.330e24, 0.387), (4.87e24, 0.723), (5.9722e24, 1.0), (0.64169e24, 1.524),
+        (1.89813e27, 5.2), (5.6832e26, 9.58), (86.811e24, 19.2), (1.02409e26, 30.1),
+    ]
+    n_small = max(0, n - len(planets))
+    n_main = n_small * 2 // 3
+    radius = np.concatenate([
+        [a * AU for _, a in planets],
+        rng.uniform(2.2, 3.3, n_main) * AU,
+        rng.uniform(30.0, 50.0, n_small - n_main) * AU,
+    ])
+    phase = rng.uniform(0, 2 * np.pi, len(radius))
+    positions = np.stack([radius * np.cos(phase), radius * np.sin(phase), rng.normal(0, 0.05, len(radius)) * radius], axis=1)
+    masses = np.concatenate([[m for m, _ in planets], 10 ** rng.uniform(12, 20, n_small)])
+    return positions[:n], masses[:n]
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+def main():
+    max_n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = np.random.default_rng(7)
+    print(f"{'N':>7} {'theta':>6} {'time (ms)':>10} {'vs direct':>10} {'median err':>11} {'max err':>9}")
+    for n in [n for n in (1000, 10000, 100000) if n <= max_n]:
+        positions, masses = belt_system(n, rng)
+        sample = rng.choice(n, min(SAMPLE, n, max(1, DIRECT_PAIRS // n)), replace=False)
+        # direct sum on the sample, scaled up to the cost of all n targets
+        exact, t_exact = timed(gravity.accelerations_at, positions[sample], positions, masses, G)
+        t_direct = t_exact * n / len(sample)
+        print(f"{n:>7} {'direct':>6} {t_direct*1e3:>10.1f} {'1.0x':>10} {'-':>11} {'-':>9}"
+              f"  (estimated from {len(sample)} targets)")
+        for theta in (0.3, 0.5, 0.7, 1.0):
+            approx, t = timed(barnes_hut.accelerations, positions, masses, G, theta)
+            err = np.linalg.norm(approx[sample] - exact, axis=1) / np.linalg.norm(exact, axis=1)
+            print(f"{n:>7} {theta:>6} {t*1e3:>10.1f} {t_direct/t:>9.1f}x {np.median(err):>11.2e} {err.max():>9.2e}")
+
+if __name__ == "__main__":
+    main()
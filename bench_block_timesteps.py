@@ -0,0 +1,76 @@
+#block (individual) timesteps vs one global dt on the 15-body full.py scenario
+#full.py starts Phobos 6 km and Deimos 2.3e27 m from Mars (typos for 9.376e6 m and
+#2.3458e7 m), which makes the moons meaningless; the benchmark puts them on
+#their real orbits so Phobos really is the fastest body in the system
+#usage: python bench_block_timesteps.py [days]
+import contextlib
+import io
+import sys
+import time
+import numpy as np
+import full
+import integrators
+
+DAY = 86400.0
+# block length: every body is in sync once per block
+BLOCK = 4 * DAY
+
+def build():
+    system = full.GravitationalSystem()
+    bodies = system.bodies
+    mars = bodies.position[5].copy()
+    bodies[6].position = mars + [9.376e6, 0, 0]
+    bodies[7].position = mars + [2.3458e7, 0, 0]
+    # keep the integrator from reusing anything computed before the move
+    system.integrator.invalidate()
+    return system
+
+def run(system, days, dt):
+    system.dt = dt
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        system.run(until=days * DAY - 1e-6)
+    return time.perf_counter() - t0
+
+def relative_errors(system, reference):
+    # position error of each body relative to its distance from the body that
+    # pulls on it hardest (the sun for planets, the planet for moons)
+    pos, ref = system.bodies.position, reference.bodies.position
+    mass = reference.bodies.mass
+    r = ref[np.newaxis, :, :] - ref[:, np.newaxis, :]
+    d = np.linalg.norm(r, axis=2)
+    np.fill_diagonal(d, np.inf)
+    primary = np.argmax(mass / d**2, axis=1)
+    return np.linalg.norm(pos - ref, axis=1) / d[np.arange(len(ref)), primary]
+
+def main():
+    days = float(sys.argv[1]) if len(sys.argv) > 1 else 8.0
+    names = ["sun", "earth", "moon", "mercury", "venus", "mars", "phobos", "deimos", "jupiter",
+             "europa", "ganymede", "io", "saturn", "uranus", "neptune"]
+
+    # reference: global dt far below anything tested
+    reference = build()
+    t_ref = run(reference, days, 5.0)
+    print(f"reference: global dt 5 s, {reference.integrator.force_evaluations * len(reference.bodies)} body evaluations, {t_ref:.1f} s")
+
+    print(f"{'scheme':<28} {'body evals':>11} {'saved':>7} {'max rel err':>12} {'worst body':>10} {'time (s)':>9}")
+    for tolerance in (1e-3, 1e-4, 1e-5):
+        block = build()
+        block.integrator = integrators.BlockTimestep(block.calculate_acceleration_on, block.calculate_timescales,
+                                                     tolerance=tolerance)
+        t_block = run(block, days, BLOCK)
+        err = relative_errors(block, reference)
+        evals = block.integrator.body_evaluations
+        print(f"{'block tol=%g' % tolerance:<28} {evals:>11} {'':>7} {err.max():>12.2e} {names[err.argmax()]:>10} {t_block:>9.2f}")
+        print("    levels:", ", ".join(f"{name} {level}" for name, level in zip(names, block.integrator.levels)))
+
+        # global dt equal to the finest step the block scheme needed
+        finest = BLOCK / 2 ** int(block.integrator.levels.max())
+        glob = build()
+        t_glob = run(glob, days, finest)
+        err_glob = relative_errors(glob, reference)
+        evals_glob = glob.integrator.force_evaluations * len(glob.bodies)
+        print(f"{'global dt=%.0f s' % finest:<28} {evals_glob:>11} {1 - evals / evals_glob:>6.0%} {err_glob.max():>12.2e} {names[err_glob.argmax()]:>10} {t_glob:>9.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#proper-time clocks: the old per-body loop (float128 lorentz factor, special
+#relativity only) against clocks.ProperTime for thousands of clock particles
+#around the sun, then the accuracy of the mercury-like "observer - clock"
+#difference over a billion seconds: read off a float64 proper time (t - tau),
+#summed naively, and compensated (ProperTime.lag), against an exact sum
+#usage: python bench_clocks.py
+import math
+import numpy as np
+import clocks
+import gravity
+from bench_gravity import best_time
+
+G = 6.6743e-11
+M_SUN = 1.989e30
+# a billion seconds in steps of 1e4 s
+DT = 1e4
+STEPS = 100000
+
+def old_loop(times, velocities, dt, c=clocks.C):
+    # the old time_dilation_sim1.verlet_step clock update, body 0 at rest
+    for i in range(len(times)):
+        if i != 0:
+            vel_mag = np.linalg.norm(velocities[i])
+            lorentz_factor = 1.0 / np.sqrt((1.0 - (vel_mag / c) ** 2), dtype=np.float128)
+            times[i] += dt / lorentz_factor
+        else:
+            times[i] += dt
+
+def particles(m, rng):
+    # the sun and m clocks on circular orbits between 0.3 and 5 au
+    radius = rng.uniform(4.5e10, 7.5e11, m)
+    angle = rng.uniform(0, 2 * np.pi, m)
+    speed = np.sqrt(G * M_SUN / radius)
+    positions = np.zeros((m + 1, 3))
+    velocities = np.zeros((m + 1, 3))
+    positions[1:, 0], positions[1:, 1] = radius * np.cos(angle), radius * np.sin(angle)
+    velocities[1:, 0], velocities[1:, 1] = -speed * np.sin(angle), speed * np.cos(angle)
+    return positions, velocities
+
+def batched(proper, positions, velocities, masses):
+    speed2 = np.einsum('ij,ij->i', velocities, velocities)
+    proper.advance(DT, speed2, gravity.potentials_at(positions, positions[:1], masses[:1], G))
+
+def speed():
+    rng = np.random.default_rng(1)
+    print(f"{'clocks':>7} {'old loop (ms)':>14} {'ProperTime (ms)':>16} {'speedup':>8}")
+    for m in [2, 100, 1000, 10000, 100000]:
+        positions, velocities = particles(m, rng)
+        masses = np.zeros(m + 1)
+        masses[0] = M_SUN
+        proper = clocks.ProperTime(m + 1)
+        new = best_time(batched, proper, positions, velocities, masses)
+        if m <= 10000:
+            times = np.zeros(m + 1, dtype=np.float128)
+            old = best_time(old_loop, times, velocities, DT)
+            print(f"{m:>7} {old * 1e3:>14.3f} {new * 1e3:>16.3f} {old / new:>7.1f}x")
+        else:
+            print(f"{m:>7} {'':>14} {new * 1e3:>16.3f}")
+
+def accuracy():
+    # a mercury-like clock: the rate follows an eccentric orbit, 88 day period
+    phase = 2 * np.pi * DT * np.arange(STEPS + 1) / (88 * 86400)
+    r = 5.79e10 * (1 - 0.2056**2) / (1 + 0.2056 * np.cos(phase))
+    speed2 = G * M_SUN * (2 / r - 1 / 5.79e10)
+    potential = -G * M_SUN / r
+    proper = clocks.ProperTime(1)
+    proper.start(speed2[:1], potential[:1])
+    tau = 0.0
+    naive = 0.0
+    lost = []
+    deficit = proper.rate_deficit(speed2, potential)
+    for k in range(1, STEPS + 1):
+        proper.advance(DT, speed2[k:k + 1], potential[k:k + 1])
+        step = 0.5 * (deficit[k - 1] + deficit[k]) * DT
+        lost.append(step)
+        naive += step
+        tau += DT - step
+    exact = math.fsum(lost)
+    t = STEPS * DT
+    print(f"observer - mercury after {t:.0e} s: exact {exact:.12f} s")
+    for name, value in (("t - tau, float64", t - tau), ("naive float64 sum", naive),
+                        ("ProperTime.lag (compensated)", proper.lag[0])):
+        print(f"  {name:>30}: error {abs(value - exact):.2e} s")
+
+def main():
+    speed()
+    accuracy()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#scaling benchmark: python pair loop vs vectorized all-pairs kernel
+#usage: python bench_gravity.py [max_loop_n]
+import sys
+import time
+import numpy as np
+import gravity
+
+G = 6.67430e-11
+
+def loop_accelerations(positions, masses, G):
+    # the original GravitationalSystem.calculate_acceleration, kept as the reference
+    accelerations = [np.zeros(positions.shape[1]) for _ in masses]
+    for i in range(len(masses)):
+        for j in range(i+1, len(masses)):
+            r = positions[j] - positions[i]
+            r_mag = np.linalg.norm(r)
+            force_mag = G * masses[i] * masses[j] / (r_mag ** 2)
+            force = force_mag * r / r_mag
+            accelerations[i] += force / masses[i]
+            accelerations[j] -= force / masses[j]
+    return np.array(accelerations)
+
+def random_system(n, rng):
+    # sun at the origin plus n-1 bodies scattered through a 5 au disc
+    positions = rng.uniform(-7.5e11, 7.5e11, (n, 3))
+    positions[:, 2] *= 0.05
+    positions[0] = 0
+    masses = 10 ** rng.uniform(15, 27, n)
+    masses[0] = 1.989e30
+    return positions, masses
+
+def best_time(fn, *args, min_time=0.2):
+    best = np.inf
+    elapsed = 0.0
+    runs = 0
+    while elapsed < min_time or runs < 3:
+        t0 = time.perf_counter()
+        fn(*args)
+        t = time.perf_counter() - t0
+        best = min(best, t)
+        elapsed += t
+        runs += 1
+    return best
+
+def main():
+    max_loop_n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rng = np.random.default_rng(42)
+    print(f"{'N':>6} {'loop (ms)':>12} {'kernel (ms)':>12} {'speedup':>9} {'max rel err':>12}")
+    for n in [15, 30, 100, 300, 500, 1000, 2000]:
+        positions, masses = random_system(n, rng)
+        fast = gravity.accelerations(positions, masses, G)
+        t_fast = best_time(gravity.accelerations, positions, masses, G)
+        if n <= max_loop_n:
+            ref = loop_accelerations(positions, masses, G)
+            err = np.max(np.linalg.norm(fast - ref, axis=1) / np.linalg.norm(ref, axis=1))
+            t_loop = best_time(loop_accelerations, positions, masses, G, min_time=0)
+            print(f"{n:>6} {t_loop*1e3:>12.3f} {t_fast*1e3:>12.3f} {t_loop/t_fast:>8.1f}x {err:>12.2e}")
+        else:
+            print(f"{n:>6} {'-':>12} {t_fast*1e3:>12.3f} {'-':>9} {'-':>12}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#energy error vs wall time for every fixed-step integrator
+#scenario: full.py's sun and eight planets (moons removed) over two years
+#usage: python bench_integrators.py [--plot out.png]
+import argparse
+import contextlib
+import io
+import time
+import numpy as np
+import full
+import integrators
+
+DAY = 86400.0
+SPAN = 2 * 365.25 * DAY
+MOONS = (2, 6, 7, 9, 10, 11)
+
+def build(name, dt):
+    system = full.GravitationalSystem()
+    for moon in [system.bodies[index] for index in MOONS]:
+        system.bodies.remove(moon)
+    system.use_integrator(name)
+    system.dt = dt
+    return system
+
+def measure(name, dt):
+    system = build(name, dt)
+    energy0 = system.total_energy()
+    worst = [0.0]
+
+    def check(system):
+        worst[0] = max(worst[0], abs(system.total_energy() / energy0 - 1.0))
+
+    # sample the energy about 50 times over the run
+    every = max(1, int(SPAN / dt) // 50)
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        system.run(until=SPAN - 1e-6, callback=check, every=every)
+    elapsed = time.perf_counter() - t0
+    check(system)
+    return elapsed, worst[0], system.integrator.force_evaluations
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plot", help="save an energy error vs wall time plot here (needs matplotlib)")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'integrator':<12} {'dt (days)':>9} {'evals':>7} {'time (s)':>9} {'max |dE/E|':>11}")
+    for name in integrators.INTEGRATORS:
+        results[name] = []
+        for dt_days in (8, 4, 2, 1, 0.5, 0.25):
+            elapsed, error, evals = measure(name, dt_days * DAY)
+            results[name].append((elapsed, error))
+            print(f"{name:<12} {dt_days:>9g} {evals:>7} {elapsed:>9.3f} {error:>11.2e}")
+
+    # cheapest integrator that meets each tolerance
+    print()
+    for tolerance in (1e-6, 1e-8, 1e-10, 1e-12):
+        options = [(elapsed, name) for name, runs in results.items() for elapsed, error in runs if error <= tolerance]
+        if options:
+            elapsed, name = min(options)
+            print(f"|dE/E| <= {tolerance:g}: {name} ({elapsed:.3f} s)")
+        else:
+            print(f"|dE/E| <= {tolerance:g}: none of the tested steps")
+
+    if args.plot:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        for name, runs in results.items():
+            elapsed, error = zip(*runs)
+            plt.loglog(elapsed, np.maximum(error, 1e-16), "o-", label=name)
+        plt.xlabel("wall time (s)")
+        plt.ylabel("max |dE/E|")
+        plt.legend()
+        plt.savefig(args.plot)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#cost of the first post-newtonian (EIH) correction: gravity.post_newtonian
+#against the newtonian kernel alone, with every body relativistic and with a
+#tenth of them, plus nbodyv_general_rel_on's old per-pair loop at its N=3
+#usage: python bench_post_newtonian.py
+import numpy as np
+import gravity
+from bench_gravity import G, best_time, random_system
+
+C = 299792458.0
+
+def old_rel_on(positions, velocities, masses, gr_scale=1e4):
+    # the old nbodyv_general_rel_on.calculate_acceleration: sun pairs only, a
+    # radial rescaling of the newtonian force for body 2, kept as the reference cost
+    accelerations = [np.zeros(3) for _ in masses]
+    for j in range(1, len(masses)):
+        r = positions[j] - positions[0]
+        r_mag = np.linalg.norm(r)
+        force_mag = G * masses[0] * masses[j] / (r_mag ** 2)
+        if j == 2:
+            v_i = np.linalg.norm(velocities[0])
+            v_j = np.linalg.norm(velocities[j])
+            force_mag *= 1.0 + gr_scale * ((4 * G * (masses[0] + masses[j])) / (r_mag * C**2)
+                                           - (4 * G**2 * (masses[0] * masses[j]) / (r_mag**3 * C**2))
+                                           - ((v_i**2 + v_j**2) / (2 * C**2)))
+        force = force_mag * r / r_mag
+        accelerations[0] += force / masses[0]
+        accelerations[j] -= force / masses[j]
+    return accelerations
+
+def main():
+    rng = np.random.default_rng(42)
+    print(f"{'N':>6} {'newtonian (ms)':>15} {'1PN all (ms)':>13} {'overhead':>9} {'1PN 10% (ms)':>13} {'overhead':>9}")
+    for n in [3, 15, 100, 300, 1000, 2000]:
+        positions, masses = random_system(n, rng)
+        velocities = rng.normal(0, 3e4, (n, 3))
+        some = np.zeros(n, dtype=bool)
+        some[rng.choice(n, max(1, n // 10), replace=False)] = True
+        newtonian = best_time(gravity.accelerations, positions, masses, G)
+        everyone = best_time(gravity.post_newtonian, positions, velocities, masses, G, C)
+        tenth = best_time(gravity.post_newtonian, positions, velocities, masses, G, C, some)
+        print(f"{n:>6} {newtonian * 1e3:>15.3f} {everyone * 1e3:>13.3f} {everyone / newtonian - 1:>8.0%} "
+              f"{tenth * 1e3:>13.3f} {tenth / newtonian - 1:>8.0%}")
+    positions, masses = random_system(3, rng)
+    velocities = rng.normal(0, 3e4, (3, 3))
+    loop = best_time(old_rel_on, positions, velocities, masses)
+    print(f"nbodyv_general_rel_on (N=3): old pair loop {loop * 1e6:.1f} us, post_newtonian "
+          f"{best_time(gravity.post_newtonian, positions, velocities, masses, G, C, [False, False, True]) * 1e6:.1f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#body drawing cost per frame at large N: a world_to_screen call and a circle
+#per body (the old loop) vs BodySprites (one batched projection, points
+#written through the pixel buffer), drawing runs off-screen
+#usage: python bench_render.py
+import os
+import time
+import numpy as np
+import bodystore
+
+FRAMES = 20
+# a 60 fps frame
+BUDGET = 1 / 60
+
+def bodies(n):
+    rng = np.random.default_rng(0)
+    store = bodystore.BodyStore(capacity=n)
+    radius = rng.uniform(20, 340, n)
+    phase = rng.uniform(0, 2 * np.pi, n)
+    for r, angle in zip(radius, phase):
+        store.add(bodystore.Body(1.0, [r * np.cos(angle), r * np.sin(angle), 0.0], [0.0, 0.0, 0.0], (255, 255, 255)))
+    return store
+
+def loop(screen, view, store):
+    import pygame
+    t0 = time.perf_counter()
+    for _ in range(FRAMES):
+        screen.fill((0, 0, 0))
+        for body in store:
+            x, y = view.to_screen(body.position).tolist()
+            pygame.draw.circle(screen, body.color, (x, y), 1)
+    return (time.perf_counter() - t0) / FRAMES
+
+def sprites(screen, view, store):
+    import render
+    sprites = render.BodySprites(lambda masses: np.zeros(len(masses), dtype=int))
+    sprites.draw(screen, view, store)
+    t0 = time.perf_counter()
+    for _ in range(FRAMES):
+        screen.fill((0, 0, 0))
+        sprites.draw(screen, view, store)
+    return (time.perf_counter() - t0) / FRAMES
+
+def main():
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    import render
+    size = (1280, 720)
+    screen = pygame.Surface(size)
+    view = render.View(size[0], size[1], 1.0)
+    print(f"{'bodies':>7} {'loop (ms/frame)':>16} {'sprites (ms/frame)':>19} {'speedup':>8} {'fits 60 fps':>12}")
+    for n in (1000, 10000, 100000):
+        store = bodies(n)
+        t_loop = loop(screen, view, store)
+        t_sprites = sprites(screen, view, store)
+        print(f"{n:>7} {t_loop * 1e3:>16.2f} {t_sprites * 1e3:>19.3f} {t_loop / t_sprites:>7.0f}x "
+              f"{'yes' if t_sprites < BUDGET else 'no':>12}")
+
+if __name__ == "__main__":
+    main()
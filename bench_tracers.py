@@ -0,0 +1,44 @@
+#massless tracers around full.py's 15 bodies: a step with M tracers (tracers.py,
+#O(N M)) against the same particles as ordinary zero-mass bodies in the store
+#(O((N + M)^2)), and the tracer kernel against gravity.accelerations_at
+#usage: python bench_tracers.py
+import time
+import bodystore
+import full
+import gravity
+import tracers
+from bench_gravity import best_time
+
+# ordinary bodies are only timed up to this many particles
+BODIES_MAX = 3000
+
+def step_time(system, steps):
+    system.verlet_step()
+    t0 = time.perf_counter()
+    for _ in range(steps):
+        system.verlet_step()
+    return (time.perf_counter() - t0) / steps
+
+def main():
+    print(f"{'tracers':>8} {'as bodies (ms)':>15} {'as tracers (ms)':>16} {'speedup':>8}")
+    for m in [0, 1000, 3000, 10000, 100000, 1000000]:
+        system = full.GravitationalSystem(15, m)
+        steps = max(3, min(200, 200000 // max(m, 1)))
+        separate = step_time(system, steps)
+        if 0 < m <= BODIES_MAX:
+            together = full.GravitationalSystem(15)
+            swarm = tracers.belt(together, m, seed=0)
+            for position, velocity in zip(swarm.position, swarm.velocity):
+                together.bodies.add(bodystore.Body(0.0, position, velocity, swarm.color))
+            inline = step_time(together, steps)
+            print(f"{m:>8} {inline * 1e3:>15.2f} {separate * 1e3:>16.2f} {inline / separate:>7.0f}x")
+        else:
+            print(f"{m:>8} {'':>15} {separate * 1e3:>16.2f}")
+    system = full.GravitationalSystem(15, 1000000)
+    bodies, points = system.bodies, system.tracers.position
+    at = best_time(gravity.accelerations_at, points, bodies.position, bodies.mass, system.G)
+    kernel = best_time(gravity.tracer_accelerations, points, bodies.position, bodies.mass, system.G)
+    print(f"1e6 tracers x 15 bodies: accelerations_at {at * 1e3:.0f} ms, tracer_accelerations {kernel * 1e3:.0f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#trail cost per step: recording (python lists with append/pop(0) vs the
+#TrailBuffer ring) and drawing (a circle per trail point every frame vs the
+#incremental TrailLayer), drawing runs off-screen and needs pygame. Also checks
+#that the incremental layer ends up with the same pixels as a full redraw,
+#with the camera still, following a body and panning (segments that crossed
+#the window edge when drawn can differ by a few pixels: pygame rasterizes a
+#clipped line from its clipped ends)
+#usage: python bench_trails.py
+import os
+import time
+import numpy as np
+import trails
+
+STEPS = 200
+
+def lists(positions, length):
+    trail = [[] for _ in positions]
+    t0 = time.perf_counter()
+    for _ in range(STEPS):
+        for i, position in enumerate(positions):
+            trail[i].append(position.copy())
+            if len(trail[i]) > length:
+                trail[i].pop(0)
+    return (time.perf_counter() - t0) / STEPS
+
+def ring(positions, length):
+    buffer = trails.TrailBuffer(len(positions), length, positions.shape[1])
+    for _ in positions:
+        buffer.append_row()
+    t0 = time.perf_counter()
+    for _ in range(STEPS):
+        buffer.record(positions)
+    return (time.perf_counter() - t0) / STEPS
+
+def drawing(n, length, frames=20):
+    import pygame
+    import render
+    size = (1280, 720)
+    view = render.View(size[0], size[1], 1.0)
+    rng = np.random.default_rng(0)
+    buffer = trails.TrailBuffer(n, length)
+    for _ in range(n):
+        buffer.append_row()
+    # bodies on circular orbits, so the trails fill up with real traces
+    radius = rng.uniform(20, 340, n)
+    phase = rng.uniform(0, 2 * np.pi, n)
+    speed = 300.0 / radius**1.5
+
+    def positions(step):
+        angle = phase + speed * step
+        return np.column_stack((radius * np.cos(angle), radius * np.sin(angle), np.zeros(n)))
+
+    for step in range(length):
+        buffer.record(positions(step))
+    colors = [(255, 255, 255)] * n
+    screen = pygame.Surface(size)
+
+    t0 = time.perf_counter()
+    for step in range(length, length + frames):
+        buffer.record(positions(step))
+        screen.fill((0, 0, 0))
+        for i in range(n):
+            for pixel in view.to_screen(buffer.points(i)).tolist():
+                pygame.draw.circle(screen, colors[i], pixel, 1)
+    t_circles = (time.perf_counter() - t0) / frames
+
+    layer = render.TrailLayer(size, fade=2)
+    layer.update(buffer, colors, view)
+    t0 = time.perf_counter()
+    for step in range(length + frames, length + 2 * frames):
+        buffer.record(positions(step))
+        layer.update(buffer, colors, view)
+        layer.draw(screen)
+    t_layer = (time.perf_counter() - t0) / frames
+    return t_circles, t_layer
+
+def consistency(mode, frames=200, size=(400, 400)):
+    # lit pixels of the incremental layer, of a full redraw, and how many differ
+    import pygame
+    import render
+    radius = np.array([0.0, 120.0, 60.0])
+    speed = np.array([0.0, 0.05, 0.11])
+    buffer = trails.TrailBuffer(len(radius), frames + 1)
+    for _ in radius:
+        buffer.append_row()
+    colors = [(255, 255, 0), (0, 150, 245), (255, 0, 0)]
+    view = render.Camera(size[0], size[1], 1.0, target=1 if mode == "follow" else None)
+    layer = render.TrailLayer(size)
+    for step in range(frames):
+        angle = speed * step
+        positions = np.column_stack((radius * np.cos(angle), radius * np.sin(angle), np.zeros(len(radius))))
+        buffer.record(positions)
+        if mode == "pan":
+            view.pan(2 if step % 80 < 40 else -2, 1)
+        view.update(buffer, positions)
+        layer.update(buffer, colors, view)
+    full = render.TrailLayer(size)
+    full.update(buffer, colors, view)
+    incremental = pygame.surfarray.array2d(layer.surface)
+    redrawn = pygame.surfarray.array2d(full.surface)
+    return np.count_nonzero(incremental), np.count_nonzero(redrawn), np.count_nonzero(incremental != redrawn)
+
+def main():
+    print(f"{'bodies':>7} {'length':>7} {'lists (ms/step)':>16} {'ring (ms/step)':>15} {'speedup':>8}")
+    for n in (15, 1000, 10000):
+        for length in (100, 1000):
+            positions = np.random.default_rng(0).normal(size=(n, 3))
+            t_lists = lists(positions, length)
+            t_ring = ring(positions, length)
+            print(f"{n:>7} {length:>7} {t_lists * 1e3:>16.3f} {t_ring * 1e3:>15.4f} {t_lists / t_ring:>7.0f}x")
+
+    try:
+        import pygame
+    except ImportError:
+        return
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    print()
+    print(f"{'bodies':>7} {'length':>7} {'circles (ms/frame)':>19} {'layer (ms/frame)':>17} {'speedup':>8}")
+    for n, length in ((15, 1000), (100, 1000), (1000, 100)):
+        t_circles, t_layer = drawing(n, length)
+        print(f"{n:>7} {length:>7} {t_circles * 1e3:>19.2f} {t_layer * 1e3:>17.3f} {t_circles / t_layer:>7.0f}x")
+    print()
+    for mode in ("still", "follow", "pan"):
+        lit, redrawn, differ = consistency(mode)
+        print(f"camera {mode:>6}: incremental {lit} px lit, full redraw {redrawn}, {differ} px differ")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#trajectory recording and reading: what a recorded frame adds to a step
+#(full.py's 15 bodies, recording every step, the worst case), then reads of a
+#larger file: the time index, random seeks and one body's whole track
+#usage: python bench_trajectory.py [file, default /tmp/bench.traj]
+import os
+import sys
+import time
+import numpy as np
+import bodystore
+import full
+import trajectory
+
+STEPS = 20000
+# for the read benchmark: 1000 bodies x 20000 frames, about 0.9 GB with velocities
+BODIES = 1000
+FRAMES = 20000
+
+def stepping(path):
+    timings = {}
+    for recording in (False, True):
+        system = full.GravitationalSystem(15)
+        system.verlet_step()
+        writer = trajectory.TrajectoryWriter(path, system.bodies)
+        t0 = time.perf_counter()
+        for _ in range(STEPS):
+            system.verlet_step()
+            if recording:
+                writer.record(system)
+        timings[recording] = (time.perf_counter() - t0) / STEPS
+        writer.close()
+    return timings
+
+def reading(path):
+    rng = np.random.default_rng(0)
+    bodies = bodystore.BodyStore([bodystore.Body(1.0, p, np.zeros(3), (255, 255, 255))
+                                  for p in rng.normal(size=(BODIES, 3))])
+    t0 = time.perf_counter()
+    with trajectory.TrajectoryWriter(path, bodies) as writer:
+        for frame in range(FRAMES):
+            writer.append(float(frame), bodies.position, bodies.velocity)
+    written = time.perf_counter() - t0
+    run = trajectory.Trajectory(path)
+    t0 = time.perf_counter()
+    run.times
+    index = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for i in rng.integers(0, FRAMES, 1000):
+        run.at(i + 0.5).sum()
+    seek = (time.perf_counter() - t0) / 1000
+    t0 = time.perf_counter()
+    run.body(BODIES // 2)
+    track = time.perf_counter() - t0
+    return os.path.getsize(path), written, index, seek, track
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else "/tmp/bench.traj"
+    timings = stepping(path)
+    print(f"step {timings[False] * 1e6:.1f} us, recording every step {timings[True] * 1e6:.1f} us "
+          f"({timings[True] / timings[False] - 1:+.1%})")
+    size, written, index, seek, track = reading(path)
+    print(f"{BODIES} bodies x {FRAMES} frames, {size / 1e9:.2f} GB: written in {written:.2f} s, "
+          f"time index {index * 1e3:.1f} ms, seek + interpolate {seek * 1e6:.0f} us, "
+          f"one body's track {track * 1e3:.0f} ms")
+    os.remove(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#physics throughput and frame rate with rendering inline (scheduler.FrameScheduler)
+#vs on a physics thread (worker.PhysicsWorker), against the headless step rate
+#scenario: bench_barnes_hut's belt system, direct sum, bodies drawn as points
+#off-screen; the worker only pays off once steps are numpy-heavy (large N)
+#usage: python bench_worker.py
+import os
+import time
+import numpy as np
+import bench_barnes_hut
+import bodystore
+import nbody
+import integrators
+import scheduler
+import worker
+
+# per measurement, long enough for tens of steps
+SECONDS = 5.0
+
+class BeltSystem(nbody.GravitationalSystem):
+    def __init__(self, n):
+        positions, masses = bench_barnes_hut.belt_system(n, np.random.default_rng(7))
+        # circular speeds around the sun
+        r = np.linalg.norm(positions[:, :2], axis=1)
+        speed = np.sqrt(self.G * masses[0] / np.maximum(r, 1.0))
+        velocities = np.zeros_like(positions)
+        velocities[:, 0] = -speed * positions[:, 1] / np.maximum(r, 1.0)
+        velocities[:, 1] = speed * positions[:, 0] / np.maximum(r, 1.0)
+        self.bodies = bodystore.BodyStore([bodystore.Body(m, p, v, (255, 255, 255))
+                                           for m, p, v in zip(masses, positions, velocities)])
+        self.dt = 3600.0
+        self.integrator = integrators.VelocityVerlet(self.calculate_acceleration)
+
+def headless(n):
+    system = BeltSystem(n)
+    system.verlet_step()
+    t0 = time.perf_counter()
+    steps = 0
+    while time.perf_counter() - t0 < SECONDS:
+        system.verlet_step()
+        steps += 1
+    return steps / (time.perf_counter() - t0)
+
+def rendered(n, threaded):
+    import pygame
+    import render
+    size = (1280, 720)
+    screen = pygame.Surface(size)
+    system = BeltSystem(n)
+    # the first step also works out the starting accelerations
+    system.verlet_step()
+    view = render.View(size[0], size[1], 3e9)
+    sprites = render.BodySprites(lambda masses: np.zeros(len(masses), dtype=int))
+    if threaded:
+        physics = worker.PhysicsWorker(system, fps=60).start()
+    else:
+        physics = scheduler.FrameScheduler(fps=60)
+    start_time = system.time
+    frames = 0
+    longest = 0.0
+    t0 = last = time.perf_counter()
+    while last - t0 < SECONDS:
+        frame = physics.frame(system)
+        screen.fill((0, 0, 0))
+        sprites.draw(screen, view, system.bodies, frame.position)
+        frames += 1
+        now = time.perf_counter()
+        longest = max(longest, now - last)
+        last = now
+    simulated = frame.time - start_time
+    physics.stop()
+    elapsed = last - t0
+    return simulated / system.dt / elapsed, frames / elapsed, longest
+
+def main():
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    print(f"{'N':>6} {'headless':>9} {'mode':>9} {'steps/s':>8} {'of headless':>12} {'fps':>6} {'longest frame (ms)':>19}")
+    for n in (500, 1000, 2000):
+        rate = headless(n)
+        for threaded in (False, True):
+            steps, fps, longest = rendered(n, threaded)
+            print(f"{n:>6} {rate:>9.1f} {'threaded' if threaded else 'inline':>9} {steps:>8.1f} "
+                  f"{steps / rate:>11.0%} {fps:>6.1f} {longest * 1e3:>19.1f}")
+
+if __name__ == "__main__":
+    main()
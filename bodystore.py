@@ -0,0 +1,210 @@
+#struct-of-arrays storage for simulation bodies
+#mass, position, velocity and acceleration live in contiguous arrays,
+#a Body is just a handle on one row of its store
+import numpy as np
+import trails
+
+class BodyStore:
+    def __init__(self, bodies=(), dim=None, capacity=16, trail_length=0, trail_stride=1):
+        bodies = list(bodies)
+        if dim is None:
+            dim = bodies[0].dim if bodies else 3
+        self.dim = dim
+        self._n = 0
+        self._mass = np.zeros(capacity)
+        self._position = np.zeros((capacity, dim))
+        self._velocity = np.zeros((capacity, dim))
+        self._acceleration = np.zeros((capacity, dim))
+        self._bodies = []
+        # the last trail_length trail points of every body (see trails.TrailBuffer),
+        # bodies join with an empty trail
+        self.trails = trails.TrailBuffer(capacity, trail_length, dim, trail_stride)
+        # bumped whenever bodies or masses change, lets caches notice
+        self.version = 0
+        for body in bodies:
+            self.add(body)
+
+    # live views of the first len(self) rows
+    # (re-fetch after add/remove, growing the store reallocates)
+    @property
+    def mass(self):
+        return self._mass[:self._n]
+
+    @mass.setter
+    def mass(self, value):
+        self._mass[:self._n] = value
+        self.version += 1
+
+    @property
+    def position(self):
+        return self._position[:self._n]
+
+    @position.setter
+    def position(self, value):
+        self._position[:self._n] = value
+
+    @property
+    def velocity(self):
+        return self._velocity[:self._n]
+
+    @velocity.setter
+    def velocity(self, value):
+        self._velocity[:self._n] = value
+
+    @property
+    def acceleration(self):
+        return self._acceleration[:self._n]
+
+    @acceleration.setter
+    def acceleration(self, value):
+        self._acceleration[:self._n] = value
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        return iter(self._bodies)
+
+    def __getitem__(self, index):
+        return self._bodies[index]
+
+    def index(self, body):
+        return body._index if body._store is self else self._bodies.index(body)
+
+    def _grow(self):
+        capacity = max(1, 2 * len(self._mass))
+        for name in ("_mass", "_position", "_velocity", "_acceleration"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:])
+            new[:self._n] = old[:self._n]
+            setattr(self, name, new)
+
+    def _append(self, body, mass, position, velocity, acceleration):
+        if self._n == len(self._mass):
+            self._grow()
+        i = self._n
+        self.trails.append_row()
+        self._mass[i] = mass
+        self._position[i] = position
+        self._velocity[i] = velocity
+        self._acceleration[i] = acceleration
+        body._store = self
+        body._index = i
+        body._mass = body._position = body._velocity = body._acceleration = None
+        self._bodies.append(body)
+        self._n += 1
+        self.version += 1
+        return body
+
+    def add(self, body):
+        # adopt body, copying its current state into this store (amortized O(1))
+        return self._append(body, body.mass, body.position, body.velocity, body.acceleration)
+
+    def extend(self, bodies):
+        for body in bodies:
+            self.add(body)
+        return self
+
+    def remove(self, body):
+        # O(1): the last row moves into the hole, so body order is not preserved
+        if body._store is not self:
+            raise ValueError("body is not in this store")
+        i = body._index
+        last = self._n - 1
+        state = (self._mass[i], self._position[i].copy(), self._velocity[i].copy(), self._acceleration[i].copy())
+        if i != last:
+            self._mass[i] = self._mass[last]
+            self._position[i] = self._position[last]
+            self._velocity[i] = self._velocity[last]
+            self._acceleration[i] = self._acceleration[last]
+            self.trails.move_row(last, i)
+            moved = self._bodies[last]
+            moved._index = i
+            self._bodies[i] = moved
+        self._bodies.pop()
+        self.trails.pop_row()
+        self._n -= 1
+        self.version += 1
+        # the removed body keeps its state as plain arrays of its own
+        body._store = body._index = None
+        body._mass, body._position, body._velocity, body._acceleration = state
+        return body
+
+class Body:
+    # until a store adopts it, a body keeps its state in plain arrays
+    # (_mass ... _acceleration, None once it is in a store)
+    __slots__ = ("_store", "_index", "_mass", "_position", "_velocity", "_acceleration", "color")
+
+    def __init__(self, mass, position, velocity, color):
+        self._store = self._index = None
+        self._mass = mass
+        self._position = np.array(position, dtype=float)
+        self._velocity = np.zeros_like(self._position)
+        self._velocity[...] = velocity
+        self._acceleration = np.zeros_like(self._position)
+        self.color = color
+
+    @property
+    def dim(self):
+        return len(self._position) if self._store is None else self._store.dim
+
+    @property
+    def trail(self):
+        # view of this body's recorded trail points (record or push them
+        # through the store's trails), empty outside a store
+        if self._store is None:
+            return np.zeros((0, self.dim))
+        return self._store.trails.points(self._index)
+
+    @property
+    def mass(self):
+        if self._store is None:
+            return self._mass
+        return self._store._mass[self._index]
+
+    @mass.setter
+    def mass(self, value):
+        if self._store is None:
+            self._mass = value
+        else:
+            self._store._mass[self._index] = value
+            self._store.version += 1
+
+    @property
+    def position(self):
+        if self._store is None:
+            return self._position
+        return self._store._position[self._index]
+
+    @position.setter
+    def position(self, value):
+        if self._store is None:
+            self._position[...] = value
+        else:
+            self._store._position[self._index] = value
+
+    @property
+    def velocity(self):
+        if self._store is None:
+            return self._velocity
+        return self._store._velocity[self._index]
+
+    @velocity.setter
+    def velocity(self, value):
+        if self._store is None:
+            self._velocity[...] = value
+        else:
+            self._store._velocity[self._index] = value
+
+    @property
+    def acceleration(self):
+        if self._store is None:
+            return self._acceleration
+        return self._store._acceleration[self._index]
+
+    @acceleration.setter
+    def acceleration(self, value):
+        if self._store is None:
+            self._acceleration[...] = value
+        else:
+            self._store._acceleration[self._index] = value
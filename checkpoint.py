@@ -0,0 +1,237 @@
+#binary checkpoints of a GravitationalSystem (numpy .npz)
+#everything a step depends on is saved: body arrays (mass, position, velocity
+#and the cached accelerations), the extra per-body state of a script's Body
+#subclass (pericount, peri_angle, ...), trails, the system's own
+#attributes (time, dt, ...), the integrator's and the adaptive timestep's
+#state, proper-time clocks (clocks.ProperTime) and tracers. Restoring into
+#a freshly built system of the same script and stepping on gives
+#bit-identical results to never having stopped: values keep their exact
+#types (a python float stays a python float, a numpy scalar keeps its dtype)
+#usage: checkpoint.save(system, "run.npz"), checkpoint.restore(system, "run.npz")
+import json
+import os
+import sys
+import time
+import numpy as np
+import tracers
+
+FORMAT = 1
+# scalar types written as they are, anything else numpy is stored with its dtype
+PYTHON_SCALARS = {"bool": bool, "int": int, "float": float}
+# a ProperTime's running sums, with what their compensation has carried so far
+CLOCK_ARRAYS = ("tau", "lag", "_tau_error", "_lag_error")
+
+def _scalar_type(value):
+    # the name restore() turns the stored number back into, None if not a scalar
+    if type(value) in (bool, int, float):
+        return type(value).__name__
+    if isinstance(value, np.generic):
+        return value.dtype.str
+    return None
+
+def _unscalar(value, kind):
+    if kind in PYTHON_SCALARS:
+        return PYTHON_SCALARS[kind](value)
+    return np.dtype(kind).type(value)
+
+def _pack(values):
+    # one value per body -> (array, description); None when the values can not
+    # be stored (nothing a step depends on is like that in the scripts)
+    kinds = [_scalar_type(value) for value in values]
+    if all(kinds):
+        return np.array([np.asarray(value) for value in values]) if values else np.zeros(0), \
+            {"kind": "scalar", "types": kinds}
+    if all(isinstance(value, np.ndarray) for value in values):
+        if len({(value.shape, value.dtype) for value in values}) <= 1:
+            return np.array(values), {"kind": "array"}
+    if all(isinstance(value, list) for value in values):
+        if len({len(value) for value in values}) <= 1:
+            return np.array(values), {"kind": "list"}
+    return None, None
+
+def _unpack(array, description, i):
+    kind = description["kind"]
+    if kind == "scalar":
+        return _unscalar(array[i], description["types"][i])
+    if kind == "array":
+        return array[i].copy()
+    return [row.copy() if isinstance(row, np.ndarray) else row for row in array[i]]
+
+def _attributes(obj, skip=()):
+    # an object's own scalar and array attributes
+    found = {}
+    for name, value in vars(obj).items():
+        if name in skip:
+            continue
+        if _scalar_type(value) is not None or isinstance(value, np.ndarray):
+            found[name] = value
+    return found
+
+def _slots(body):
+    # extra per-body attributes of a script's Body subclass
+    names = []
+    for cls in type(body).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            if not name.startswith("_") and name != "color" and name not in names:
+                names.append(name)
+    return names
+
+def _name(system):
+    # script.Class, the same whether the script runs as __main__ or is imported
+    module = type(system).__module__
+    if module == "__main__":
+        module = os.path.splitext(os.path.basename(sys.modules[module].__file__))[0]
+    return f"{module}.{type(system).__qualname__}"
+
+def save(system, path):
+    # written to a temporary file first and renamed, so a crash while saving
+    # leaves the previous checkpoint intact
+    bodies = system.bodies
+    n = len(bodies)
+    arrays = {
+        "mass": bodies.mass, "position": bodies.position, "velocity": bodies.velocity,
+        "acceleration": bodies.acceleration,
+        "color": np.array([body.color for body in bodies], dtype=np.int64).reshape(n, -1),
+    }
+    header = {"format": FORMAT, "system": _name(system),
+              "n": n, "dim": bodies.dim, "slots": {}, "attributes": {}, "integrator": {}}
+
+    for name in (_slots(bodies[0]) if n else []):
+        array, description = _pack([getattr(body, name) for body in bodies])
+        if array is not None:
+            arrays["slot." + name] = array
+            header["slots"][name] = description
+
+    for prefix, obj, skip in (("attribute", system, ("bodies", "integrator", "timestep", "clocks", "tracers")),
+                              ("integrator", system.integrator, ("_bodies", "_key"))):
+        for name, value in _attributes(obj, skip).items():
+            arrays[f"{prefix}.{name}"] = np.asarray(value)
+            header[prefix + ("s" if prefix == "attribute" else "")][name] = _scalar_type(value) or "array"
+    integrator = system.integrator
+    # the accelerations in store are reused by the next step while the key holds
+    cached = integrator._key is not None and integrator._bodies is bodies and integrator._key[0] == bodies.version
+    header["cached_dt"] = integrator._key[1] if cached else None
+    header["cached_dt_type"] = _scalar_type(integrator._key[1]) if cached else None
+
+    timestep = getattr(system, "timestep", None)
+    if timestep is not None:
+        header["timestep"] = {"dt": timestep.dt, "dt_type": _scalar_type(timestep.dt),
+                              "countdown": timestep._countdown,
+                              "history": timestep.history,
+                              "usage": [[dt, used] for dt, used in timestep.usage.items()]}
+
+    clocks = getattr(system, "clocks", None)
+    if clocks is not None:
+        for name in CLOCK_ARRAYS:
+            arrays["clocks." + name] = getattr(clocks, name)
+        header["clocks"] = {"started": clocks.deficit is not None}
+        if clocks.deficit is not None:
+            arrays["clocks.deficit"] = clocks.deficit
+
+    swarm = getattr(system, "tracers", None)
+    if swarm is not None:
+        for name in ("position", "velocity", "acceleration"):
+            arrays["tracers." + name] = getattr(swarm, name)
+        # whether the accelerations are the ones the next step starts from
+        header["tracers"] = {"color": list(swarm.color),
+                             "cached": swarm._key == (bodies.version, system.time)}
+
+    trails = bodies.trails
+    arrays["trails.data"], arrays["trails.count"] = trails.view()
+    arrays["trails.head"] = trails._head[:n]
+    arrays["trails.written"] = trails.written()
+    header["trails"] = {"length": trails.length, "stride": trails.stride, "calls": trails._calls}
+
+    arrays["header"] = np.array(json.dumps(header))
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(temporary, path)
+
+def restore(system, path):
+    # into a system built by the same script, with the same number of bodies
+    with np.load(path) as data:
+        header = json.loads(str(data["header"]))
+        if header["format"] != FORMAT:
+            raise ValueError(f"{path}: checkpoint format {header['format']}, expected {FORMAT}")
+        name = _name(system)
+        bodies = system.bodies
+        if header["system"] != name or header["n"] != len(bodies) or header["dim"] != bodies.dim:
+            raise ValueError(f"{path}: checkpoint of {header['system']} with {header['n']} bodies, "
+                             f"this is {name} with {len(bodies)}")
+        # in place, so every view of the store stays valid
+        np.copyto(bodies.mass, data["mass"])
+        np.copyto(bodies.position, data["position"])
+        np.copyto(bodies.velocity, data["velocity"])
+        np.copyto(bodies.acceleration, data["acceleration"])
+        for body, color in zip(bodies, data["color"].tolist()):
+            body.color = tuple(color)
+        for name, description in header["slots"].items():
+            array = data["slot." + name]
+            for i, body in enumerate(bodies):
+                setattr(body, name, _unpack(array, description, i))
+
+        for prefix, obj in (("attribute", system), ("integrator", system.integrator)):
+            for name, kind in header[prefix + ("s" if prefix == "attribute" else "")].items():
+                value = data[f"{prefix}.{name}"]
+                setattr(obj, name, value.copy() if kind == "array" else _unscalar(value[()], kind))
+        integrator = system.integrator
+        if header["cached_dt"] is not None:
+            integrator._bodies = bodies
+            integrator._key = (bodies.version, _unscalar(header["cached_dt"], header["cached_dt_type"]))
+        else:
+            integrator.invalidate()
+
+        timestep = getattr(system, "timestep", None)
+        saved = header.get("timestep")
+        if timestep is not None and saved is not None:
+            timestep.dt = None if saved["dt"] is None else _unscalar(saved["dt"], saved["dt_type"])
+            timestep._countdown = saved["countdown"]
+            timestep.history = [tuple(entry) for entry in saved["history"]]
+            timestep.usage = {dt: used for dt, used in saved["usage"]}
+
+        clocks = getattr(system, "clocks", None)
+        saved = header.get("clocks")
+        if clocks is not None and saved is not None:
+            for name in CLOCK_ARRAYS:
+                np.copyto(getattr(clocks, name), data["clocks." + name])
+            clocks.deficit = data["clocks.deficit"].copy() if saved["started"] else None
+
+        saved = header.get("tracers")
+        if saved is not None:
+            if getattr(system, "tracers", None) is None:
+                system.tracers = tracers.Tracers(dim=bodies.dim, color=tuple(saved["color"]))
+            swarm = system.tracers
+            for name in ("position", "velocity", "acceleration"):
+                setattr(swarm, name, data["tracers." + name].copy())
+            if saved["cached"]:
+                swarm._key = (bodies.version, system.time)
+            else:
+                swarm.invalidate()
+
+        trails = bodies.trails
+        if header["trails"]["length"] == trails.length:
+            n = len(bodies)
+            trails._data[:n] = data["trails.data"]
+            trails._count[:n] = data["trails.count"]
+            trails._head[:n] = data["trails.head"]
+            trails._written[:n] = data["trails.written"]
+            trails._calls = header["trails"]["calls"]
+    return system
+
+class Autosave:
+    # periodic checkpoints: save(system) when due() (every `interval` seconds
+    # of wall-clock time), and once more on the way out
+    def __init__(self, path, interval=60.0):
+        self.path = path
+        self.interval = interval
+        self.saves = 0
+        self._next = time.perf_counter() + interval
+
+    def due(self):
+        return time.perf_counter() >= self._next
+
+    def save(self, system):
+        save(system, self.path)
+        self.saves += 1
+        self._next = time.perf_counter() + self.interval
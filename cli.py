@@ -0,0 +1,13 @@
+#command line of the simulation scripts
+#every script's window takes --threaded, --checkpoint FILE and --replay FILE;
+#parser() gives an argparse parser with those, scripts add their own options
+#usage: args = cli.parser("solar system").parse_args()
+import argparse
+
+def parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--threaded", action="store_true", help="run the physics on its own thread (see worker.py)")
+    parser.add_argument("--checkpoint", metavar="FILE",
+                        help="resume from FILE if it exists, save to it every minute and on quit (see checkpoint.py)")
+    parser.add_argument("--replay", metavar="FILE", help="play back a run recorded with headless.py --record FILE")
+    return parser
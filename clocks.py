@@ -0,0 +1,55 @@
+#proper time of many clocks at once (bodies or massless clock particles)
+#in the weak field a clock moving at speed v through the newtonian potential
+#phi (<= 0) ticks at dtau/dt = sqrt(1 - (v^2 - 2 phi) / c^2): special
+#relativistic and gravitational time dilation together. What is interesting
+#is the deficit t - tau, microseconds on billions of seconds, so it is
+#accumulated on its own rather than read off tau - t: both sums are
+#compensated (Kahan), which keeps them exact to float64 rounding of the
+#running total instead of drifting by a rounding error every step, with no
+#float128 (not portable, and slow)
+import numpy as np
+
+# speed of light, m/s
+C = 299792458.0
+
+def compensated_add(total, error, values):
+    # total += values in place, error carries what rounding lost (Kahan)
+    corrected = values - error
+    new = total + corrected
+    error[...] = (new - total) - corrected
+    total[...] = new
+
+class ProperTime:
+    # n clocks, all started at tau = 0. Per step of length dt, given every
+    # clock's squared speed and potential at the end of the step:
+    #     clocks.advance(dt, speed2, potential)
+    # the rate is averaged over the step (trapezoid) with the one at its
+    # start, kept from the last call (start() sets it before the first one).
+    # tau: proper time, lag: coordinate minus proper time (t - tau)
+    def __init__(self, n, c=C):
+        self.c = c
+        self.tau = np.zeros(n)
+        self.lag = np.zeros(n)
+        self._tau_error = np.zeros(n)
+        self._lag_error = np.zeros(n)
+        # 1 - dtau/dt at the end of the last step, None before start()
+        self.deficit = None
+
+    def rate_deficit(self, speed2, potential):
+        # 1 - sqrt(1 - x) as x / (1 + sqrt(1 - x)), no cancellation at x ~ 1e-8
+        x = (speed2 - 2 * potential) / self.c**2
+        return x / (1.0 + np.sqrt(1.0 - x))
+
+    def start(self, speed2, potential):
+        self.deficit = self.rate_deficit(speed2, potential)
+
+    def advance(self, dt, speed2, potential):
+        # returns the proper time each clock covered, (n,)
+        end = self.rate_deficit(speed2, potential)
+        start = end if self.deficit is None else self.deficit
+        lost = 0.5 * (start + end) * dt
+        compensated_add(self.lag, self._lag_error, lost)
+        covered = dt - lost
+        compensated_add(self.tau, self._tau_error, covered)
+        self.deficit = end
+        return covered
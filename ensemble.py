@@ -0,0 +1,109 @@
+#parameter sweeps: run many scenario variants on a process pool
+#usage: python ensemble.py   (sweeps dt and the GR scale of the mercury precession demo)
+import contextlib
+import importlib
+import io
+import itertools
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+class Scenario:
+    # one variant: the script module to build the system from, keyword
+    # arguments for its GravitationalSystem, attributes to override after
+    # construction (e.g. dt) and how long to run it
+    def __init__(self, module, params=None, overrides=None, steps=None, until=None, name=None):
+        if steps is None and until is None:
+            raise ValueError("a scenario needs steps or until")
+        self.module = module
+        self.params = dict(params or {})
+        self.overrides = dict(overrides or {})
+        self.steps = steps
+        self.until = until
+        self.name = name or " ".join([module] + [f"{k}={v}" for k, v in {**self.params, **self.overrides}.items()])
+
+    def build(self):
+        system = importlib.import_module(self.module).GravitationalSystem(**self.params)
+        for attr, value in self.overrides.items():
+            setattr(system, attr, value)
+        return system
+
+def run_scenario(scenario, index=0):
+    # integrate one scenario and summarize it, runs in a worker process
+    t0 = time.perf_counter()
+    system = scenario.build()
+    energy0 = system.total_energy()
+    # perihelion passages are read off the bodies' counters after every step
+    peri_bodies = [i for i, body in enumerate(system.bodies) if hasattr(body, "pericount")]
+    peri_angles = {i: [] for i in peri_bodies}
+    seen = {i: system.bodies[i].pericount for i in peri_bodies}
+
+    def track_perihelia(system):
+        for i in peri_bodies:
+            body = system.bodies[i]
+            if body.pericount != seen[i]:
+                seen[i] = body.pericount
+                peri_angles[i].append(math.degrees(body.peri_angle))
+
+    # the scripts print their own progress, keep it out of the stream of summaries
+    with contextlib.redirect_stdout(io.StringIO()):
+        steps = system.run(steps=scenario.steps, until=scenario.until,
+                           callback=track_perihelia if peri_bodies else None)
+    energy = system.total_energy()
+    return {
+        "index": index,
+        "name": scenario.name,
+        "steps": steps,
+        "time": system.time,
+        "positions": system.bodies.position.copy(),
+        "velocities": system.bodies.velocity.copy(),
+        "energy_drift": (energy - energy0) / abs(energy0),
+        "perihelion_angles": {i: angles for i, angles in peri_angles.items() if angles},
+        "force_evaluations": system.integrator.force_evaluations,
+        "wall_time": time.perf_counter() - t0,
+    }
+
+def run_ensemble(scenarios, processes=None):
+    # yields run_scenario summaries in completion order, each tagged with the
+    # index of its scenario; processes=1 runs serially in this process
+    # (workers run the same code on the same inputs, so results are identical)
+    scenarios = list(scenarios)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes == 1 or len(scenarios) <= 1:
+        for index, scenario in enumerate(scenarios):
+            yield run_scenario(scenario, index)
+        return
+    with ProcessPoolExecutor(max_workers=min(processes, len(scenarios))) as pool:
+        futures = [pool.submit(run_scenario, scenario, index) for index, scenario in enumerate(scenarios)]
+        for future in as_completed(futures):
+            yield future.result()
+
+def sweep(module, params=None, overrides=None, steps=None, until=None):
+    # cartesian product of value lists, e.g.
+    # sweep("nbodyv_general_rel_on", params={"pvel_mercury": [5.89e4, 5.897e4], "gr_scale": [1e3, 1e4]},
+    #       overrides={"dt": [500, 1000]}, until=...)
+    params = params or {}
+    overrides = overrides or {}
+    keys = list(params) + list(overrides)
+    scenarios = []
+    for values in itertools.product(*params.values(), *overrides.values()):
+        chosen = dict(zip(keys, values))
+        scenarios.append(Scenario(module,
+                                  params={k: chosen[k] for k in params},
+                                  overrides={k: chosen[k] for k in overrides},
+                                  steps=steps, until=until))
+    return scenarios
+
+if __name__ == "__main__":
+    # one mercury year is ~88 days
+    scenarios = sweep("nbodyv_general_rel_on",
+                      params={"gr_scale": [0.0, 1e3, 1e4]},
+                      overrides={"dt": [500, 1000, 2000]},
+                      until=4 * 88 * 86400)
+    for summary in run_ensemble(scenarios):
+        angles = "  ".join(f"body {i}: " + ", ".join(f"{a:.3f}" for a in angles)
+                           for i, angles in summary["perihelion_angles"].items())
+        print(f"[{summary['index']}] {summary['name']}: {summary['steps']} steps, "
+              f"energy drift {summary['energy_drift']:.2e}, perihelion angles (deg) {angles}", flush=True)
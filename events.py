@@ -0,0 +1,220 @@
+#orbital event detection: periapsis/apoapsis, node crossings, close approaches
+#and user-defined events
+#an event is where an event function g(position, velocity) -> (K,) values,
+#one per subject (a body, a pair of bodies, ...), changes sign. Every
+#function is evaluated for all its subjects in one vectorized pass per step,
+#and a sign change between the states before and after a step is refined to
+#the time within the step where g crosses zero: the step is interpolated by
+#the cubic Hermite curve through both states' positions and velocities and
+#the crossing bracketed down by regula falsi (Illinois). Times and positions
+#are then accurate to far below a step, at any dt
+#usage:
+#    detector = events.EventDetector([events.periapsis([1, 2]), events.node()])
+#    detector.begin(system); system.verlet_step(); found = detector.check(system)
+import math
+import numpy as np
+
+# regula falsi iterations per crossing
+ITERATIONS = 12
+
+class Occurrence:
+    # one event: its name, subject (body index, (i, j) pair, ... see Event),
+    # simulated time, the whole (interpolated) state then, and rising, True
+    # when g went from negative to positive
+    __slots__ = ("name", "subject", "time", "position", "velocity", "rising")
+
+    def __init__(self, name, subject, time, position, velocity, rising):
+        self.name = name
+        self.subject = subject
+        self.time = time
+        self.position = position
+        self.velocity = velocity
+        self.rising = rising
+
+    def longitude(self, body, primary=0):
+        # angle of body around primary in the x-y plane, radians
+        r = self.position[body] - self.position[primary]
+        return math.atan2(r[1], r[0])
+
+class Event:
+    # g(position, velocity) -> (K,) array, (N, dim) state in; subjects: what
+    # each of the K values is about (default 0..K-1). direction: +1 only
+    # crossings from negative to positive, -1 only the other way, 0 both.
+    # accept(occurrence) -> bool drops crossings that do not count (a close
+    # approach that is not close, ...)
+    def __init__(self, name, g, direction=0, subjects=None, accept=None):
+        self.name = name
+        self.g = g
+        self.direction = direction
+        self.subjects = subjects
+        self.accept = accept
+
+def _select(bodies):
+    # an index for the bodies, a slice when they are consecutive (no copy)
+    if bodies is None:
+        return slice(None)
+    index = np.asarray(bodies)
+    if len(index) and np.array_equal(index, np.arange(index[0], index[0] + len(index))):
+        return slice(int(index[0]), int(index[0]) + len(index))
+    return index
+
+def _subjects(bodies):
+    return None if bodies is None else [int(i) for i in bodies]
+
+def _radial(bodies, primary):
+    # r.v relative to primary: negative approaching, positive receding
+    index = _select(bodies)
+
+    def g(position, velocity):
+        r = position[index] - position[primary]
+        v = velocity[index] - velocity[primary]
+        return np.einsum("ij,ij->i", r, v)
+    return g
+
+def periapsis(bodies=None, primary=0, name="periapsis"):
+    # closest approach of each body to primary (perihelion around the sun):
+    # r.v turns from negative to positive. bodies: indices, None for all of
+    # them (the primary's own g is always 0 and never fires)
+    return Event(name, _radial(bodies, primary), +1, _subjects(bodies))
+
+def apoapsis(bodies=None, primary=0, name="apoapsis"):
+    return Event(name, _radial(bodies, primary), -1, _subjects(bodies))
+
+def node(bodies=None, primary=0, axis=2, name="node"):
+    # crossings of primary's reference plane (z = 0 for axis 2 around it),
+    # Occurrence.rising: ascending node
+    index = _select(bodies)
+
+    def g(position, velocity):
+        return position[index, axis] - position[primary, axis]
+    return Event(name, g, 0, _subjects(bodies))
+
+def close_approach(distance, bodies=None, name="close approach"):
+    # every pair (i, j) of bodies (indices, None for all) at their closest,
+    # when that is nearer than distance; subjects are (i, j) pairs, rebuilt
+    # whenever the number of bodies changes
+    event = Event(name, None, +1)
+    event.n = None
+
+    def g(position, velocity):
+        if event.n != len(position):
+            event.n = len(position)
+            chosen = np.arange(len(position)) if bodies is None else np.asarray(bodies)
+            i, j = np.triu_indices(len(chosen), 1)
+            event.pairs = (chosen[i], chosen[j])
+            event.subjects = list(zip(chosen[i].tolist(), chosen[j].tolist()))
+        i, j = event.pairs
+        return np.einsum("ij,ij->i", position[j] - position[i], velocity[j] - velocity[i])
+
+    def accept(occurrence):
+        i, j = occurrence.subject
+        return np.linalg.norm(occurrence.position[j] - occurrence.position[i]) < distance
+
+    event.g = g
+    event.accept = accept
+    return event
+
+def hermite(s, h, x0, v0, x1, v1):
+    # state a fraction s into a step of length h, from the cubic through both
+    # ends' positions and velocities
+    s2, s3 = s * s, s * s * s
+    position = ((2 * s3 - 3 * s2 + 1) * x0 + (s3 - 2 * s2 + s) * h * v0
+                + (3 * s2 - 2 * s3) * x1 + (s3 - s2) * h * v1)
+    velocity = ((6 * s2 - 6 * s) * x0 / h + (3 * s2 - 4 * s + 1) * v0
+                + (6 * s - 6 * s2) * x1 / h + (3 * s2 - 2 * s) * v1)
+    return position, velocity
+
+class EventDetector:
+    # Per step:
+    #     detector.begin(system)   # the state the step starts from
+    #     system.verlet_step()
+    #     detector.check(system)   # -> new Occurrences, oldest first
+    # begin() costs nothing when the system is where the last check() left it,
+    # only after anything else moved it (a restored checkpoint, ...) is the
+    # state copied and the event functions evaluated again.
+    # every Occurrence is also kept in log, and passed to callback if given
+    def __init__(self, events, callback=None):
+        self.events = list(events)
+        self.callback = callback
+        self.log = []
+        self._time = None
+        self._position = None
+        self._velocity = None
+        self._values = None
+
+    def _keep(self, system):
+        bodies = system.bodies
+        if self._position is None or self._position.shape != bodies.position.shape:
+            self._position = np.empty_like(bodies.position)
+            self._velocity = np.empty_like(bodies.velocity)
+        np.copyto(self._position, bodies.position)
+        np.copyto(self._velocity, bodies.velocity)
+        self._time = system.time
+
+    def begin(self, system):
+        if self._time is not None and self._time == system.time \
+                and self._position.shape == system.bodies.position.shape:
+            return
+        self._keep(system)
+        self._values = [event.g(self._position, self._velocity) for event in self.events]
+
+    def check(self, system):
+        bodies = system.bodies
+        x1, v1 = bodies.position, bodies.velocity
+        values = [event.g(x1, v1) for event in self.events]
+        found = []
+        if self._values is not None and self._position.shape == x1.shape:
+            t0, h = self._time, system.time - self._time
+            for event, before, after in zip(self.events, self._values, values):
+                if event.direction > 0:
+                    crossed = (before < 0) & (after >= 0)
+                elif event.direction < 0:
+                    crossed = (before > 0) & (after <= 0)
+                else:
+                    crossed = ((before < 0) & (after >= 0)) | ((before > 0) & (after <= 0))
+                if not crossed.any():
+                    continue
+                for k in np.flatnonzero(crossed):
+                    occurrence = self._refine(event, k, before[k], after[k], t0, h, x1, v1)
+                    if event.accept is None or event.accept(occurrence):
+                        found.append(occurrence)
+        self._keep(system)
+        self._values = values
+        if found:
+            found.sort(key=lambda occurrence: occurrence.time)
+            self.log.extend(found)
+            if self.callback is not None:
+                for occurrence in found:
+                    self.callback(occurrence)
+        return found
+
+    def _refine(self, event, k, g0, g1, t0, h, x1, v1):
+        # where subject k's g crosses zero within the step: Illinois regula
+        # falsi on g along the Hermite-interpolated step, the bracket [a, b]
+        # always holds the crossing
+        x0, v0 = self._position, self._velocity
+        a, b, ga, gb = 0.0, 1.0, float(g0), float(g1)
+        s = 1.0
+        side = 0
+        for _ in range(ITERATIONS):
+            if ga == gb:
+                break
+            s = (a * gb - b * ga) / (gb - ga)
+            position, velocity = hermite(s, h, x0, v0, x1, v1)
+            gs = float(np.asarray(event.g(position, velocity))[k])
+            if gs == 0.0:
+                break
+            if (gs < 0) == (ga < 0):
+                a, ga = s, gs
+                if side == -1:
+                    gb /= 2
+                side = -1
+            else:
+                b, gb = s, gs
+                if side == 1:
+                    ga /= 2
+                side = 1
+        position, velocity = hermite(s, h, x0, v0, x1, v1)
+        subjects = event.subjects
+        subject = int(k) if subjects is None else subjects[k]
+        return Occurrence(event.name, subject, t0 + s * h, position, velocity, bool(g1 > g0))
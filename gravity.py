@@ -0,0 +1,232 @@
+#vectorized newtonian gravity kernels
+#units: m, kg, s
+import numpy as np
+
+# max number of (i,j,xyz) temporaries held at once, keeps large N inside cache
+BLOCK_ELEMENTS = 1 << 18
+# points per block in tracer_accelerations, its per-point temporaries stay in cache
+TRACER_BLOCK = 8192
+
+def accelerations(positions, masses, G):
+    # positions (N,d), masses (N,) -> accelerations (N,d)
+    # a_i = sum_j G m_j (x_j - x_i) / |x_j - x_i|^3, all pairs at once
+    positions = np.ascontiguousarray(positions, dtype=float)
+    masses = np.asarray(masses, dtype=float)
+    n, dim = positions.shape
+    acc = np.empty((n, dim))
+    block = max(1, BLOCK_ELEMENTS // max(1, n * dim))
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        # r[i,j] = x_j - x_i for the rows in this block
+        r = positions[np.newaxis, :, :] - positions[start:stop, np.newaxis, :]
+        r2 = np.einsum('ijk,ijk->ij', r, r)
+        # no self interaction
+        r2[np.arange(stop - start), np.arange(start, stop)] = np.inf
+        weights = masses / (r2 * np.sqrt(r2))
+        acc[start:stop] = np.einsum('ij,ijk->ik', weights, r)
+    acc *= G
+    return acc
+
+def accelerations_at(points, positions, masses, G):
+    # acceleration felt at each of points (M,d) from the bodies (N,d), (N,)
+    # a source sitting exactly on a point is that point's own body and is skipped
+    points = np.ascontiguousarray(points, dtype=float)
+    positions = np.ascontiguousarray(positions, dtype=float)
+    masses = np.asarray(masses, dtype=float)
+    m, dim = points.shape
+    acc = np.empty((m, dim))
+    block = max(1, BLOCK_ELEMENTS // max(1, len(positions) * dim))
+    for start in range(0, m, block):
+        stop = min(start + block, m)
+        r = positions[np.newaxis, :, :] - points[start:stop, np.newaxis, :]
+        r2 = np.einsum('ijk,ijk->ij', r, r)
+        r2[r2 == 0] = np.inf
+        weights = masses / (r2 * np.sqrt(r2))
+        acc[start:stop] = np.einsum('ij,ijk->ik', weights, r)
+    acc *= G
+    return acc
+
+def tracer_accelerations(points, positions, masses, G):
+    # accelerations_at for many points (massless tracers, M,d) around few
+    # bodies (N,d): the loop runs over the bodies instead, each pass a few
+    # whole-block operations on contiguous (d, block) coordinates, so there
+    # are no (block, N, d) temporaries and the cost per point and body is a
+    # handful of flops. A point exactly on a body feels nothing from it
+    points = np.asarray(points, dtype=float)
+    positions = np.asarray(positions, dtype=float)
+    masses = np.asarray(masses, dtype=float)
+    m, dim = points.shape
+    acc = np.empty((m, dim))
+    block = min(TRACER_BLOCK, max(m, 1))
+    d = np.empty((dim, block))
+    r2 = np.empty(block)
+    w = np.empty(block)
+    total = np.empty((dim, block))
+    for start in range(0, m, block):
+        stop = min(start + block, m)
+        k = stop - start
+        p = points[start:stop].T
+        dk, r2k, wk, tk = d[:, :k], r2[:k], w[:k], total[:, :k]
+        tk[...] = 0.0
+        for x, mass in zip(positions, masses.tolist()):
+            np.subtract(x[:, np.newaxis], p, out=dk)
+            np.multiply(dk[0], dk[0], out=r2k)
+            for c in range(1, dim):
+                r2k += dk[c] * dk[c]
+            np.sqrt(r2k, out=wk)
+            wk *= r2k
+            if not wk.all():
+                wk[wk == 0] = np.inf
+            np.divide(mass, wk, out=wk)
+            dk *= wk
+            tk += dk
+        acc[start:stop] = tk.T
+    acc *= G
+    return acc
+
+def potentials_at(points, positions, masses, G):
+    # newtonian potential phi = -sum_j G m_j / |x_j - p| at each of points
+    # (M,d) from the bodies (N,d), (N,); potentials are negative throughout
+    # this module (post_newtonian's phi too). A source sitting exactly on a
+    # point is skipped (a body's own potential, when the points are the bodies)
+    points = np.ascontiguousarray(points, dtype=float)
+    positions = np.ascontiguousarray(positions, dtype=float)
+    masses = np.asarray(masses, dtype=float)
+    m, dim = points.shape
+    phi = np.empty(m)
+    block = max(1, BLOCK_ELEMENTS // max(1, len(positions) * dim))
+    for start in range(0, m, block):
+        stop = min(start + block, m)
+        r = positions[np.newaxis, :, :] - points[start:stop, np.newaxis, :]
+        r2 = np.einsum('ijk,ijk->ij', r, r)
+        r2[r2 == 0] = np.inf
+        phi[start:stop] = (1.0 / np.sqrt(r2)) @ masses
+    phi *= -G
+    return phi
+
+def post_newtonian(positions, velocities, masses, G, c, enabled=None, amplification=1.0, mask=None, index=None):
+    # newtonian accelerations (N,d) plus, for the bodies in enabled ((N,) bool,
+    # default all), amplification times the first post-newtonian correction
+    # of the einstein-infeld-hoffmann equations (harmonic gauge):
+    # a_a += 1/c^2 sum_b G m_b / r^2 { n_ba [v_a^2 + 2 v_b^2 - 4 v_a.v_b
+    #          - 3/2 (n_ab.v_b)^2 + 4 phi_a + phi_b + 1/2 (x_b - x_a).a_b]
+    #        + [n_ab.(4 v_a - 3 v_b)] (v_a - v_b) + 7/2 r a_b }
+    # phi: newtonian potential -G sum m / r (negative, as everywhere in this
+    # module, see potentials_at), a_b: newtonian acceleration, n_ab
+    # the unit vector from b to a. For a test body around a mass at rest this
+    # is the schwarzschild GM/(c^2 r^2) [(4GM/r - v^2) n + 4 (n.v) v].
+    # mask: (N,N) bool, the pairs that interact (default all pairs); bodies
+    # that do not interact may overlap. Two passes: newtonian accelerations and
+    # potentials of everybody, then the correction of the enabled bodies only,
+    # so bodies left newtonian cost nothing extra
+    # index: only the accelerations of those bodies (k,d); the first pass still
+    # covers everybody if any of them is corrected (the correction needs every
+    # body's newtonian acceleration and potential)
+    positions = np.ascontiguousarray(positions, dtype=float)
+    velocities = np.ascontiguousarray(velocities, dtype=float)
+    masses = np.asarray(masses, dtype=float)
+    n, dim = positions.shape
+    acc = np.empty((n, dim))
+    phi = np.empty(n)
+    block = max(1, BLOCK_ELEMENTS // max(1, n * dim))
+    wanted = np.arange(n) if index is None else np.asarray(index)
+    enabled = wanted if enabled is None else wanted[np.asarray(enabled, dtype=bool)[wanted]]
+    if amplification == 0:
+        enabled = enabled[:0]
+    first = np.arange(n) if len(enabled) else wanted
+
+    def inverse_distances(d, rows):
+        # 1/|d| for a block of rows, 0 for a body itself and pairs masked out
+        r2 = np.einsum('ijk,ijk->ij', d, d)
+        r2[np.arange(len(rows)), rows] = np.inf
+        if mask is not None:
+            r2[~mask[rows]] = np.inf
+        return 1.0 / np.sqrt(r2)
+
+    for start in range(0, len(first), block):
+        rows = first[start:start + block]
+        # r[a,b] = x_b - x_a
+        r = positions[np.newaxis, :, :] - positions[rows, np.newaxis, :]
+        inverse = inverse_distances(r, rows)
+        acc[rows] = np.einsum('ij,ijk->ik', masses * (inverse * inverse * inverse), r)
+        phi[rows] = inverse @ masses
+    acc *= G
+    phi *= -G
+    if not len(enabled):
+        return acc if index is None else acc[wanted]
+
+    gm = G * masses
+    v2 = np.einsum('ij,ij->i', velocities, velocities)
+    correction = np.empty((len(enabled), dim))
+    for start in range(0, len(enabled), block):
+        rows = enabled[start:start + block]
+        if block >= n:
+            # everybody fit in the first pass's one block, its pairs are reused
+            if len(rows) < n:
+                r, inverse = r[rows], inverse[rows]
+        else:
+            r = positions[np.newaxis, :, :] - positions[rows, np.newaxis, :]
+            inverse = inverse_distances(r, rows)
+        va = velocities[rows]
+        # with n_ab = -r / |r|: rvb = -(n_ab.v_b) |r|, rva = -(n_ab.v_a) |r|
+        rvb = np.einsum('abk,bk->ab', r, velocities)
+        rva = np.einsum('abk,ak->ab', r, va)
+        nvb = rvb * inverse
+        bracket = (v2[rows, np.newaxis] + 2 * v2 - 4 * (va @ velocities.T) - 1.5 * nvb * nvb
+                   + 4 * phi[rows, np.newaxis] + phi + 0.5 * np.einsum('abk,bk->ab', r, acc))
+        gm3 = gm * (inverse * inverse * inverse)
+        # n_ba / r^2 = r / |r|^3
+        term = np.einsum('ab,abk->ak', gm3 * bracket, r)
+        w = gm3 * (3 * rvb - 4 * rva)
+        term += va * w.sum(axis=1)[:, np.newaxis] - w @ velocities
+        term += 3.5 * (gm * inverse) @ acc
+        correction[start:start + len(rows)] = term
+    acc[enabled] += (amplification / c**2) * correction
+    return acc if index is None else acc[wanted]
+
+def potential_energy(positions, masses, G):
+    # -sum over pairs i<j of G m_i m_j / |x_j - x_i|
+    positions = np.ascontiguousarray(positions, dtype=float)
+    masses = np.asarray(masses, dtype=float)
+    n, dim = positions.shape
+    energy = 0.0
+    block = max(1, BLOCK_ELEMENTS // max(1, n * dim))
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        # only pairs with j > i
+        r = positions[np.newaxis, start + 1:, :] - positions[start:stop, np.newaxis, :]
+        r2 = np.einsum('ijk,ijk->ij', r, r)
+        r2[np.tril_indices(stop - start, -1, r2.shape[1])] = np.inf
+        energy -= np.sum(masses[start:stop, np.newaxis] * masses[start + 1:] / np.sqrt(r2))
+    return G * energy
+
+def timescales(positions, velocities, masses, G, index=None, mask=None):
+    # per body, the shortest dynamical time to any other body: the smaller of the
+    # free-fall time sqrt(r^3 / G(m_i + m_j)) and the encounter time r / |v_j - v_i|
+    # index restricts the result to those bodies (still measured against all of them)
+    # mask: (N,N) bool, the pairs that interact (default all pairs, see
+    # post_newtonian); pairs masked out or on top of each other do not count,
+    # a body with none left gets inf (no constraint)
+    positions = np.ascontiguousarray(positions, dtype=float)
+    velocities = np.ascontiguousarray(velocities, dtype=float)
+    masses = np.asarray(masses, dtype=float)
+    n, dim = positions.shape
+    rows = np.arange(n) if index is None else np.asarray(index)
+    tau2 = np.empty(len(rows))
+    block = max(1, BLOCK_ELEMENTS // max(1, n * dim))
+    with np.errstate(divide="ignore"):
+        for start in range(0, len(rows), block):
+            stop = min(start + block, len(rows))
+            i = rows[start:stop]
+            r = positions[np.newaxis, :, :] - positions[i, np.newaxis, :]
+            v = velocities[np.newaxis, :, :] - velocities[i, np.newaxis, :]
+            r2 = np.einsum('ijk,ijk->ij', r, r)
+            v2 = np.einsum('ijk,ijk->ij', v, v)
+            r2[np.arange(stop - start), i] = np.inf
+            r2[r2 == 0] = np.inf
+            if mask is not None:
+                r2[~mask[i]] = np.inf
+            free_fall2 = r2 * np.sqrt(r2) / (G * (masses[i, np.newaxis] + masses))
+            encounter2 = r2 / v2
+            tau2[start:stop] = np.minimum(free_fall2, encounter2).min(axis=1)
+    return np.sqrt(tau2)
@@ -0,0 +1,101 @@
+#run any simulation script's GravitationalSystem without pygame or a display
+#usage: python headless.py full --until 3.156e9 --every 100000 [--record full.traj --record-every 100]
+import argparse
+import importlib
+import time
+import numpy as np
+import integrators
+import nbody
+import tracers
+import trajectory
+
+YEAR = 365.25 * 86400
+
+def load_system(scenario):
+    # scenario is the module name of a simulation script, e.g. "full" or "nbodyv_general_rel_on"
+    return importlib.import_module(scenario).GravitationalSystem()
+
+def report(system):
+    bodies = system.bodies
+    far = np.max(np.linalg.norm(bodies.position - bodies.position[0], axis=1))
+    print(f"t = {system.time:.6e} s ({system.time / YEAR:.3f} yr)  farthest body: {far:.4e} m", flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="integrate a scenario with no rendering")
+    parser.add_argument("scenario", help="simulation script module, e.g. full")
+    parser.add_argument("--steps", type=int, help="number of steps to take")
+    parser.add_argument("--until", type=float, help="simulated time to stop at (s)")
+    parser.add_argument("--dt", type=float, help="override the scenario's time step (s)")
+    parser.add_argument("--every", type=int, default=10000, help="report every this many steps")
+    parser.add_argument("--solver", choices=["direct", "barnes_hut"], help="force solver")
+    parser.add_argument("--theta", type=float, help="barnes-hut opening angle")
+    parser.add_argument("--integrator", choices=list(integrators.INTEGRATORS) + ["block"], default="verlet",
+                        help="block: individual power-of-two steps per body inside blocks of --dt; "
+                             "forest_ruth, pefrl and yoshida6 are only second order with a "
+                             "velocity-dependent force (nbodyv_general_rel_on)")
+    parser.add_argument("--tolerance", type=float, help="use an adaptive dt with this error tolerance")
+    parser.add_argument("--dt-max", type=float, default=86400.0, help="largest adaptive dt (s)")
+    parser.add_argument("--dt-min", type=float, default=1.0, help="smallest adaptive dt (s)")
+    parser.add_argument("--record", help="write positions and velocities to this trajectory file (see trajectory.py)")
+    parser.add_argument("--tracers", type=float, default=0,
+                        help="add this many massless tracers in the main asteroid belt (see tracers.py)")
+    parser.add_argument("--record-every", type=int, default=1, help="record every this many steps")
+    args = parser.parse_args()
+    if args.steps is None and args.until is None:
+        parser.error("give --steps and/or --until")
+
+    system = load_system(args.scenario)
+    if args.dt is not None:
+        system.dt = args.dt
+    if args.solver is not None:
+        system.use_force_solver(args.solver, args.theta)
+    if args.integrator == "block":
+        # the block integrator only sees calculate_acceleration_on
+        own = type(system)
+        if (own.calculate_acceleration is not nbody.GravitationalSystem.calculate_acceleration
+                and own.calculate_acceleration_on is nbody.GravitationalSystem.calculate_acceleration_on):
+            parser.error(f"{args.scenario} has its own force but no calculate_acceleration_on, "
+                         "--integrator block would fall back to plain newtonian gravity")
+        system.integrator = integrators.BlockTimestep(system.calculate_acceleration_on, system.calculate_timescales,
+                                                      tolerance=args.tolerance or 1e-4)
+    else:
+        system.use_integrator(args.integrator)
+    if args.integrator != "block" and args.tolerance is not None:
+        system.timestep = integrators.AdaptiveTimestep(args.tolerance, args.dt_max, args.dt_min)
+    if args.tracers:
+        system.tracers = tracers.belt(system, int(args.tracers), seed=0)
+
+    callback, every = report, args.every
+    writer = None
+    if args.record is not None:
+        writer = trajectory.TrajectoryWriter(args.record, system.bodies,
+                                             metadata={"scenario": args.scenario, "dt": system.dt})
+        writer.record(system)
+        calls = 0
+        every = 1
+
+        def callback(system):
+            # one step at a time: record every --record-every, report every --every
+            nonlocal calls
+            calls += 1
+            if calls % args.record_every == 0:
+                writer.record(system)
+            if calls % args.every == 0:
+                report(system)
+
+    t0 = time.perf_counter()
+    steps = system.run(steps=args.steps, until=args.until, callback=callback, every=every)
+    elapsed = time.perf_counter() - t0
+    if writer is not None:
+        writer.close()
+        print(f"{writer.frames} frames written to {args.record}")
+    report(system)
+    print(f"{steps} steps in {elapsed:.2f} s ({steps / max(elapsed, 1e-12):.0f} steps/s, "
+          f"{system.integrator.force_evaluations} force evaluations)")
+    if system.tracers is not None:
+        print(f"{len(system.tracers)} tracers, {system.tracers.force_evaluations} tracer force evaluations")
+    if system.timestep is not None:
+        print(system.timestep.summary())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+#time integrators for the gravitational systems
+#an integrator advances a BodyStore in place by dt; make(name, accelerations, G)
+#builds any of the fixed-step schemes in INTEGRATORS
+import math
+import numpy as np
+import kepler
+
+class Integrator:
+    # shared force bookkeeping: accelerations are kept in bodies.acceleration
+    # and reused while bodies, masses and dt stay the same
+    order = None
+    # the force depends on the velocities too (post-newtonian GR), set by make()
+    velocity_dependent = False
+    def __init__(self, accelerations):
+        # accelerations(bodies) -> (N,d) array
+        self.accelerations = accelerations
+        self.force_evaluations = 0
+        self._bodies = None
+        self._key = None
+
+    def invalidate(self):
+        self._key = None
+
+    def evaluate(self, bodies):
+        self.force_evaluations += 1
+        return self.accelerations(bodies)
+
+    def cached(self, bodies, dt):
+        return bodies is self._bodies and self._key == (bodies.version, dt)
+
+    def prepare(self, bodies, dt):
+        # current accelerations, recomputed only if bodies, masses or dt changed
+        if not self.cached(bodies, dt):
+            bodies.acceleration = self.evaluate(bodies)
+            self._bodies = bodies
+            self._key = (bodies.version, dt)
+        return bodies.acceleration
+
+class VelocityVerlet(Integrator):
+    # the acceleration at the end of a step is the one the next step starts
+    # with, so it is reused: one force evaluation per step instead of two
+    order = 2
+
+    def step(self, bodies, dt):
+        old_accelerations = self.prepare(bodies, dt).copy()
+        bodies.position += bodies.velocity * dt + 0.5 * old_accelerations * dt**2
+
+        accelerations = self.evaluate(bodies)
+        bodies.velocity += 0.5 * (old_accelerations + accelerations) * dt
+        bodies.acceleration = accelerations
+        self._key = (bodies.version, dt)
+
+class Splitting(Integrator):
+    # symplectic splitting scheme: a sequence of drifts x += c v dt and kicks
+    # v += c a dt; a kick right after another kick (or at the start of a step
+    # that follows one ending in a kick) reuses the last force evaluation.
+    # A velocity-dependent force (GR) changes during its own kick, explicit
+    # kicks would drop the scheme to first order. With velocity_dependent set
+    # the kicks are implicit midpoint ones instead (see kick), two force
+    # evaluations each and no reuse; they solve a kick to second order only,
+    # so the scheme is second order then (make() lowers order to 2), with a
+    # far smaller error constant than verlet where the velocity term is small
+    def __init__(self, accelerations, sequence, order):
+        super().__init__(accelerations)
+        # [("drift" | "kick", c), ...]
+        self.sequence = sequence
+        self.order = order
+
+    def kick(self, bodies, h):
+        # v += h a(x, v) with a taken at the velocity halfway through the kick
+        # (symmetric), by fixed-point iteration from the last acceleration:
+        # the first pass gets the velocity-independent part exact, the second
+        # the rest to well below the midpoint rule's own error
+        start = bodies.velocity.copy()
+        accelerations = bodies.acceleration
+        for _ in range(2):
+            bodies.velocity = start + 0.5 * h * accelerations
+            accelerations = self.evaluate(bodies)
+        bodies.velocity = start + h * accelerations
+        bodies.acceleration = accelerations
+
+    def step(self, bodies, dt):
+        if self.velocity_dependent:
+            for kind, c in self.sequence:
+                if kind == "drift":
+                    bodies.position += bodies.velocity * (c * dt)
+                else:
+                    self.kick(bodies, c * dt)
+            self._key = None
+            return
+        current = self.cached(bodies, dt)
+        for kind, c in self.sequence:
+            if kind == "drift":
+                bodies.position += bodies.velocity * (c * dt)
+                current = False
+            else:
+                if not current:
+                    bodies.acceleration = self.evaluate(bodies)
+                    current = True
+                bodies.velocity += bodies.acceleration * (c * dt)
+        self._bodies = bodies
+        self._key = (bodies.version, dt) if current else None
+
+def compose(weights):
+    # symmetric composition of kick-drift-kick verlet steps of length w_i dt,
+    # neighbouring half kicks merge so it costs len(weights) evaluations per step
+    sequence = [("kick", weights[0] / 2)]
+    for w, following in zip(weights, list(weights[1:]) + [0.0]):
+        sequence.append(("drift", w))
+        sequence.append(("kick", (w + following) / 2))
+    return sequence
+
+# forest-ruth / yoshida 4th order: three verlet steps, the middle one backwards
+_FR = 1.0 / (2.0 - 2.0 ** (1.0 / 3.0))
+FOREST_RUTH = compose([_FR, 1.0 - 2.0 * _FR, _FR])
+
+# yoshida (1990) 6th order, solution A: seven verlet steps
+_Y6 = [0.784513610477560, 0.235573213359357, -1.17767998417887]
+YOSHIDA6 = compose(_Y6 + [1.0 - 2.0 * sum(_Y6)] + _Y6[::-1])
+
+# omelyan, mryglod & folk (2002) position-extended forest-ruth-like 4th order:
+# four evaluations, but an error constant ~100x smaller than forest-ruth
+_XI, _LAMBDA, _CHI = 0.1786178958448091, -0.2123418310626054, -0.06626458266981849
+PEFRL = [
+    ("drift", _XI), ("kick", (1.0 - 2.0 * _LAMBDA) / 2.0), ("drift", _CHI), ("kick", _LAMBDA),
+    ("drift", 1.0 - 2.0 * (_CHI + _XI)), ("kick", _LAMBDA), ("drift", _CHI),
+    ("kick", (1.0 - 2.0 * _LAMBDA) / 2.0), ("drift", _XI),
+]
+
+class WisdomHolman(Integrator):
+    # mixed-variable symplectic integrator for systems dominated by body 0 (the sun)
+    # in democratic heliocentric coordinates: heliocentric positions, barycentric
+    # velocities. Each body's orbit around the sun is solved exactly (kepler.drift),
+    # only what the sun's newtonian pull leaves over (the planets' mutual pulls,
+    # GR corrections, ...) is integrated, as half kicks around the kepler drift:
+    #   kick(dt/2) jump(dt/2) kepler(dt) jump(dt/2) kick(dt/2)
+    # the jump moves the heliocentric positions by the sun's reflex motion.
+    # The error scales with (planet mass / sun mass) dt^2 instead of dt^2, so steps
+    # can be far longer than verlet's. Moons and close encounters, where the sun
+    # does not dominate, need small steps again.
+    order = 2
+
+    def __init__(self, accelerations, G):
+        super().__init__(accelerations)
+        self.G = G
+
+    def perturbations(self, heliocentric, accelerations, mu):
+        # full acceleration of every planet minus the sun's newtonian pull on it
+        r = np.linalg.norm(heliocentric, axis=1)
+        return accelerations[1:] + mu * heliocentric / (r**3)[:, np.newaxis]
+
+    def step(self, bodies, dt):
+        accelerations = np.asarray(self.prepare(bodies, dt))
+        mass = bodies.mass
+        total = np.sum(mass)
+        mu = self.G * mass[0]
+        com = mass @ bodies.position / total
+        com_velocity = mass @ bodies.velocity / total
+        q = bodies.position[1:] - bodies.position[0]
+        v = bodies.velocity[1:] - com_velocity
+
+        kick = self.perturbations(q, accelerations, mu)
+        v += 0.5 * dt * kick
+        q += 0.5 * dt * (mass[1:] @ v) / mass[0]
+        q, v = kepler.drift(q, v, mu, dt)
+        q += 0.5 * dt * (mass[1:] @ v) / mass[0]
+
+        # back to the barycentric frame (the barycentre drifts uniformly) for
+        # the force evaluation at the end of the step
+        com = com + com_velocity * dt
+        bodies.position[0] = com - (mass[1:] @ q) / total
+        bodies.position[1:] = q + bodies.position[0]
+        # this step's closing half kick and the next step's opening one act as
+        # one full kick; velocity-dependent forces (GR) are evaluated at the
+        # velocity halfway through it, predicted with this step's kick, which
+        # keeps them second order (newtonian forces do not notice)
+        midway = v + 0.5 * dt * kick
+        bodies.velocity[1:] = midway + com_velocity
+        bodies.velocity[0] = com_velocity - (mass[1:] @ midway) / mass[0]
+        accelerations = np.asarray(self.evaluate(bodies))
+        v += 0.5 * dt * self.perturbations(q, accelerations, mu)
+        bodies.velocity[1:] = v + com_velocity
+        bodies.velocity[0] = com_velocity - (mass[1:] @ v) / mass[0]
+        bodies.acceleration = accelerations
+        self._key = (bodies.version, dt)
+
+INTEGRATORS = {
+    "verlet": lambda accelerations, G: VelocityVerlet(accelerations),
+    "forest_ruth": lambda accelerations, G: Splitting(accelerations, FOREST_RUTH, 4),
+    "pefrl": lambda accelerations, G: Splitting(accelerations, PEFRL, 4),
+    "yoshida6": lambda accelerations, G: Splitting(accelerations, YOSHIDA6, 6),
+    "wisdom_holman": lambda accelerations, G: WisdomHolman(accelerations, G),
+}
+
+def make(name, accelerations, G, velocity_dependent=False):
+    if name not in INTEGRATORS:
+        raise ValueError(f"unknown integrator {name!r}, expected one of {tuple(INTEGRATORS)}")
+    integrator = INTEGRATORS[name](accelerations, G)
+    integrator.velocity_dependent = velocity_dependent
+    if velocity_dependent and isinstance(integrator, Splitting):
+        integrator.order = 2
+    return integrator
+
+
+class AdaptiveTimestep:
+    # error-controlled global step: dt = eta * (shortest pairwise dynamical time,
+    # see gravity.timescales), eta = tolerance^(1/p) since a p-th order
+    # integrator's error over a dynamical time scales as (dt/tau)^p
+    # dt is quantized to dt_max / 2^k, so it only changes (and the integrator's
+    # cached accelerations are only dropped) when the dynamics really change
+    def __init__(self, tolerance=1e-4, dt_max=86400.0, dt_min=1.0, interval=1):
+        self.tolerance = tolerance
+        self.dt_max = dt_max
+        self.dt_min = dt_min
+        # re-measure the timescales every `interval` steps
+        self.interval = interval
+        self.dt = None
+        # (time, dt) every time dt changes
+        self.history = []
+        # dt -> [steps taken, simulated seconds covered]
+        self.usage = {}
+        self._countdown = 0
+
+    def quantize(self, dt):
+        # inf (nothing constrains the step) gives dt_max
+        if dt >= self.dt_max:
+            return self.dt_max
+        level = math.ceil(math.log2(self.dt_max / dt))
+        return max(self.dt_max / 2**level, self.dt_min)
+
+    def choose(self, system):
+        if self.dt is None or self._countdown <= 0:
+            # bodies with no finite timescale do not constrain the step
+            tau = system.calculate_timescales(system.bodies)
+            tau = np.min(tau, initial=np.inf, where=np.isfinite(tau))
+            wanted = self.tolerance ** (1.0 / (system.integrator.order or 2)) * tau
+            dt = self.quantize(wanted)
+            if self.dt is not None and dt > self.dt:
+                # grow one level at a time, and only with some margin so dt
+                # does not flip back and forth across a level boundary
+                dt = 2 * self.dt if wanted >= 2.2 * self.dt else self.dt
+                dt = min(dt, self.dt_max)
+            if dt != self.dt:
+                self.history.append((system.time, dt))
+                self.dt = dt
+            self._countdown = self.interval
+        self._countdown -= 1
+        used = self.usage.setdefault(self.dt, [0, 0.0])
+        used[0] += 1
+        used[1] += self.dt
+        return self.dt
+
+    def summary(self):
+        # one line per dt level: where the steps (CPU) and the simulated time went
+        total = sum(steps for steps, _ in self.usage.values()) or 1
+        lines = []
+        for dt in sorted(self.usage):
+            steps, covered = self.usage[dt]
+            lines.append(f"dt {dt:>12.4g} s: {steps:>9} steps ({100 * steps / total:5.1f}%), {covered:.4g} s simulated")
+        return "\n".join(lines)
+
+
+class BlockTimestep:
+    # hierarchical individual timesteps: within a block of length dt, body i
+    # takes steps of dt / 2^level_i (kick-drift-kick). Every body drifts on every
+    # sub-step, but only the bodies finishing a step get a force evaluation.
+    # Levels come from each body's own dynamical time (eta = sqrt(tolerance) as
+    # in AdaptiveTimestep). A body moves to a finer level whenever it finishes
+    # a step, and to a coarser one (one level at a time) only when the current
+    # time is aligned with the longer step. All bodies are in sync at block ends.
+    def __init__(self, accelerations_on, timescales, tolerance=1e-4, max_level=16):
+        # accelerations_on(bodies, index) -> (k,d), timescales(bodies, index) -> (k,)
+        self.accelerations_on = accelerations_on
+        self.timescales = timescales
+        self.tolerance = tolerance
+        self.eta = math.sqrt(tolerance)
+        self.max_level = max_level
+        # kernel calls, and single-body accelerations computed (N per global step)
+        self.force_evaluations = 0
+        self.body_evaluations = 0
+        self.levels = None
+        self._bodies = None
+        self._key = None
+
+    def invalidate(self):
+        self._key = None
+
+    def evaluate(self, bodies, index):
+        self.force_evaluations += 1
+        self.body_evaluations += len(index)
+        return self.accelerations_on(bodies, index)
+
+    def choose_levels(self, bodies, index, dt):
+        wanted = self.eta * self.timescales(bodies, index)
+        with np.errstate(divide="ignore"):
+            level = np.ceil(np.log2(dt / wanted))
+        return np.clip(np.nan_to_num(level, nan=0.0), 0, self.max_level).astype(np.int64)
+
+    def step(self, bodies, dt):
+        everyone = np.arange(len(bodies))
+        key = (bodies.version, dt)
+        if bodies is not self._bodies or key != self._key:
+            bodies.acceleration = self.evaluate(bodies, everyone)
+            self.levels = self.choose_levels(bodies, everyone, dt)
+            self._bodies = bodies
+        ticks = 1 << self.max_level
+        tick = dt / ticks
+        levels = self.levels
+        # step length of every body in ticks
+        span = ticks >> levels
+        bodies.velocity += 0.5 * bodies.acceleration * (span * tick)[:, np.newaxis]
+        step_end = span.copy()
+        now = 0
+        while now < ticks:
+            then = int(step_end.min())
+            bodies.position += bodies.velocity * ((then - now) * tick)
+            now = then
+            active = np.flatnonzero(step_end == now)
+            accelerations = self.evaluate(bodies, active)
+            bodies.velocity[active] += 0.5 * accelerations * (span[active] * tick)[:, np.newaxis]
+            bodies.acceleration[active] = accelerations
+            if now == ticks:
+                break
+            old = levels[active]
+            wanted = self.choose_levels(bodies, active, dt)
+            coarser = np.maximum(wanted, old - 1)
+            aligned = now % (ticks >> coarser) == 0
+            new = np.where(wanted > old, wanted, np.where((coarser < old) & aligned, coarser, old))
+            levels[active] = new
+            span[active] = ticks >> new
+            bodies.velocity[active] += 0.5 * accelerations * (span[active] * tick)[:, np.newaxis]
+            step_end[active] = now + span[active]
+        # everybody is in sync again, levels are free to change for the next block
+        self.levels = self.choose_levels(bodies, everyone, dt)
+        self._key = key
@@ -0,0 +1,88 @@
+#vectorized two-body (kepler) propagation in universal variables
+#works for elliptic, parabolic and hyperbolic orbits alike, every body at once
+#units: m, kg, s
+import numpy as np
+
+MAX_ITERATIONS = 50
+
+# series terms of the stumpff functions, used where |z| < 1 (everywhere, for
+# steps that are short next to the orbit) and the closed forms lose digits
+_C_TERMS = [1.0 / np.prod(np.arange(1.0, 2 * k + 3)) for k in range(10)]
+_S_TERMS = [1.0 / np.prod(np.arange(1.0, 2 * k + 4)) for k in range(10)]
+
+def stumpff(z):
+    # c(z) = (1 - cos sqrt z) / z, s(z) = (sqrt z - sin sqrt z) / sqrt z^3 and their
+    # hyperbolic continuations for z < 0
+    z = np.asarray(z, dtype=float)
+    x = -z
+    c = np.full_like(z, _C_TERMS[-1])
+    s = np.full_like(z, _S_TERMS[-1])
+    for k in range(len(_C_TERMS) - 2, -1, -1):
+        c = c * x + _C_TERMS[k]
+        s = s * x + _S_TERMS[k]
+    large = np.abs(z) >= 1.0
+    if np.any(large):
+        zl = z[large]
+        sq = np.sqrt(np.abs(zl))
+        with np.errstate(over="ignore", invalid="ignore"):
+            c[large] = np.where(zl > 0, (1.0 - np.cos(sq)) / zl, (np.cosh(sq) - 1.0) / -zl)
+            s[large] = np.where(zl > 0, (sq - np.sin(sq)) / sq**3, (np.sinh(sq) - sq) / sq**3)
+    return c, s
+
+def drift(positions, velocities, mu, dt):
+    # positions, velocities (N,d) relative to the central mass, mu = G M (scalar
+    # or (N,)) -> positions and velocities dt later on their kepler orbits
+    positions = np.asarray(positions, dtype=float)
+    velocities = np.asarray(velocities, dtype=float)
+    if len(positions) == 0:
+        return positions.copy(), velocities.copy()
+    mu = np.broadcast_to(np.asarray(mu, dtype=float), positions.shape[:1])
+    sqrt_mu = np.sqrt(mu)
+    r0 = np.linalg.norm(positions, axis=1)
+    v2 = np.einsum('ij,ij->i', velocities, velocities)
+    # r0 * radial velocity / sqrt(mu), and alpha = 1 / semi-major axis
+    sigma0 = np.einsum('ij,ij->i', positions, velocities) / sqrt_mu
+    alpha = 2.0 / r0 - v2 / mu
+    beta = 1.0 - alpha * r0
+
+    # universal anomaly chi solves the universal kepler equation
+    #   f(chi) = sigma0 chi^2 c + beta chi^3 s + r0 chi - sqrt(mu) dt = 0
+    # by laguerre-conway iteration, which tolerates poor starting guesses
+    chi = np.where(alpha > 0, sqrt_mu * alpha * dt, sqrt_mu * dt / r0)
+    hyperbolic = alpha < 0
+    if np.any(hyperbolic):
+        # vallado's guess, far better than the one above for fast flybys and
+        # long steps, which would otherwise overshoot into cosh overflow
+        a = 1.0 / alpha[hyperbolic]
+        sign = np.sign(dt)
+        with np.errstate(all="ignore"):
+            guess = sign * np.sqrt(-a) * np.log(-2.0 * mu[hyperbolic] * alpha[hyperbolic] * dt /
+                                               (sigma0[hyperbolic] * sqrt_mu[hyperbolic] +
+                                                sign * np.sqrt(-mu[hyperbolic] * a) * beta[hyperbolic]))
+        simple = chi[hyperbolic]
+        chi[hyperbolic] = np.where(np.isfinite(guess) & (np.abs(guess) < np.abs(simple)), guess, simple)
+    n = 5.0
+    for _ in range(MAX_ITERATIONS):
+        z = alpha * chi**2
+        c, s = stumpff(z)
+        f = sigma0 * chi**2 * c + beta * chi**3 * s + r0 * chi - sqrt_mu * dt
+        # f' is the radius at chi
+        df = sigma0 * chi * (1.0 - z * s) + beta * chi**2 * c + r0
+        ddf = sigma0 * (1.0 - z * c) + beta * chi * (1.0 - z * s)
+        root = np.sqrt(np.abs((n - 1.0)**2 * df**2 - n * (n - 1.0) * f * ddf))
+        step = n * f / (df + np.copysign(root, df))
+        chi = chi - step
+        if np.all(np.abs(step) <= 1e-15 * np.abs(chi)):
+            break
+
+    z = alpha * chi**2
+    c, s = stumpff(z)
+    r = sigma0 * chi * (1.0 - z * s) + beta * chi**2 * c + r0
+    # lagrange coefficients, as f - 1 and g' - 1 so small steps keep their digits
+    f_1 = -chi**2 * c / r0
+    g = dt - chi**3 * s / sqrt_mu
+    df_ = sqrt_mu / (r * r0) * chi * (z * s - 1.0)
+    dg_1 = -chi**2 * c / r
+    new_positions = positions + (f_1[:, np.newaxis] * positions + g[:, np.newaxis] * velocities)
+    new_velocities = velocities + (df_[:, np.newaxis] * positions + dg_1[:, np.newaxis] * velocities)
+    return new_positions, new_velocities
@@ -1,27 +1,23 @@
 #n body grav simulation using verlet integration
 #visualized in pygame
 import numpy as np
-import pygame
-from pygame import Vector2
+import os
 import sys
-class Body:
-    def __init__(self, mass, position, velocity, color):
-        self.mass = mass
-        self.position = np.array(position, dtype=float)
-        self.velocity = np.array(velocity, dtype=float)
-        self.acceleration = np.array([0.0, 0.0])
-        self.color = color
-        self.trail = []
-class GravitationalSystem:
+from bodystore import Body, BodyStore
+import checkpoint
+import integrators
+import nbody
+import trajectory
+class GravitationalSystem(nbody.GravitationalSystem):
     #units: m, kg, s
     G = 6.67430e-11  # gravitational constant
-    def __init__(self, num_bodies):
+    def __init__(self, num_bodies=2):
         au = 1.496e11
         perihelion = 1.471e11
         sunmass = 1.989e30
         earthmass = 5.9722e24
         p_earthvel = 3e4 #velocity at perihelion = 30,000m/s
-        self.bodies = [
+        self.bodies = BodyStore([
                 Body(sunmass, [0, 0], [0, 0], (255, 255, 255)), 
                 Body(earthmass, [perihelion, 0], [0, p_earthvel], (255, 0, 0)), 
                 #Body(grav, [1.5e9, 1.5e9], [-vel, 0], (0, 0, 255)),
@@ -35,79 +31,95 @@ class GravitationalSystem:
                 #Body(grav*1e1, [-1e13, 7.5e9], [vel*1e2, 0], (128, 128, 255)),
                 #Body(grav, [0, 1.5e9], [0, -vel], (0, 255, 0)),
                 #Body(grav, [0, 0], [vel, 0], (255, 255, 0))
-        ]
+        ], trail_length=100)
         # SIM PARAMS 
         self.dt = 3600 # time step in seconds
         self.scale = 1e9 # pixels per million km 
-    def calculate_acceleration(self, bodies):
-        accelerations = [np.array([0.0, 0.0]) for _ in bodies]
-        for i in range(len(bodies)):
-            for j in range(i+1, len(bodies)):
-                r = bodies[j].position - bodies[i].position
-                r_mag = np.linalg.norm(r)
-                force_mag = self.G * bodies[i].mass * bodies[j].mass / (r_mag ** 2)
-                force = force_mag * r / r_mag
-                accelerations[i] += force / bodies[i].mass
-                accelerations[j] -= force / bodies[j].mass
-        return accelerations
-    
+        self.integrator = integrators.VelocityVerlet(self.calculate_acceleration)
     def verlet_step(self):
-        old_accelerations = self.calculate_acceleration(self.bodies)
-        for i, body in enumerate(self.bodies):
-            body.position += body.velocity * self.dt + 0.5 * old_accelerations[i] * self.dt**2
-
-        accelerations = self.calculate_acceleration(self.bodies)
-        for i, body in enumerate(self.bodies):
-            body.velocity += 0.5 * (old_accelerations[i] + accelerations[i]) * self.dt
-            body.trail.append(body.position.copy())
-            if len(body.trail) > 100:
-                body.trail.pop(0)
+        super().verlet_step()
+        self.bodies.trails.record(self.bodies.position)
 
 class Simulator:
-    def __init__(self, width=1920, height=1080):
+    def __init__(self, width=1920, height=1080, threaded=False, checkpoint_path=None, replay_path=None):
         pygame.init()
         self.width = width
         self.height = height
         self.screen = pygame.display.set_mode((width, height))
         pygame.display.set_caption("N-Body Gravitational Simulation")
         self.system = GravitationalSystem(2)
-        self.clock = pygame.time.Clock()
+        # carry on from a checkpoint (see checkpoint.py) if there is one, saved
+        # every minute and on quit
+        self.autosave = checkpoint.Autosave(checkpoint_path) if checkpoint_path and not replay_path else None
+        if self.autosave and os.path.exists(checkpoint_path):
+            checkpoint.restore(self.system, checkpoint_path)
+        # as many physics steps per frame as fit in a 60 fps frame ("," switches to
+        # a fixed, interpolated pace), see scheduler.FrameScheduler; threaded: the
+        # physics runs on its own thread instead, see worker.PhysicsWorker
+        if replay_path:
+            # play a recorded run back instead (see replay.Replay), nothing is integrated
+            self.scheduler = replay.Replay(trajectory.Trajectory(replay_path), fps=60)
+        elif threaded:
+            self.scheduler = worker.PhysicsWorker(self.system, fps=60).start()
+        else:
+            self.scheduler = scheduler.FrameScheduler(fps=60)
+        self.hud = render.Hud((width, height))
+        self.view = render.Camera(width, height, self.system.scale)
+        self.sprites = render.BodySprites(self.body_radii)
+        self.trail_layer = render.TrailLayer((width, height), fade=3, lines=True)
         
-    def world_to_screen(self, position):
-        # Convert world coordinates to screen coordinates
-        screen_x = position[0] / self.system.scale + self.width // 2
-        screen_y = position[1] / self.system.scale + self.height // 2
-        return int(screen_x), int(screen_y)
+    def world_to_screen(self, positions):
+        # world coordinates -> integer screen coordinates, a whole (N,3) array at once
+        return self.view.to_screen(positions)
+
+    def body_radii(self, masses):
+        # Size based on mass (logarithmic scale)
+        return (np.log10(masses) - 20).astype(int)
+
+    def render_text(self):
+        # composes the HUD overlay, run() calls it whenever the HUD is due a refresh
+        self.hud.text(f"{self.scheduler.days_per_second():.1f} simulated days/s, {self.scheduler.steps} steps/frame", (10, self.height - 30))
     
     def run(self):
         while True:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    self.scheduler.stop()
+                    if self.autosave:
+                        self.autosave.save(self.system)
                     pygame.quit()
                     sys.exit()
+                self.view.handle(event)
+                self.scheduler.handle(event)
             
             # Physics update
-            self.system.verlet_step()
+            # what to draw: positions (between the last two steps when paced), trails, HUD values
+            if self.autosave and self.autosave.due():
+                with self.scheduler.paused():
+                    self.autosave.save(self.system)
+            frame = self.scheduler.frame(self.system)
+            self.view.update(self.system.bodies, frame.position)
             
-            # Drawing
-            self.screen.fill((0, 0, 0))
+            # Drawing, the trail layer also clears the screen
+            self.trail_layer.update(frame.trails, [body.color for body in self.system.bodies], self.view)
+            self.trail_layer.draw(self.screen)
             
             # Draw bodies
-            for body in self.system.bodies:
-                # Draw trails
-                for trail_pos in body.trail:
-                    screen_pos = self.world_to_screen(trail_pos)
-                    pygame.draw.circle(self.screen, body.color, screen_pos, 1)
-                
-                # Draw bodies
-                pos = self.world_to_screen(body.position)
-                # Size based on mass (logarithmic scale)
-                radius = int(np.log10(body.mass) - 20)
-                pygame.draw.circle(self.screen, body.color, pos, radius)
-            
+            self.sprites.draw(self.screen, self.view, self.system.bodies, frame.position)
+            if self.hud.begin():
+                self.render_text()
+            self.hud.draw(self.screen)
             pygame.display.flip()
-            self.clock.tick(60000)
 
 if __name__ == "__main__":
-    sim = Simulator()
+    # the window's modules are only loaded here, importing the script for its
+    # GravitationalSystem (headless.py, ensemble.py) never touches pygame
+    import cli
+    import pygame
+    import render
+    import replay
+    import scheduler
+    import worker
+    args = cli.parser("n body gravitation simulator").parse_args()
+    sim = Simulator(threaded=args.threaded, checkpoint_path=args.checkpoint, replay_path=args.replay)
     sim.run()
@@ -1,24 +1,19 @@
 #n body grav simulation using verlet integration
 #visualized in pygame
 import numpy as np
-import pygame
 import math
-from pygame import Vector2
+import os
 import sys
-class Body:
-    def __init__(self, mass, position, velocity, color):
-        self.mass = mass
-        self.position = np.array(position, dtype=float)
-        self.velocity = np.array(velocity, dtype=float)
-        self.acceleration = np.array([0.0, 0.0, 0.0])
-        self.color = color
-        self.trail = []
-
-class GravitationalSystem:
+from bodystore import Body, BodyStore
+import checkpoint
+import integrators
+import nbody
+import trajectory
+class GravitationalSystem(nbody.GravitationalSystem):
     #units: m, kg, s
     G = 6.67430e-11  # gravitational constant
     earth_sun_max_distance = 0
-    def __init__(self, num_bodies):
+    def __init__(self, num_bodies=15):
         
         #MASS
         mass_sun = 1.989e30
@@ -83,7 +78,7 @@ class GravitationalSystem:
         zmax_uranus=3e9
         zmax_neptune=4.5e9
 
-        self.bodies = [
+        self.bodies = BodyStore([
                 Body(mass_sun, [0, 0, 0], [0, 0, 0], (255, 255, 0)), 
                 Body(mass_earth, [pdist_earth, 0 , zmax_earth], [0, pvel_earth, 0], (0, 150, 245)), 
                 Body(mass_moon, [pdist_moon, 0, zmax_earth], [0, pvel_moon, 0], (255, 255, 255)), 
@@ -99,108 +94,113 @@ class GravitationalSystem:
                 Body(mass_saturn, [pdist_saturn, 0, zmax_saturn], [0, pvel_saturn, 0], (100,100, 0)), 
                 Body(mass_uranus, [pdist_uranus, 0, zmax_uranus], [0, pvel_uranus, 0], (100, 100, 100)), 
                 Body(mass_neptune, [pdist_neptune, 0, zmax_neptune], [0, pvel_neptune, 0], (0, 10, 255)), 
-        ]
+        ], trail_length=1000)
         # SIM PARAMS 
         # time step in seconds
         self.dt = 60000
         # pixels per million km
         self.scale = 1e10
-    def calculate_acceleration(self, bodies):
-        accelerations = [np.array([0.0, 0.0, 0.0]) for _ in bodies]
-        for i in range(len(bodies)):
-            for j in range(i+1, len(bodies)):
-                r = bodies[j].position - bodies[i].position
-                r_mag = np.linalg.norm(r)
-                force_mag = self.G * bodies[i].mass * bodies[j].mass / (r_mag ** 2)
-                force = force_mag * r / r_mag
-                accelerations[i] += force / bodies[i].mass
-                accelerations[j] -= force / bodies[j].mass
-        return accelerations
-    
+        self.integrator = integrators.VelocityVerlet(self.calculate_acceleration)
     def verlet_step(self):
-        old_accelerations = self.calculate_acceleration(self.bodies)
-        for i, body in enumerate(self.bodies):
-            body.position += body.velocity * self.dt + 0.5 * old_accelerations[i] * self.dt**2
-
-        accelerations = self.calculate_acceleration(self.bodies)
-        for i, body in enumerate(self.bodies):
-            body.velocity += 0.5 * (old_accelerations[i] + accelerations[i]) * self.dt
-            body.trail.append(body.position.copy())
-            if len(body.trail) > 1:
-                body.trail.pop(0)
+        super().verlet_step()
+        self.bodies.trails.record(self.bodies.position)
         
 
 class Simulator:
-    def __init__(self, width=1920, height=1080):
+    def __init__(self, width=1920, height=1080, threaded=False, checkpoint_path=None, replay_path=None):
         pygame.init()
         self.width = width
         self.height = height
         self.screen = pygame.display.set_mode((width, height))
         pygame.display.set_caption("N-Body Gravitational Simulation")
         self.system = GravitationalSystem(15)
-        self.clock = pygame.time.Clock()
+        # carry on from a checkpoint (see checkpoint.py) if there is one, saved
+        # every minute and on quit
+        self.autosave = checkpoint.Autosave(checkpoint_path) if checkpoint_path and not replay_path else None
+        if self.autosave and os.path.exists(checkpoint_path):
+            checkpoint.restore(self.system, checkpoint_path)
+        # as many physics steps per frame as fit in a 60 fps frame ("," switches to
+        # a fixed, interpolated pace), see scheduler.FrameScheduler; threaded: the
+        # physics runs on its own thread instead, see worker.PhysicsWorker
+        if replay_path:
+            # play a recorded run back instead (see replay.Replay), nothing is integrated
+            self.scheduler = replay.Replay(trajectory.Trajectory(replay_path), fps=60, capture=self.hud_values)
+        elif threaded:
+            self.scheduler = worker.PhysicsWorker(self.system, fps=60, capture=self.hud_values).start()
+        else:
+            self.scheduler = scheduler.FrameScheduler(fps=60, capture=self.hud_values)
+        self.hud = render.Hud((width, height))
+        self.view = render.Camera(width, height, self.system.scale)
+        self.sprites = render.BodySprites(self.body_radii)
+        self.trail_layer = render.TrailLayer((width, height), fade=0, lines=True)
         
-    def world_to_screen(self, position):
-        # Convert world coordinates to screen coordinates
-        screen_x = position[0] / self.system.scale + self.width // 2
-        screen_y = position[1]/ self.system.scale + self.height // 2
-        return int(screen_x), int(screen_y)
+    def world_to_screen(self, positions):
+        # world coordinates -> integer screen coordinates, a whole (N,3) array at once
+        return self.view.to_screen(positions)
 
-    def render_text(self):
-        # Initialize font
-        font = pygame.font.Font(None, 24)
-        
+    def body_radii(self, masses):
+        # Size based on mass (logarithmic scale)
+        return np.maximum(2, (np.log10(masses) - 20).astype(int))
+
+    def hud_values(self, system):
+        # what the HUD shows, read off the system (on the physics thread when threaded)
         # Get the sun and earth bodies
-        sun, earth = self.system.bodies[0], self.system.bodies[1]
+        sun, earth = system.bodies[0], system.bodies[1]
         
         # Calculate distance
         distance = np.linalg.norm(earth.position - sun.position)
         
         # Calculate velocity magnitude
         velocity_mag = np.linalg.norm(earth.velocity)
-        
-        #Render xyz text
-        position_text = f"Earth position: ({earth.position[0]:.1}, {earth.position[1]:.1}, {earth.position[2]:.1})"
-        position_surface= font.render(position_text, True, (255, 255, 255))
+        return distance, velocity_mag, earth.position.copy()
 
-        # Render distance text
+    def render_text(self, values):
+        # composes the HUD overlay from hud_values, run() calls it whenever the HUD is due a refresh
+        self.hud.text(f"{self.scheduler.days_per_second():.1f} simulated days/s, {self.scheduler.steps} steps/frame", (10, self.height - 30))
+        distance, velocity_mag, position = values
+        position_text = f"Earth position: ({position[0]:.1}, {position[1]:.1}, {position[2]:.1})"
         distance_text = f"Earth-sun distance: {distance/1e9:.2f} million km"
-        distance_surface = font.render(distance_text, True, (255, 255, 255))
-        
-        # Render velocity text
         velocity_text = f"Earth orbital velocity: {velocity_mag/1000:.2f} km/s"
-        velocity_surface = font.render(velocity_text, True, (255, 255, 255))
         
         # Position texts in top right corner
-        self.screen.blit(distance_surface, (self.width - 300, 10))
-        self.screen.blit(velocity_surface, (self.width - 300, 40))
-        self.screen.blit(position_surface, (self.width - 300, 70))
+        self.hud.text(distance_text, (self.width - 300, 10))
+        self.hud.text(velocity_text, (self.width - 300, 40))
+        self.hud.text(position_text, (self.width - 300, 70))
         
     def run(self):
         while True:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    self.scheduler.stop()
+                    if self.autosave:
+                        self.autosave.save(self.system)
                     pygame.quit()
                     sys.exit()
-            self.system.verlet_step()
-            self.screen.fill((0, 0, 0))
-            for i,body in enumerate(self.system.bodies):
-                for trail_pos in body.trail:
-                    screen_pos = self.world_to_screen(trail_pos)
-                    pygame.draw.circle(self.screen, body.color, screen_pos, 1)
-                #scaled_position = body.position.copy()
-                #if (i > 0):
-                #    scaled_position/=i
-                #pos = self.world_to_screen(scaled_position)
-                pos = self.world_to_screen(body.position)
-                radius = max(2, int(np.log10(body.mass) - 20))
-                #if body == self.system.bodies[0]:
-                #    radius = 1
-                pygame.draw.circle(self.screen, body.color, pos, radius)
-            self.render_text() 
+                self.view.handle(event)
+                self.scheduler.handle(event)
+            # what to draw: positions (between the last two steps when paced), trails, HUD values
+            if self.autosave and self.autosave.due():
+                with self.scheduler.paused():
+                    self.autosave.save(self.system)
+            frame = self.scheduler.frame(self.system)
+            self.view.update(self.system.bodies, frame.position)
+            self.trail_layer.update(frame.trails, [body.color for body in self.system.bodies], self.view)
+            self.trail_layer.draw(self.screen)
+            self.sprites.draw(self.screen, self.view, self.system.bodies, frame.position)
+            if self.hud.begin():
+                self.render_text(frame.values)
+            self.hud.draw(self.screen)
             pygame.display.flip()
-            self.clock.tick(600000)
 
 if __name__ == "__main__":
-    sim = Simulator()
+    # the window's modules are only loaded here, importing the script for its
+    # GravitationalSystem (headless.py, ensemble.py) never touches pygame
+    import cli
+    import pygame
+    import render
+    import replay
+    import scheduler
+    import worker
+    args = cli.parser("solar system").parse_args()
+    sim = Simulator(threaded=args.threaded, checkpoint_path=args.checkpoint, replay_path=args.replay)
     sim.run()
@@ -0,0 +1,101 @@
+#pygame-free core shared by the gravitational simulation scripts
+#each script subclasses GravitationalSystem and fills in its bodies, dt and integrator,
+#the system can then be stepped by a Simulator or run headless with run()
+import numpy as np
+import barnes_hut
+import gravity
+import integrators
+
+FORCE_SOLVERS = ("direct", "barnes_hut")
+
+class GravitationalSystem:
+    #units: m, kg, s
+    G = 6.67430e-11  # gravitational constant
+    # "direct" sums every pair exactly, "barnes_hut" walks a tree in O(N log N)
+    force_solver = "direct"
+    # barnes-hut opening angle: smaller is more accurate and slower
+    theta = 0.5
+    # simulated seconds since the start
+    time = 0.0
+    # optional integrators.AdaptiveTimestep that picks dt before every step
+    timestep = None
+    # optional tracers.Tracers, massless particles stepped along with the bodies
+    tracers = None
+    # calculate_acceleration depends on the velocities too (see integrators.Splitting)
+    velocity_dependent = False
+
+    def use_force_solver(self, name, theta=None):
+        if name not in FORCE_SOLVERS:
+            raise ValueError(f"unknown force solver {name!r}, expected one of {FORCE_SOLVERS}")
+        self.force_solver = name
+        if theta is not None:
+            self.theta = theta
+        self.integrator.invalidate()
+
+    def use_integrator(self, name):
+        # any of integrators.INTEGRATORS: "verlet", "forest_ruth", "pefrl", "yoshida6",
+        # "wisdom_holman" (body 0 must be the dominant mass)
+        self.integrator = integrators.make(name, self.calculate_acceleration, self.G, self.velocity_dependent)
+
+    def calculate_acceleration(self, bodies):
+        if self.force_solver == "barnes_hut":
+            return barnes_hut.accelerations(bodies.position, bodies.mass, self.G, self.theta)
+        return gravity.accelerations(bodies.position, bodies.mass, self.G)
+
+    def calculate_acceleration_on(self, bodies, index):
+        # accelerations of just the bodies in index, pulled by everybody, for
+        # integrators.BlockTimestep (a subclass with its own calculate_acceleration
+        # needs its own version of this too)
+        if self.force_solver == "barnes_hut":
+            return barnes_hut.accelerations(bodies.position, bodies.mass, self.G, self.theta, index=index)
+        return gravity.accelerations_at(bodies.position[index], bodies.position, bodies.mass, self.G)
+
+    def calculate_tracer_acceleration(self, points):
+        # accelerations of massless tracers at points (M,d), pulled by the bodies only
+        return gravity.tracer_accelerations(points, self.bodies.position, self.bodies.mass, self.G)
+
+    def calculate_timescales(self, bodies, index=None):
+        return gravity.timescales(bodies.position, bodies.velocity, bodies.mass, self.G, index)
+
+    def potential_energy(self):
+        return gravity.potential_energy(self.bodies.position, self.bodies.mass, self.G)
+
+    def total_energy(self):
+        # newtonian kinetic + potential energy, J
+        bodies = self.bodies
+        kinetic = 0.5 * np.sum(bodies.mass * np.einsum('ij,ij->i', bodies.velocity, bodies.velocity))
+        return kinetic + self.potential_energy()
+
+    def choose_dt(self):
+        if self.timestep is not None:
+            self.dt = self.timestep.choose(self)
+        return self.dt
+
+    def advance(self):
+        # one integrator step of the current dt, the tracers (if any) alongside
+        tracers = self.tracers
+        if tracers is not None:
+            tracers.prepare(self)
+        self.integrator.step(self.bodies, self.dt)
+        self.time += self.dt
+        if tracers is not None:
+            tracers.step(self, self.dt)
+
+    def verlet_step(self):
+        self.choose_dt()
+        self.advance()
+
+    def run(self, steps=None, until=None, callback=None, every=1):
+        # integrate as fast as possible, no rendering involved
+        # stops after `steps` steps or once self.time reaches `until` (the last
+        # step may overshoot it by less than dt), callback(self) fires every
+        # `every` steps; returns the number of steps taken
+        if steps is None and until is None:
+            raise ValueError("run() needs steps or until")
+        step = 0
+        while (steps is None or step < steps) and (until is None or self.time < until):
+            self.verlet_step()
+            step += 1
+            if callback is not None and step % every == 0:
+                callback(self)
+        return step
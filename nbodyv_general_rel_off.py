@@ -1,26 +1,27 @@
 #n body grav simulation using verlet integration
 #visualized in pygame
 import numpy as np
-import pygame
 import math
-from pygame import Vector2
+import os
 import sys
-class Body:
+import bodystore
+import checkpoint
+import integrators
+import nbody
+import trajectory
+class Body(bodystore.Body):
+    __slots__ = ("pericount",)
+
     def __init__(self, mass, position, velocity, color):
-        self.mass = mass
-        self.position = np.array(position, dtype=float)
-        self.velocity = np.array(velocity, dtype=float)
-        self.acceleration = np.array([0.0, 0.0, 0.0])
-        self.color = color
-        self.trail = []
+        super().__init__(mass, position, velocity, color)
         self.pericount = 0
 
-class GravitationalSystem:
+class GravitationalSystem(nbody.GravitationalSystem):
     #units: m, kg, s
     G = 6.67430e-11  # gravitational constant
     earth_sun_max_distance = 0
     RELATIVITY_ON = False 
-    def __init__(self, num_bodies):
+    def __init__(self, num_bodies=2):
         
         #MASS
         mass_sun = 1.989e30
@@ -85,7 +86,7 @@ class GravitationalSystem:
         zmax_uranus=3e9
         zmax_neptune=4.5e9
 
-        self.bodies = [
+        self.bodies = bodystore.BodyStore([
                 Body(mass_sun, [0, 0, 0], [0, 0, 0], (255, 255, 0)), 
                 #Body(mass_earth, [pdist_earth, 0 , zmax_earth], [0, pvel_earth, 0], (0, 150, 245)), 
                 #Body(mass_moon, [pdist_moon, 0, zmax_earth], [0, pvel_moon, 0], (255, 255, 255)), 
@@ -101,98 +102,104 @@ class GravitationalSystem:
                 #Body(mass_saturn, [pdist_saturn, 0, zmax_saturn], [0, pvel_saturn, 0], (100,100, 0)), 
                 #Body(mass_uranus, [pdist_uranus, 0, zmax_uranus], [0, pvel_uranus, 0], (100, 100, 100)), 
                 #Body(mass_neptune, [pdist_neptune, 0, zmax_neptune], [0, pvel_neptune, 0], (0, 10, 255)), 
-        ]
+        ], trail_length=3)
         # SIM PARAMS 
         # time step in seconds
         self.dt = 60
         # pixels per million km
         self.scale = 2e8
+        self.integrator = integrators.VelocityVerlet(self.calculate_acceleration)
 
-    def calculate_acceleration(self, bodies):
-        accelerations = [np.array([0.0, 0.0, 0.0]) for _ in bodies]
-        for i in range(len(bodies)):
-            for j in range(i+1, len(bodies)):
-                r = bodies[j].position - bodies[i].position
-                r_mag = np.linalg.norm(r)
-                force_mag = self.G * bodies[i].mass * bodies[j].mass / (r_mag ** 2)
-                force = force_mag * r / r_mag
-                accelerations[i] += force / bodies[i].mass
-                accelerations[j] -= force / bodies[j].mass
-        return accelerations
-    
     def verlet_step(self):
-        old_accelerations = self.calculate_acceleration(self.bodies)
-        for i, body in enumerate(self.bodies):
-            body.position += body.velocity * self.dt + 0.5 * old_accelerations[i] * self.dt**2
-
-        accelerations = self.calculate_acceleration(self.bodies)
+        super().verlet_step()
         for i, body in enumerate(self.bodies):
-            body.velocity += 0.5 * (old_accelerations[i] + accelerations[i]) * self.dt
             #mercury perihelion detect and track
             if i == 1:
                 error_margin = 1e-4
                 if (5.897e4 - np.linalg.norm(body.velocity) < error_margin):
                     body.pericount += 1
                     print("OFF_PERI", body.pericount, " ", body.position)
-                    body.trail.append(body.position.copy())
-            if len(body.trail) > 3:
-                body.trail.pop(0)
+                    # the last three perihelia stay marked
+                    self.bodies.trails.push(i, body.position)
         
 
 class Simulator:
-    def __init__(self, width=800, height=800):
+    def __init__(self, width=800, height=800, threaded=False, checkpoint_path=None, replay_path=None):
         pygame.init()
         self.width = width
         self.height = height
         self.screen = pygame.display.set_mode((width, height))
         pygame.display.set_caption("mercury precession gr demo")
         self.system = GravitationalSystem(2)
-        self.clock = pygame.time.Clock()
+        # carry on from a checkpoint (see checkpoint.py) if there is one, saved
+        # every minute and on quit
+        self.autosave = checkpoint.Autosave(checkpoint_path) if checkpoint_path and not replay_path else None
+        if self.autosave and os.path.exists(checkpoint_path):
+            checkpoint.restore(self.system, checkpoint_path)
+        # as many physics steps per frame as fit in a 60 fps frame ("," switches to
+        # a fixed, interpolated pace), see scheduler.FrameScheduler; threaded: the
+        # physics runs on its own thread instead, see worker.PhysicsWorker
+        if replay_path:
+            # play a recorded run back instead (see replay.Replay), nothing is integrated;
+            # the trails here are perihelion markers, not part of the recording
+            self.scheduler = replay.Replay(trajectory.Trajectory(replay_path), fps=60, trails=False)
+        elif threaded:
+            self.scheduler = worker.PhysicsWorker(self.system, fps=60).start()
+        else:
+            self.scheduler = scheduler.FrameScheduler(fps=60)
+        self.hud = render.Hud((width, height))
+        self.view = render.Camera(width, height, self.system.scale)
+        self.sprites = render.BodySprites(self.body_radii)
+        self.trail_layer = render.TrailLayer((width, height), fade=0, lines=False, persist=False)
         
-    def world_to_screen(self, position):
-        # Convert world coordinates to screen coordinates
-        screen_x = position[0] / self.system.scale + self.width // 2
-        screen_y = position[1]/ self.system.scale + self.height // 2
-        return int(screen_x), int(screen_y)
+    def world_to_screen(self, positions):
+        # world coordinates -> integer screen coordinates, a whole (N,3) array at once
+        return self.view.to_screen(positions)
+
+    def body_radii(self, masses):
+        # Size based on mass (logarithmic scale)
+        return np.maximum(2, (np.log10(masses) - 20).astype(int))
 
     def render_text(self):
-        # Initialize font
-        font = pygame.font.Font(None, 24)
-        precession_text = ("Relativity : OFF")
-        precession_surface = font.render(precession_text, True, (255, 255, 255))
-        self.screen.blit(precession_surface, (self.width - 300, 100)) 
+        # composes the HUD overlay, run() calls it whenever the HUD is due a refresh
+        self.hud.text(f"{self.scheduler.days_per_second():.1f} simulated days/s, {self.scheduler.steps} steps/frame", (10, self.height - 30))
+        self.hud.text("Relativity : OFF", (self.width - 300, 100))
         
     def run(self):
         while True:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    self.scheduler.stop()
+                    if self.autosave:
+                        self.autosave.save(self.system)
                     pygame.quit()
                     sys.exit()
-            self.system.verlet_step()
-            self.screen.fill((0, 0, 0))
-            for i,body in enumerate(self.system.bodies):
-                for t, trail_pos in enumerate(body.trail):
-                    screen_pos = self.world_to_screen(trail_pos)
-                    pygame.draw.circle(self.screen, (255,255,255), screen_pos, 1)
-                    #if t == 1:
-                    #    pygame.draw.circle(self.screen, (255,0,0), screen_pos, 1)
-                    #elif t == 2:
-                    #    pygame.draw.circle(self.screen, (0,255,0), screen_pos, 1)
-                    #else:
-                    #    pygame.draw.circle(self.screen, (100,100,255), screen_pos, 1)
-                #scaled_position = body.position.copy()
-                #if (i > 0):
-                #    scaled_position/=i
-                #pos = self.world_to_screen(scaled_position)
-                pos = self.world_to_screen(body.position)
-                radius = max(2, int(np.log10(body.mass) - 20))
-                #if body == self.system.bodies[0]:
-                #    radius = 1
-                pygame.draw.circle(self.screen, body.color, pos, radius)
-            self.render_text() 
+                self.view.handle(event)
+                self.scheduler.handle(event)
+            # what to draw: positions (between the last two steps when paced), trails, HUD values
+            if self.autosave and self.autosave.due():
+                with self.scheduler.paused():
+                    self.autosave.save(self.system)
+            frame = self.scheduler.frame(self.system)
+            self.view.update(self.system.bodies, frame.position)
+            # perihelion markers in white, only the last three (the trail buffer) are shown
+            self.trail_layer.update(frame.trails, [(255, 255, 255)] * len(self.system.bodies), self.view)
+            self.trail_layer.draw(self.screen)
+            self.sprites.draw(self.screen, self.view, self.system.bodies, frame.position)
+            if self.hud.begin():
+                self.render_text()
+            self.hud.draw(self.screen)
             pygame.display.flip()
-            self.clock.tick(600000)
 
 if __name__ == "__main__":
-    sim = Simulator()
+    # the window's modules are only loaded here, importing the script for its
+    # GravitationalSystem (headless.py, ensemble.py) never touches pygame
+    import cli
+    import pygame
+    import render
+    import replay
+    import scheduler
+    import worker
+    args = cli.parser("mercury perihelion, newtonian").parse_args()
+    sim = Simulator(threaded=args.threaded, checkpoint_path=args.checkpoint, replay_path=args.replay)
     sim.run()
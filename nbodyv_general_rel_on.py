@@ -1,29 +1,36 @@
 #n body grav simulation using verlet integration
 #visualized in pygame
 import numpy as np
-import pygame
 import math
-from pygame import Vector2
+import os
 import sys
-class Body:
+import bodystore
+import checkpoint
+import events
+import gravity
+import integrators
+import nbody
+import trajectory
+class Body(bodystore.Body):
+    __slots__ = ("vels", "pericount", "peri_angle")
+
     def __init__(self, mass, position, velocity, color):
-        self.mass = mass
-        self.position = np.array(position, dtype=float)
-        self.velocity = np.array(velocity, dtype=float)
-        self.acceleration = np.array([0.0, 0.0, 0.0])
-        self.color = color
-        self.trail = []
+        super().__init__(mass, position, velocity, color)
         self.vels = []
         self.pericount = 0
         self.peri_angle = 0
-        self.steps_since_peri = 0
 
-class GravitationalSystem:
+# speed of light, m/s
+C = 299792458.0
+
+class GravitationalSystem(nbody.GravitationalSystem):
     #units: m, kg, s
     G = 6.67430e-11  # gravitational constant
     earth_sun_max_distance = 0
     RELATIVITY_ON = True 
-    def __init__(self, num_bodies):
+    # the post-newtonian force depends on the velocities
+    velocity_dependent = True
+    def __init__(self, num_bodies=3, pvel_mercury=5.897e4, gr_scale=1e4):
         
         #MASS
         mass_sun = 1.989e30
@@ -45,7 +52,6 @@ class GravitationalSystem:
 
         #VELOCITY_AT_PERIHELION
         pvel_circle = 2.978e4
-        pvel_mercury = 5.897e4
         pvel_venus = 3.526e4
         pvel_earth = 3.029e4
         pvel_mars = 2.65e4
@@ -88,7 +94,7 @@ class GravitationalSystem:
         zmax_uranus=3e9
         zmax_neptune=4.5e9
 
-        self.bodies = [
+        self.bodies = bodystore.BodyStore([
                 Body(mass_sun, [0, 0, 0], [0, 0, 0], (255, 255, 0)), 
                 #Body(mass_earth, [pdist_earth, 0 , zmax_earth], [0, pvel_earth, 0], (0, 150, 245)), 
                 #Body(mass_moon, [pdist_moon, 0, zmax_earth], [0, pvel_moon, 0], (255, 255, 255)), 
@@ -105,136 +111,155 @@ class GravitationalSystem:
                 #Body(mass_saturn, [pdist_saturn, 0, zmax_saturn], [0, pvel_saturn, 0], (100,100, 0)), 
                 #Body(mass_uranus, [pdist_uranus, 0, zmax_uranus], [0, pvel_uranus, 0], (100, 100, 100)), 
                 #Body(mass_neptune, [pdist_neptune, 0, zmax_neptune], [0, pvel_neptune, 0], (0, 10, 255)), 
-        ]
+        ], trail_length=1)
         # SIM PARAMS 
         # time step in seconds
         self.dt = 1000
         # pixels per million km
         self.scale = 2e8
+        # mercury perihelion speed
+        self.pvel_mercury = pvel_mercury
+        # GR correction exaggeration for demo purposes
+        self.gr_scale = gr_scale
+        # the bodies the GR correction applies to: only planet 2 BLUE
+        self.relativistic = np.array([False, False, True])
+        # bodies only interact with the sun (the two mercuries overlap)
+        n = len(self.bodies)
+        self.pairs = np.zeros((n, n), dtype=bool)
+        self.pairs[0, 1:] = self.pairs[1:, 0] = True
+        self.integrator = integrators.VelocityVerlet(self.calculate_acceleration)
+        # perihelia of the two mercuries
+        self.perihelia = events.EventDetector([events.periapsis([1, 2])])
 
     def calculate_acceleration(self, bodies):
-        c = 299792458.0
-        accelerations = [np.array([0.0, 0.0, 0.0]) for _ in bodies]
-        i = 0
-        for j in range(i+1, len(bodies)):
-            r = bodies[j].position - bodies[i].position
-            r_mag = np.linalg.norm(r)
-            force_mag = self.G * bodies[i].mass * bodies[j].mass / (r_mag ** 2)
-            if(j == 2): #only applying correction to planet 2 BLUE
-                v_i = np.linalg.norm(bodies[i].velocity)
-                v_j = np.linalg.norm(bodies[j].velocity) #exaggerated for demo purposes
-                pn2_correction = 1.0 + (
-                    1e4*((4 * self.G * (bodies[i].mass + bodies[j].mass)) / (r_mag * c**2) 
-                     - (4 * self.G**2 * (bodies[i].mass * bodies[j].mass) / (r_mag**3 * c**2)) 
-                     - ((v_i**2 + v_j**2) / (2 * c**2))))
-                force_mag *= pn2_correction
-            force = force_mag * r / r_mag
-            accelerations[i] += force / bodies[i].mass
-            accelerations[j] -= force / bodies[j].mass
-        return accelerations
+        # newtonian gravity plus the first post-newtonian (EIH) correction of the
+        # relativistic bodies, exaggerated gr_scale times (see gravity.post_newtonian)
+        return gravity.post_newtonian(bodies.position, bodies.velocity, bodies.mass, self.G, C,
+                                      self.relativistic, self.gr_scale, self.pairs)
     
+    def calculate_acceleration_on(self, bodies, index):
+        # the same force for just the bodies in index (integrators.BlockTimestep)
+        return gravity.post_newtonian(bodies.position, bodies.velocity, bodies.mass, self.G, C,
+                                      self.relativistic, self.gr_scale, self.pairs, index)
+
+    def calculate_timescales(self, bodies, index=None):
+        # only the pairs that interact set the adaptive step (see integrators.AdaptiveTimestep)
+        return gravity.timescales(bodies.position, bodies.velocity, bodies.mass, self.G, index, self.pairs)
+
+    def potential_energy(self):
+        # bodies only interact with the sun here (the two mercuries overlap)
+        bodies = self.bodies
+        r = np.linalg.norm(bodies.position[1:] - bodies.position[0], axis=1)
+        return -self.G * bodies.mass[0] * np.sum(bodies.mass[1:] / r)
+
     def verlet_step(self):
-        old_accelerations = self.calculate_acceleration(self.bodies)
-        for i, body in enumerate(self.bodies):
-            body.position += body.velocity * self.dt + 0.5 * old_accelerations[i] * self.dt**2
-
-        accelerations = self.calculate_acceleration(self.bodies)
-        for i, body in enumerate(self.bodies):
-            body.velocity += 0.5 * (old_accelerations[i] + accelerations[i]) * self.dt
-            #body.vels.append(body.velocity)
-            #if i != 0 and len(body.vels) > 3:
-            #   body.vels.pop(0)
-            #   #print(np.linalg.norm(body.vels))
-            #   if np.linalg.norm(body.vels[0]) < np.linalg.norm(body.vels[1]) and (np.linalg.norm(body.vels[2]) < np.linalg.norm(body.vels[1])):
-            #           print ("fine perihelion")
-            #mercuries perihelion detect and track
-            if i == 1 or i == 2:
-                body.steps_since_peri += 1
-                error_margin = 1.0
-                if ((5.897e4 - np.linalg.norm(body.velocity) < error_margin) and (body.steps_since_peri > 1e3)):
-                    body.pericount+= 1
-                    body.steps_since_peri = 0
-                    body.peri_angle = math.atan2(body.position[1] ,body.position[0])
-                    print("BODY ", i, " PERI", body.pericount, " ", body.peri_angle, " POS: ", body.position)
-                    trailpos = body.position.copy()
-                    trailpos*=[(1+i/10),(1+i/10),1]
-                    body.trail.append(trailpos)
-            if len(body.trail) > 1:
-                body.trail.pop(0)
-        
+        # mercuries perihelion detect and track: r.v around the sun turning
+        # positive, refined to the time within the step (see events.py)
+        self.perihelia.begin(self)
+        super().verlet_step()
+        for event in self.perihelia.check(self):
+            i = event.subject
+            body = self.bodies[i]
+            body.pericount += 1
+            body.peri_angle = event.longitude(i)
+            print("BODY ", i, " PERI", body.pericount, " ", body.peri_angle, " POS: ", event.position[i])
+            trailpos = event.position[i].copy()
+            trailpos *= [(1+i/10), (1+i/10), 1]
+            # only the latest perihelion stays marked
+            self.bodies.trails.push(i, trailpos)
+
 
 class Simulator:
-    def __init__(self, width=900, height=800):
+    def __init__(self, width=900, height=800, threaded=False, checkpoint_path=None, replay_path=None):
         pygame.init()
         self.width = width
         self.height = height
         self.screen = pygame.display.set_mode((width, height))
         pygame.display.set_caption("mercury precession gr demo")
         self.system = GravitationalSystem(3)
-        self.clock = pygame.time.Clock()
-        
-    def world_to_screen(self, position):
-        # Convert world coordinates to screen coordinates
-        screen_x = position[0] / self.system.scale + self.width // 2
-        screen_y = position[1]/ self.system.scale + self.height // 2
-        return int(screen_x), int(screen_y)
-
-    def render_text(self):
-        font = pygame.font.Font(None, 24)
+        # carry on from a checkpoint (see checkpoint.py) if there is one, saved
+        # every minute and on quit
+        self.autosave = checkpoint.Autosave(checkpoint_path) if checkpoint_path and not replay_path else None
+        if self.autosave and os.path.exists(checkpoint_path):
+            checkpoint.restore(self.system, checkpoint_path)
+        # as many physics steps per frame as fit in a 60 fps frame ("," switches to
+        # a fixed, interpolated pace), see scheduler.FrameScheduler; threaded: the
+        # physics runs on its own thread instead, see worker.PhysicsWorker
+        if replay_path:
+            # play a recorded run back instead (see replay.Replay), nothing is integrated;
+            # the trails here are perihelion markers, not part of the recording
+            self.scheduler = replay.Replay(trajectory.Trajectory(replay_path), fps=60, capture=self.hud_values, trails=False)
+        elif threaded:
+            self.scheduler = worker.PhysicsWorker(self.system, fps=60, capture=self.hud_values).start()
+        else:
+            self.scheduler = scheduler.FrameScheduler(fps=60, capture=self.hud_values)
+        self.hud = render.Hud((width, height))
+        self.view = render.Camera(width, height, self.system.scale)
+        self.sprites = render.BodySprites(self.body_radii)
+        self.trail_layer = render.TrailLayer((width, height), fade=0, lines=False, persist=False)
         
-        precession_text = ("RED: mercury newtonian")
-        precession_surface = font.render(precession_text, True, (255, 200, 200))
-        self.screen.blit(precession_surface, (self.width - 230, 20)) 
-        precession_text = ("BLUE: mercury relativistic")
-        precession_surface = font.render(precession_text, True, (200, 200, 255))
-        self.screen.blit(precession_surface, (self.width - 230, 50)) 
+    def world_to_screen(self, positions):
+        # world coordinates -> integer screen coordinates, a whole (N,3) array at once
+        return self.view.to_screen(positions)
+
+    def body_radii(self, masses):
+        # Size based on mass (logarithmic scale) for the sun, the mercuries are fixed size
+        radii = np.maximum(2, (np.log10(masses) - 20).astype(int))
+        radii[1:] = 3
+        return radii
+
+    def hud_values(self, system):
+        # what the HUD shows, read off the system (on the physics thread when threaded)
+        return system.bodies[1].peri_angle, system.bodies[2].peri_angle
+
+    def render_text(self, values):
+        # composes the HUD overlay from hud_values, run() calls it whenever the HUD is due a refresh
+        self.hud.text(f"{self.scheduler.days_per_second():.1f} simulated days/s, {self.scheduler.steps} steps/frame", (10, self.height - 30))
+        self.hud.text("RED: mercury newtonian", (self.width - 230, 20), color=(255, 200, 200))
+        self.hud.text("BLUE: mercury relativistic", (self.width - 230, 50), color=(200, 200, 255))
         
-        angle1_text = f"Last Perihelion Angle (Red - nonrel): {math.degrees(self.system.bodies[1].peri_angle):.2f}°"
-        angle2_text = f"Last Perihelion Angle (Blue - rel): {math.degrees(self.system.bodies[2].peri_angle):.2f}°"
-        angle1_surface = font.render(angle1_text, True, (255, 255, 255))
-        angle2_surface = font.render(angle2_text, True, (255, 255, 255))
-        self.screen.blit(angle1_surface, (20, 20))  
-        self.screen.blit(angle2_surface, (20, 50))  
+        angle1_text = f"Last Perihelion Angle (Red - nonrel): {math.degrees(values[0]):.2f}°"
+        angle2_text = f"Last Perihelion Angle (Blue - rel): {math.degrees(values[1]):.2f}°"
+        self.hud.text(angle1_text, (20, 20))
+        self.hud.text(angle2_text, (20, 50))
         
     def run(self):
         while True:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    self.scheduler.stop()
+                    if self.autosave:
+                        self.autosave.save(self.system)
                     pygame.quit()
                     sys.exit()
+                self.view.handle(event)
+                self.scheduler.handle(event)
             
-            self.system.verlet_step()
-            self.screen.fill((0, 0, 0))
-            for i,body in enumerate(self.system.bodies):
-                # Draw trails
-                for t, trail_pos in enumerate(body.trail):
-                    screen_pos = self.world_to_screen(trail_pos)
-                    pygame.draw.circle(self.screen, body.color, screen_pos, 1)
-                    #if t == 1:
-                    #    pygame.draw.circle(self.screen, (255,0,0), screen_pos, 1)
-                    #elif t == 2:
-                    #    pygame.draw.circle(self.screen, (0,255,0), screen_pos, 1)
-                    #else:
-                    #    pygame.draw.circle(self.screen, (100,100,255), screen_pos, 1)
-                
-                # Draw bodies
-                #scaled_position = body.position.copy()
-                #if (i > 0):
-                #    scaled_position/=i
-                #pos = self.world_to_screen(scaled_position)
-                bodypos = body.position.copy()
-                #if (i == 1):
-                #    bodypos*=[-1,1,1]
-                pos = self.world_to_screen(bodypos)   
-                # Size based on mass (logarithmic scale)
-                radius = max(2, int(np.log10(body.mass) - 20))
-                if i != 0:
-                    radius = 3
-                pygame.draw.circle(self.screen, body.color, pos, radius)
-            self.render_text() 
+            # what to draw: positions (between the last two steps when paced), trails, HUD values
+            if self.autosave and self.autosave.due():
+                with self.scheduler.paused():
+                    self.autosave.save(self.system)
+            frame = self.scheduler.frame(self.system)
+            self.view.update(self.system.bodies, frame.position)
+            # perihelion markers, only the latest one (the trail buffer) is shown
+            self.trail_layer.update(frame.trails, [body.color for body in self.system.bodies], self.view)
+            self.trail_layer.draw(self.screen)
+            # Draw bodies
+            self.sprites.draw(self.screen, self.view, self.system.bodies, frame.position)
+            if self.hud.begin():
+                self.render_text(frame.values)
+            self.hud.draw(self.screen)
             pygame.display.flip()
-            self.clock.tick(500000)
 
 if __name__ == "__main__":
-    sim = Simulator()
+    # the window's modules are only loaded here, importing the script for its
+    # GravitationalSystem (headless.py, ensemble.py) never touches pygame
+    import cli
+    import pygame
+    import render
+    import replay
+    import scheduler
+    import worker
+    args = cli.parser("mercury perihelion precession with the first post-newtonian correction").parse_args()
+    sim = Simulator(threaded=args.threaded, checkpoint_path=args.checkpoint, replay_path=args.replay)
     sim.run()
@@ -0,0 +1,408 @@
+#pygame drawing helpers shared by the simulation scripts
+import time
+import numpy as np
+try:
+    import pygame
+except ImportError:  # headless runs only need the physics
+    pygame = None
+
+# largest pixel coordinate handed to pygame
+LIMIT = 1 << 30
+
+class View:
+    # world (m) to screen (px): `scale` metres per pixel, the world point
+    # `center` (x, y) in the middle of the window, y multiplied by `squash`
+    # (inner.py flattens the ecliptic)
+    def __init__(self, width, height, scale, squash=1.0):
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.squash = squash
+        self.center = np.zeros(2)
+
+    def key(self):
+        # anything drawn in screen space must be redrawn when this changes,
+        # moving the centre only shifts it (see offset)
+        return (self.width, self.height, self.scale, self.squash)
+
+    def offset(self):
+        # the centre in whole pixels: moving it shifts everything drawn so far
+        # by exactly the change in offset
+        x = round(self.center[0] / self.scale)
+        y = round(self.center[1] * self.squash / self.scale)
+        return (x, y)
+
+    def to_screen(self, positions):
+        # (..., dim) world positions -> (..., 2) integer pixels
+        positions = np.asarray(positions, dtype=float)
+        x, y = self.offset()
+        screen = np.empty(positions.shape[:-1] + (2,))
+        np.floor(positions[..., 0] / self.scale, out=screen[..., 0])
+        np.floor(positions[..., 1] * self.squash / self.scale, out=screen[..., 1])
+        screen[..., 0] += self.width // 2 - x
+        screen[..., 1] += self.height // 2 - y
+        # far off-screen points are clamped, pygame takes C ints
+        return np.clip(screen, -LIMIT, LIMIT).astype(np.int64)
+
+    def to_world(self, pixel):
+        # screen pixel -> world (x, y)
+        x = (pixel[0] - self.width // 2) * self.scale
+        y = (pixel[1] - self.height // 2) * self.scale / self.squash
+        return self.center + (x, y)
+
+class Camera(View):
+    # a View driven from the keyboard and mouse:
+    #     wheel, +/-           zoom (the wheel about the cursor)
+    #     drag, arrow keys     pan
+    #     tab, shift+tab       follow the next / previous body (by index)
+    #     0, home              back to the starting view
+    # Per frame: camera.handle(event) for every event, then camera.update(bodies)
+    # to keep the followed body in the middle
+    ZOOM = 1.25
+    # arrow keys pan this fraction of the window
+    STEP = 0.1
+
+    def __init__(self, width, height, scale, squash=1.0, target=None):
+        super().__init__(width, height, scale, squash)
+        # index of the followed body, or None
+        self.target = target
+        self._home = (scale, target)
+        self._drag = False
+        self._n = 0
+
+    def zoom(self, factor, anchor=None):
+        # zoom in by factor (< 1 zooms out) keeping the world point under the
+        # anchor pixel where it is, the window centre when following a body
+        if anchor is None or self.target is not None:
+            anchor = (self.width // 2, self.height // 2)
+        point = self.to_world(anchor)
+        self.scale /= factor
+        self.center = self.center + point - self.to_world(anchor)
+
+    def pan(self, dx, dy):
+        # move the picture by (dx, dy) pixels, stops following
+        self.target = None
+        self.center = self.center - (dx * self.scale, dy * self.scale / self.squash)
+
+    def follow(self, target):
+        self.target = target
+
+    def reset(self):
+        self.scale, self.target = self._home
+        self.center = np.zeros(2)
+
+    def handle(self, event):
+        # True when the event was a camera control
+        if event.type == pygame.MOUSEWHEEL:
+            self.zoom(self.ZOOM ** event.y, pygame.mouse.get_pos())
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            self._drag = True
+        elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+            self._drag = False
+        elif event.type == pygame.MOUSEMOTION and self._drag:
+            self.pan(*event.rel)
+        elif event.type == pygame.KEYDOWN:
+            step = (self.STEP * self.width, self.STEP * self.height)
+            if event.key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS):
+                self.zoom(self.ZOOM)
+            elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                self.zoom(1 / self.ZOOM)
+            elif event.key == pygame.K_LEFT:
+                self.pan(step[0], 0)
+            elif event.key == pygame.K_RIGHT:
+                self.pan(-step[0], 0)
+            elif event.key == pygame.K_UP:
+                self.pan(0, step[1])
+            elif event.key == pygame.K_DOWN:
+                self.pan(0, -step[1])
+            elif event.key == pygame.K_TAB and self._n:
+                direction = -1 if event.mod & pygame.KMOD_SHIFT else 1
+                start = -1 if self.target is None and direction == 1 else (self.target or 0)
+                self.target = (start + direction) % self._n
+            elif event.key in (pygame.K_0, pygame.K_KP0, pygame.K_HOME):
+                self.reset()
+            else:
+                return False
+        else:
+            return False
+        return True
+
+    def update(self, bodies, positions=None):
+        # positions as for BodySprites.draw
+        if positions is None:
+            positions = bodies.position
+        self._n = len(bodies)
+        if self.target is not None and self.target < self._n:
+            self.center = positions[self.target, :2].copy()
+
+def draw_points(screen, pixels, colors):
+    # one pixel per point, written straight into the screen's pixel buffer
+    # pixels (M,2) ints from View.to_screen, colors (M,) mapped colours (see
+    # Surface.map_rgb) or one for all; points off the screen are dropped
+    width, height = screen.get_size()
+    x, y = pixels[:, 0], pixels[:, 1]
+    inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    buffer = pygame.surfarray.pixels2d(screen)
+    buffer[x[inside], y[inside]] = colors[inside] if np.ndim(colors) else colors
+    # the screen stays locked while the buffer is alive
+    del buffer
+
+def draw_tracers(screen, view, positions, color):
+    # massless tracers (see tracers.py), a pixel each in one colour
+    draw_points(screen, view.to_screen(positions), screen.map_rgb(color))
+
+class BodySprites:
+    # per-body radius and mapped colour, worked out once (and again only when
+    # bodies are added or removed, masses change or colours change) instead of
+    # every frame.
+    # radius(masses) -> (N,) radii in pixels; bodies with radius <= 0 are
+    # single pixels, drawn in one go through the pixel buffer (draw_points),
+    # which keeps 1e5 particles inside a frame
+    def __init__(self, radius):
+        self.radius = radius
+        self.radii = None
+        self.colors = None
+        self._key = None
+        # indices of the bodies drawn as circles (and their radii) and as points
+        self._circles = np.empty(0, dtype=np.int64)
+        self._circle_radii = np.empty(0, dtype=np.int64)
+        self._points = np.empty(0, dtype=np.int64)
+        # the points' colours mapped for the screen's pixel format
+        self._mapped = None
+        self._format = None
+
+    def update(self, bodies):
+        key = (id(bodies), bodies.version)
+        if key != self._key:
+            self.radii = np.asarray(self.radius(bodies.mass))
+            self._circles = np.flatnonzero(self.radii > 0)
+            self._circle_radii = self.radii[self._circles]
+            self._points = np.flatnonzero(self.radii <= 0)
+            self._mapped = None
+            self._key = key
+        # colours change without bumping the version (a restored checkpoint, ...)
+        colors = [body.color for body in bodies]
+        if colors != self.colors:
+            self.colors = colors
+            self._mapped = None
+
+    def draw(self, screen, view, bodies, positions=None):
+        # positions: where to draw the bodies if not at bodies.position (e.g.
+        # interpolated, see scheduler.FrameScheduler.positions)
+        self.update(bodies)
+        pixels = view.to_screen(bodies.position if positions is None else positions)
+        if len(self._points):
+            surface_format = (screen.get_bitsize(), screen.get_masks())
+            if self._mapped is None or self._format != surface_format:
+                self._mapped = np.array([screen.map_rgb(self.colors[i]) for i in self._points])
+                self._format = surface_format
+            draw_points(screen, pixels[self._points], self._mapped)
+        # circles off the screen are culled before drawing: only those whose
+        # bounding square reaches into the screen are drawn
+        centers = pixels[self._circles]
+        radii = self._circle_radii
+        x, y = centers[:, 0], centers[:, 1]
+        shown = (x + radii >= 0) & (x - radii < view.width) & (y + radii >= 0) & (y - radii < view.height)
+        colors = self.colors
+        for i, center, radius in zip(self._circles[shown].tolist(), centers[shown].tolist(), radii[shown].tolist()):
+            pygame.draw.circle(screen, colors[i], center, radius)
+
+class TrailLayer:
+    # off-screen surface that keeps the trails drawn so far: each frame only
+    # the points recorded since the last frame are stamped on it, the layer is
+    # redrawn from the trail buffers only when the view, the set of bodies or
+    # the whole of the trails (TrailBuffer.fill) changes. Points that drop out
+    # of a trail buffer stay on the layer until they fade out (fade > 0 darkens
+    # the layer by that much, 0-255, every frame so a point lives 255/fade
+    # frames) or until the next full redraw, so the layer can show more than a
+    # redraw would; persist=False redraws instead whenever a point drops out,
+    # the layer then shows exactly the buffers (for markers, which come rarely).
+    # lines=True joins successive points of a body (orbit traces), False draws
+    # a dot per point (markers). The background is black.
+    def __init__(self, size, fade=0, lines=True, radius=1, persist=True):
+        self.surface = pygame.Surface(size)
+        self.fade = fade
+        self.persist = persist
+        if fade:
+            # blitting a flat grey with BLEND_RGB_SUB is ~30x faster than
+            # Surface.fill with the same flag
+            self._fader = pygame.Surface(size)
+            self._fader.fill((fade, fade, fade))
+        self.lines = lines
+        self.radius = radius
+        self._key = None
+        self._seen = None
+        # last stamped pixel of each body, where its next line segment starts
+        self._last = None
+
+    def clear(self):
+        # forces a full redraw on the next update
+        self._key = None
+
+    def redraw(self, buffer, colors, view):
+        self.surface.fill((0, 0, 0))
+        n = len(buffer)
+        self._last = np.zeros((n, 2), dtype=np.int64)
+        self._draw_all(buffer, colors, view, self.surface.get_rect())
+        # the next segments start from every trail's newest point
+        has = np.flatnonzero(buffer.view()[1])
+        self._last[has] = view.to_screen(buffer.newest(has))
+        self._seen = buffer.written().copy()
+        self._key = (view.key(), n, buffer.generation)
+        self._offset = view.offset()
+
+    def _draw_all(self, buffer, colors, view, area):
+        # every trail point inside area (a Rect) again. Trails whose bounding
+        # box misses the area are culled without a draw call. Where the next
+        # segments start (_last) is left alone: after a scroll the points
+        # recorded since the last frame are still to be joined to it
+        data, counts = buffer.view()
+        has = np.flatnonzero(counts)
+        if len(has) == 0:
+            return
+        pixels = view.to_screen(data[has])
+        valid = np.arange(buffer.length) < counts[has, None]
+        margin = 0 if self.lines else self.radius
+        low = np.where(valid[..., None], pixels, LIMIT).min(axis=1) - margin
+        high = np.where(valid[..., None], pixels, -LIMIT).max(axis=1) + margin
+        shown = ((high[:, 0] >= area.left) & (low[:, 0] < area.right)
+                 & (high[:, 1] >= area.top) & (low[:, 1] < area.bottom))
+        last = self._last.copy()
+        for i in has[shown].tolist():
+            self._stamp(i, buffer.ordered(i), colors[i], view, first=True)
+        self._last = last
+
+    def _scroll(self, buffer, colors, view, offset):
+        # the view centre moved by whole pixels: move what is drawn and draw
+        # only the strips that come into view. Those come back at full
+        # brightness, a fading layer shows no older fading there
+        dx = self._offset[0] - offset[0]
+        dy = self._offset[1] - offset[1]
+        self._offset = offset
+        width, height = self.surface.get_size()
+        if abs(dx) >= width or abs(dy) >= height:
+            self.redraw(buffer, colors, view)
+            return
+        self.surface.scroll(dx, dy)
+        self._last += (dx, dy)
+        strips = []
+        if dx:
+            strips.append(pygame.Rect(0 if dx > 0 else width + dx, 0, abs(dx), height))
+        if dy:
+            strips.append(pygame.Rect(0, 0 if dy > 0 else height + dy, width, abs(dy)))
+        for strip in strips:
+            self.surface.set_clip(strip)
+            self.surface.fill((0, 0, 0))
+            self._draw_all(buffer, colors, view, strip)
+        self.surface.set_clip(None)
+
+    def update(self, buffer, colors, view):
+        # buffer: a trails.TrailBuffer, colors: one rgb per body
+        if self._key != (view.key(), len(buffer), buffer.generation):
+            self.redraw(buffer, colors, view)
+            return
+        if self.fade:
+            self.surface.blit(self._fader, (0, 0), special_flags=pygame.BLEND_RGB_SUB)
+        offset = view.offset()
+        if offset != self._offset:
+            self._scroll(buffer, colors, view, offset)
+        written = buffer.written()
+        changed = np.flatnonzero(written != self._seen)
+        if not self.persist and np.any(written[changed] > buffer.length):
+            # new points pushed old ones out of their buffers
+            self.redraw(buffer, colors, view)
+            return
+        # usual case, one new point per body since the last frame: project them
+        # all at once and draw one segment (or dot) each
+        single = (written[changed] - self._seen[changed] == 1) & (self._seen[changed] > 0)
+        index = changed[single]
+        if len(index):
+            pixels = view.to_screen(buffer.newest(index))
+            starts = self._last[index]
+            self._last[index] = pixels
+            # segments (dots) entirely off the screen are culled
+            if self.lines:
+                low, high = np.minimum(starts, pixels), np.maximum(starts, pixels)
+            else:
+                low, high = pixels - self.radius, pixels + self.radius
+            shown = ((high[:, 0] >= 0) & (low[:, 0] < view.width)
+                     & (high[:, 1] >= 0) & (low[:, 1] < view.height))
+            for i, start, end in zip(index[shown].tolist(), starts[shown].tolist(), pixels[shown].tolist()):
+                if self.lines:
+                    pygame.draw.line(self.surface, colors[i], start, end)
+                else:
+                    pygame.draw.circle(self.surface, colors[i], end, self.radius)
+        for i in changed[~single]:
+            new = min(int(written[i] - self._seen[i]), buffer.count(i))
+            self._stamp(i, buffer.latest(i, new), colors[i], view, first=self._seen[i] == 0)
+        self._seen[:] = written
+
+    def _stamp(self, i, points, color, view, first):
+        if len(points) == 0:
+            return
+        pixels = view.to_screen(points)
+        if self.lines:
+            if not first:
+                pixels = np.concatenate((self._last[i:i + 1], pixels))
+            if len(pixels) > 1:
+                pygame.draw.lines(self.surface, color, False, pixels.tolist())
+            else:
+                self.surface.fill(color, (pixels[0].tolist(), (1, 1)))
+        else:
+            for pixel in pixels.tolist():
+                pygame.draw.circle(self.surface, color, pixel, self.radius)
+        self._last[i] = pixels[-1]
+
+    def draw(self, screen):
+        # use in place of screen.fill: the layer covers the whole screen
+        screen.blit(self.surface, (0, 0))
+
+class Hud:
+    # text overlay: fonts are loaded once, rendered strings are cached by
+    # content, and the overlay is recomposed at most `refresh` times a second.
+    # Per frame:
+    #     if hud.begin():
+    #         hud.text(...)   # recompose
+    #     hud.draw(screen)    # blit the last overlay
+    MAX_CACHED = 512
+
+    def __init__(self, size, refresh=10.0):
+        self.surface = pygame.Surface(size, pygame.SRCALPHA)
+        self.refresh = refresh
+        self._fonts = {}
+        self._cache = {}
+        # part of the overlay that holds text, the only part blitted
+        self._area = pygame.Rect(0, 0, 0, 0)
+        self._next = 0.0
+
+    def font(self, size):
+        if size not in self._fonts:
+            self._fonts[size] = pygame.font.Font(None, size)
+        return self._fonts[size]
+
+    def begin(self, force=False):
+        # True (and the overlay cleared) when it is time to recompose
+        now = time.perf_counter()
+        if not force and now < self._next:
+            return False
+        self._next = now + 1.0 / self.refresh
+        self.surface.fill((0, 0, 0, 0), self._area)
+        self._area = pygame.Rect(0, 0, 0, 0)
+        return True
+
+    def render(self, text, size=24, color=(255, 255, 255)):
+        key = (text, size, color)
+        surface = self._cache.get(key)
+        if surface is None:
+            if len(self._cache) >= self.MAX_CACHED:
+                self._cache.clear()
+            surface = self._cache[key] = self.font(size).render(text, True, color)
+        return surface
+
+    def text(self, text, position, size=24, color=(255, 255, 255)):
+        rect = self.surface.blit(self.render(text, size, color), position)
+        self._area = self._area.union(rect) if self._area.size != (0, 0) else rect
+
+    def draw(self, screen):
+        if self._area.size != (0, 0):
+            screen.blit(self.surface, self._area.topleft, self._area)
@@ -0,0 +1,142 @@
+#playback of recorded runs (trajectory files, see trajectory.py)
+#a Replay stands in for a Simulator's FrameScheduler: nothing is integrated,
+#every frame the system's bodies are set to the recorded state at the
+#playhead, so the Simulator draws (and reads its HUD values) as usual.
+#frames are read lazily from the memory-mapped file, seeking anywhere in an
+#hour-long run costs one binary search of the time index
+import contextlib
+import time
+import numpy as np
+from scheduler import DAY, Frame
+try:
+    import pygame
+except ImportError:  # headless runs only need the physics
+    pygame = None
+
+class Replay:
+    # Per frame, in place of FrameScheduler.frame (same interface):
+    #     frame = replay.frame(system)
+    # system is the script's own GravitationalSystem, with the bodies the run
+    # was recorded from: positions (interpolated between recorded frames),
+    # velocities (of the recorded frame at or before the playhead) and time
+    # are overwritten, anything else is left as it was.
+    # speed: simulated seconds per wall-clock second, by default the whole run
+    # plays in a minute.
+    # trails: whether the system's trails are orbit traces rebuilt from the
+    # recorded frames; False leaves them alone, for scripts whose trails hold
+    # something else (perihelion markers pushed by the live run, ...)
+    # Keys: space pauses, "," / "." halve / double the speed, "r" reverses,
+    # "[" / "]" seek back / forward by SEEK of the run, backspace restarts
+    # fraction of the run "[" and "]" jump by
+    SEEK = 0.05
+
+    def __init__(self, run, fps=60, speed=None, capture=None, trails=True):
+        if len(run) == 0:
+            raise ValueError(f"{run.path}: no frames recorded")
+        self.run = run
+        self.fps = fps
+        self.capture = capture
+        self.trails = trails
+        self.start = float(run.times[0])
+        self.end = float(run.times[-1])
+        self.speed = speed or (self.end - self.start) / 60.0 or 1.0
+        # 1 forwards, -1 backwards
+        self.direction = 1
+        self.playing = True
+        # the playhead, simulated seconds
+        self.time = self.start
+        # recorded frames passed in the last frame
+        self.steps = 0
+        self._frame = Frame()
+        self._position = None
+        self._index = None
+        self._next = None
+        self._wall = None
+
+    def frame(self, system):
+        # paces the loop at fps, moves the playhead by the wall time since the
+        # last frame, then the state under it
+        now = time.perf_counter()
+        if self._next is not None and self._next - now > 1e-3:
+            time.sleep(self._next - now)
+            now = time.perf_counter()
+        self._next = max(now, (self._next or now)) + 1.0 / self.fps
+        if self._wall is not None and self.playing:
+            self.seek(self.time + self.direction * self.speed * (now - self._wall))
+            if self.time in (self.start, self.end):
+                self.playing = False
+        self._wall = now
+        self.show(system)
+        frame = self._frame
+        frame.position = system.bodies.position
+        frame.trails = system.bodies.trails
+        frame.time = self.time
+        frame.steps = self._index
+        frame.values = self.capture(system) if self.capture is not None else None
+        return frame
+
+    def show(self, system):
+        # the recorded state at the playhead into system
+        run = self.run
+        bodies = system.bodies
+        if len(bodies) != run.n or bodies.dim != run.dim:
+            raise ValueError(f"{run.path}: recorded {run.n} bodies in {run.dim}d, "
+                             f"the system has {len(bodies)} in {bodies.dim}d")
+        i = run.index(self.time)
+        self._position = run.at(self.time, out=self._position)
+        bodies.position = self._position
+        if run.velocities:
+            bodies.velocity = run.velocity(i)
+        system.time = self.time
+        # trails: the frames played since the last call, or after a jump (and
+        # going backwards) the last `length` recorded frames up to the playhead
+        trails = bodies.trails
+        last = self._index
+        if self.trails and last is not None and 0 < i - last <= trails.length:
+            for position in run.positions(last + 1, i + 1):
+                trails.record(position)
+        elif self.trails and i != last:
+            trails.fill(run.positions(max(i + 1 - trails.length, 0), i + 1))
+        self.steps = abs(i - last) if last is not None else 0
+        self._index = i
+
+    def seek(self, t):
+        # moves the playhead to simulated time t (clamped to the run)
+        self.time = float(np.clip(t, self.start, self.end))
+
+    def stop(self):
+        # nothing to stop, nothing runs in the background
+        pass
+
+    def paused(self):
+        # the system is only written inside frame()
+        return contextlib.nullcontext()
+
+    def days_per_second(self):
+        # simulated days per wall-clock second, negative backwards
+        return self.speed * self.direction / DAY if self.playing else 0.0
+
+    def handle(self, event):
+        # True when the event was a playback control
+        if event.type != pygame.KEYDOWN:
+            return False
+        if event.key == pygame.K_SPACE:
+            if not self.playing and self.time == (self.end if self.direction > 0 else self.start):
+                self.seek(self.start if self.direction > 0 else self.end)
+            self.playing = not self.playing
+        elif event.key == pygame.K_COMMA:
+            self.speed /= 2
+        elif event.key == pygame.K_PERIOD:
+            self.speed *= 2
+        elif event.key == pygame.K_r:
+            self.direction = -self.direction
+            self.playing = True
+        elif event.key in (pygame.K_LEFTBRACKET, pygame.K_RIGHTBRACKET):
+            sign = 1 if event.key == pygame.K_RIGHTBRACKET else -1
+            self.seek(self.time + sign * self.SEEK * (self.end - self.start))
+        elif event.key == pygame.K_BACKSPACE:
+            self.seek(self.start if self.direction > 0 else self.end)
+            self.playing = True
+        else:
+            return False
+        return True
@@ -0,0 +1,219 @@
+#frame-budget scheduling of physics steps
+#instead of one step per rendered frame, a Simulator runs as many steps as fit
+#in the frame time left over after rendering, so the simulation goes as fast
+#as the machine allows while the window keeps its frame rate. With a fixed
+#pace instead, steps are owed by the wall clock and bodies are drawn between
+#the last two states, so physics rate and frame rate are independent
+import contextlib
+import time
+import numpy as np
+try:
+    import pygame
+except ImportError:  # headless runs only need the physics
+    pygame = None
+
+DAY = 86400.0
+
+class Frame:
+    # what a Simulator draws: body positions, trails (a trails.TrailBuffer),
+    # tracer positions (None without tracers, see tracers.py; interpolated like
+    # the bodies when paced), simulated time, steps so far and `values`,
+    # whatever the script's capture function read off the system for the HUD
+    __slots__ = ("position", "trails", "tracers", "time", "steps", "values")
+
+    def __init__(self):
+        self.position = None
+        self.trails = None
+        self.tracers = None
+        self.time = 0.0
+        self.steps = 0
+        self.values = None
+
+class FrameScheduler:
+    # Per frame, in place of system.verlet_step() and clock.tick():
+    #     frame = scheduler.frame(system)   # the physics share of the frame
+    #     ... draw frame ...
+    # (frame() is advance() followed by positions(), see Frame; a
+    # worker.PhysicsWorker has the same frame/handle/days_per_second interface)
+    # The time spent outside advance() (rendering, events) is tracked, and
+    # steps run until the next one would push the frame past 1/fps.
+    # pace None: as fast as that allows, at least one step every frame.
+    # pace p: p simulated seconds per wall-clock second. Wall time accumulates
+    #   into steps owed and every whole step owed is taken (the backlog is
+    #   dropped when they do not fit, the simulation then slows down instead of
+    #   falling further behind). positions() interpolates between the states
+    #   before and after the last step by the fraction of a step still owed,
+    #   so motion is smooth at any number of steps per frame, fewer than one
+    #   included.
+    # `limit` caps the steps per frame (None: no cap). Frames that are paced or
+    # hit the cap sleep out the rest of their budget.
+    # Keys: "," halves the pace (from the measured speed when there is none),
+    # "." doubles it, "/" goes back to as fast as possible; ";" halves the
+    # steps-per-frame cap (from the last frame's steps when there is none),
+    # "'" doubles it
+    # weight of the newest sample in the running estimates
+    SMOOTHING = 0.1
+    # how often the measured speed is refreshed, s
+    WINDOW = 0.5
+
+    def __init__(self, fps=60, limit=None, pace=None, capture=None):
+        self.fps = fps
+        self.limit = limit
+        self.pace = pace
+        # capture(system) -> Frame.values
+        self.capture = capture
+        self._frame = Frame()
+        self._total = 0
+        # steps taken in the last frame
+        self.steps = 0
+        # simulated seconds per wall-clock second and steps per second, over
+        # the last WINDOW
+        self.speed = 0.0
+        self.rate = 0.0
+        # where positions() draws, between the previous (0) and current (1) state
+        self.alpha = 1.0
+        self._owed = 0.0
+        self._previous = None
+        self._interpolated = None
+        self._tracers = None
+        self._tracers_interpolated = None
+        self._other = 0.0
+        self._start = None
+        self._end = None
+        self._since = time.perf_counter()
+        self._simulated = 0.0
+        self._count = 0
+
+    def advance(self, system):
+        start = time.perf_counter()
+        if self._end is not None:
+            self._other += self.SMOOTHING * ((start - self._end) - self._other)
+        deadline = start + max(1.0 / self.fps - self._other, 0.0)
+        due = None
+        if self.pace is not None:
+            if self._start is not None:
+                self._owed += (start - self._start) * self.pace
+            due = int(self._owed // system.dt)
+        self._start = start
+        before = system.time
+        n = 0
+        now = start
+        capped = False
+        while due is None or n < due:
+            if self.pace is not None:
+                self._keep(system)
+            system.verlet_step()
+            n += 1
+            now = time.perf_counter()
+            if self.limit is not None and n >= self.limit:
+                capped = True
+                break
+            # stop if another step of the average cost so far would overrun
+            if now + (now - start) / n > deadline:
+                break
+        if self.pace is not None:
+            self._owed -= system.time - before
+            if n < due:
+                self._owed = min(self._owed, system.dt)
+            self.alpha = min(self._owed / system.dt, 1.0)
+        if (capped or self.pace is not None) and deadline - now > 1e-3:
+            time.sleep(deadline - now)
+            now = time.perf_counter()
+        self._end = now
+        self.steps = n
+        self._total += n
+        self._simulated += system.time - before
+        self._count += n
+        if now - self._since >= self.WINDOW:
+            self.speed = self._simulated / (now - self._since)
+            self.rate = self._count / (now - self._since)
+            self._since = now
+            self._simulated = 0.0
+            self._count = 0
+        return n
+
+    def frame(self, system):
+        # advance, then the live state to draw (valid until the next call)
+        self.advance(system)
+        frame = self._frame
+        frame.position = self.positions(system.bodies)
+        frame.trails = system.bodies.trails
+        frame.tracers = self.tracer_positions(system.tracers) if system.tracers is not None else None
+        frame.time = system.time
+        frame.steps = self._total
+        frame.values = self.capture(system) if self.capture is not None else None
+        return frame
+
+    def stop(self):
+        # nothing to stop, the physics runs inside frame() (see worker.PhysicsWorker.stop)
+        pass
+
+    def paused(self):
+        # the system is only stepped inside frame(), nothing to hold (see
+        # worker.PhysicsWorker.paused)
+        return contextlib.nullcontext()
+
+    def _keep(self, system):
+        # body (and tracer) positions before a step, preallocated so a step
+        # copies and allocates nothing
+        positions = system.bodies.position
+        if self._previous is None or self._previous.shape != positions.shape:
+            self._previous = np.empty_like(positions)
+            self._interpolated = np.empty_like(positions)
+        np.copyto(self._previous, positions)
+        if system.tracers is None:
+            self._tracers = None
+            return
+        tracers = system.tracers.position
+        if self._tracers is None or self._tracers.shape != tracers.shape:
+            self._tracers = np.empty_like(tracers)
+            self._tracers_interpolated = np.empty_like(tracers)
+        np.copyto(self._tracers, tracers)
+
+    def _between(self, previous, current, out):
+        # alpha of the way from previous to current, or current when there is
+        # no pace or no matching previous state
+        if self.pace is None or previous is None or previous.shape != current.shape:
+            return current
+        np.subtract(current, previous, out=out)
+        out *= self.alpha
+        out += previous
+        return out
+
+    def positions(self, bodies):
+        # (N,dim) positions to draw: the current ones, or with a pace, alpha of
+        # the way from the previous state to the current one
+        return self._between(self._previous, bodies.position, self._interpolated)
+
+    def tracer_positions(self, tracers):
+        # the same for a tracers.Tracers, so they are drawn in step with the bodies
+        return self._between(self._tracers, tracers.position, self._tracers_interpolated)
+
+    def set_pace(self, pace):
+        if pace is not None and self.pace is None:
+            self._owed = 0.0
+            self._previous = None
+            self._tracers = None
+        self.pace = pace
+
+    def days_per_second(self):
+        # simulated days per wall-clock second
+        return self.speed / DAY
+
+    def handle(self, event):
+        # True when the event was a speed control
+        if event.type != pygame.KEYDOWN:
+            return False
+        if event.key == pygame.K_COMMA and (self.pace or self.speed):
+            self.set_pace((self.pace or self.speed) / 2)
+        elif event.key == pygame.K_PERIOD and self.pace is not None:
+            self.set_pace(self.pace * 2)
+        elif event.key == pygame.K_SLASH:
+            self.set_pace(None)
+        elif event.key == pygame.K_SEMICOLON:
+            self.limit = max(1, (self.limit or self.steps) // 2)
+        elif event.key == pygame.K_QUOTE and self.limit is not None:
+            self.limit *= 2
+        else:
+            return False
+        return True
@@ -2,25 +2,21 @@
 
 import numpy as np
 np.set_printoptions(precision=15)
-import pygame
 import math
-from pygame import Vector2
+import os
 import sys
+import bodystore
+import checkpoint
+import clocks
+import gravity
+import integrators
+import nbody
+import trajectory
 
-class Body:
-    def __init__(self, mass, position, velocity, color):
-        self.mass = mass
-        self.position = np.array(position, dtype=float)
-        self.dilated_position = np.array(position, dtype=float)
-        self.velocity = np.array(velocity, dtype=float)
-        self.acceleration = np.array([0.0, 0.0, 0.0])
-        self.color = color
-        self.time = 0
-
-class GravitationalSystem:
+class GravitationalSystem(nbody.GravitationalSystem):
     #units: m,kg,s
     G = 6.6743e-11
-    c = 299752458
+    c = clocks.C
     def __init__(self):
         #MASS
         mass_sun = 1.989e30
@@ -36,77 +32,101 @@ class GravitationalSystem:
         zmax_mercury = 1.05e10
         zmax_earth = 0
 
-        self.bodies = [
-            Body(mass_sun, [0,0,0], [0,0,0], (255,255,0)),
+        self.bodies = bodystore.BodyStore([
+            bodystore.Body(mass_sun, [0,0,0], [0,0,0], (255,255,0)),
             
-            Body(mass_mercury, [pdist_mercury,0,zmax_mercury], [0,pvel_mercury,0], (10,255,0)),
+            bodystore.Body(mass_mercury, [pdist_mercury,0,zmax_mercury], [0,pvel_mercury,0], (10,255,0)),
             
-            Body(mass_earth, [pdist_earth,0,zmax_earth], [0,pvel_earth,0], (100,150,255))
-        ]
+            bodystore.Body(mass_earth, [pdist_earth,0,zmax_earth], [0,pvel_earth,0], (100,150,255))
+        ])
 
         #SIM PARAMS
-        #time step in s
+        #time step in s, picked each step by the adaptive controller
         self.dt = 10000
+        self.timestep = integrators.AdaptiveTimestep(tolerance=1e-2, dt_max=100000, dt_min=1000)
         #pixels per 1e6 km
         self.scale = 4e8
+        self.integrator = integrators.VelocityVerlet(self.calculate_acceleration)
+        #every body's proper time (special relativistic and gravitational
+        #dilation), and where each would be stepping on its own clock
+        self.clocks = clocks.ProperTime(len(self.bodies), self.c)
+        self.dilated_position = self.bodies.position.copy()
 
-    def calculate_acceleration(self, bodies):
-        accelerations = [np.array([0.0, 0.0, 0.0]) for _ in bodies]
-        for i in range (len(bodies)):
-            for j in range(i+1, len(bodies)):
-                r = bodies[j].position - bodies[i].position
-                r_mag = np.linalg.norm(r)
-                force_mag = self.G * bodies[i].mass * bodies[j].mass / (r_mag ** 2)
-                force = force_mag * r / r_mag 
-                accelerations[i] += force / bodies[i].mass
-                accelerations[j] -= force / bodies[j].mass
-        return accelerations
+    def clock_rates(self):
+        # squared speeds and potentials (each body's own left out) the clocks run at
+        bodies = self.bodies
+        speed2 = np.einsum('ij,ij->i', bodies.velocity, bodies.velocity)
+        return speed2, gravity.potentials_at(bodies.position, bodies.position, bodies.mass, self.G)
 
     def verlet_step(self):
-        init_accel = self.calculate_acceleration(self.bodies)
-        for i, body in enumerate(self.bodies):
-            lorentz_factor = 1
-            if i != 0:
-                vel_mag = np.linalg.norm(body.velocity)
-                lorentz_factor = 1.0 / np.sqrt((1.0 - (vel_mag / self.c) ** 2), dtype=np.float128)
-                body.time += self.dt / lorentz_factor
-            else:
-                body.time += self.dt
-            body.position += body.velocity * self.dt + 0.5 * init_accel[i] * self.dt **2
-            body.dilated_position += body.velocity * self.dt/lorentz_factor + 0.5 * init_accel[i] * self.dt/lorentz_factor **2
-            
-        new_accel = self.calculate_acceleration(self.bodies)
-        for i,body in enumerate (self.bodies):
-            body.velocity += 0.5 * (init_accel[i] + new_accel[i]) * self.dt
+        self.choose_dt()
+        bodies = self.bodies
+        init_accel = self.integrator.prepare(bodies, self.dt)
+        if self.clocks.deficit is None:
+            self.clocks.start(*self.clock_rates())
+        # proper time covered at the rate the step starts with
+        dtau = (self.dt * (1.0 - self.clocks.deficit))[:, np.newaxis]
+        self.dilated_position += bodies.velocity * dtau + 0.5 * init_accel * dtau**2
+        self.advance()
+        self.clocks.advance(self.dt, *self.clock_rates())
 
 
 class Simulator:
-    def __init__(self, width=1220, height=1080):
+    def __init__(self, width=1220, height=1080, threaded=False, checkpoint_path=None, replay_path=None):
         pygame.init()
         self.width = width
         self.height = height
         self.screen = pygame.display.set_mode((width, height))
         pygame.display.set_caption("time dilation demo")
         self.system = GravitationalSystem()
-        self.clock = pygame.time.Clock()
+        # carry on from a checkpoint (see checkpoint.py) if there is one, saved
+        # every minute and on quit
+        self.autosave = checkpoint.Autosave(checkpoint_path) if checkpoint_path and not replay_path else None
+        if self.autosave and os.path.exists(checkpoint_path):
+            checkpoint.restore(self.system, checkpoint_path)
+        # as many physics steps per frame as fit in a 60 fps frame ("," switches to
+        # a fixed, interpolated pace), see scheduler.FrameScheduler; threaded: the
+        # physics runs on its own thread instead, see worker.PhysicsWorker
+        if replay_path:
+            # play a recorded run back instead (see replay.Replay), nothing is integrated
+            self.scheduler = replay.Replay(trajectory.Trajectory(replay_path), fps=60, capture=self.hud_values)
+        elif threaded:
+            self.scheduler = worker.PhysicsWorker(self.system, fps=60, capture=self.hud_values).start()
+        else:
+            self.scheduler = scheduler.FrameScheduler(fps=60, capture=self.hud_values)
+        self.hud = render.Hud((width, height))
+        self.view = render.Camera(width, height, self.system.scale)
+        self.sprites = render.BodySprites(self.body_radii)
         
-    def world_to_screen(self, position):
-        screen_x = position[0] / self.system.scale + self.width // 2
-        screen_y = position[1]/ self.system.scale + self.height // 2
-        return int(screen_x), int(screen_y)
+    def world_to_screen(self, positions):
+        # world coordinates -> integer screen coordinates, a whole (N,3) array at once
+        return self.view.to_screen(positions)
 
-    def render_text(self):
-        font = pygame.font.Font(None, 42)
-        sun, mercury, earth = self.system.bodies[0], self.system.bodies[1], self.system.bodies[2]
-        sun_time_text = f"observer at rest (s): ({sun.time:.1e})"
-        mercury_time_text = f"observer - mercury(s): ({mercury.time - sun.time})"
-        earth_time_text = f"observer - earth(s): ({earth.time - sun.time})"
-        sun_surface= font.render(sun_time_text, True, (255, 255, 255))
-        mercury_surface = font.render(mercury_time_text, True, (255, 255, 255))
-        earth_surface = font.render(earth_time_text, True, (255, 255, 255))
-        self.screen.blit(sun_surface, (self.width - 700, 50))
-        self.screen.blit(mercury_surface, (self.width - 700, 80))
-        self.screen.blit(earth_surface, (self.width - 700, 110))
+    def body_radii(self, masses):
+        return np.maximum(2, (np.log2(masses) - 20).astype(int) / 6)
+
+    def hud_values(self, system):
+        # coordinate time, every clock's own (proper) time, how far each is
+        # behind coordinate time and the dilated positions, read off the system
+        # (on the physics thread when threaded)
+        clocks = system.clocks
+        return system.time, clocks.tau.copy(), clocks.lag.copy(), system.dilated_position.copy()
+
+    def render_text(self, values):
+        # composes the HUD overlay (readouts and clock labels) from hud_values, run()
+        # calls it whenever the HUD is due a refresh
+        self.hud.text(f"{self.scheduler.days_per_second():.1f} simulated days/s, {self.scheduler.steps} steps/frame", (10, self.height - 30))
+        observer_time, lag = values[0], values[2]
+        sun_time_text = f"observer at rest (s): ({observer_time:.1e})"
+        mercury_time_text = f"observer - mercury(s): ({lag[1]})"
+        earth_time_text = f"observer - earth(s): ({lag[2]})"
+        self.hud.text(sun_time_text, (self.width - 700, 50), size=42)
+        self.hud.text(mercury_time_text, (self.width - 700, 80), size=42)
+        self.hud.text(earth_time_text, (self.width - 700, 110), size=42)
+
+        labels = ["observer at rest", "rest - mercury", "rest - earth", "(all clocks: 360deg = 0.1s)"]
+        for i, label in enumerate(labels):
+            self.hud.text(label, (170, 95 + i * 120), size=32)
 
     def draw_clock(self, x, y, time, color):
         # Clock parameters
@@ -128,47 +148,58 @@ class Simulator:
         # Draw hand
         pygame.draw.line(self.screen, color, center, (end_x, end_y), 2)
 
-    def render_clocks(self):
+    def render_clocks(self, values):
         # Draw three clocks vertically on the left side
         sun, mercury, earth = self.system.bodies[0], self.system.bodies[1], self.system.bodies[2]
+        # each dial shows its clock's own proper time
+        _, mercury_time, earth_time = values[1][:3]
         
         # Draw clocks at different vertical positions
         self.draw_clock(50, 50, 0, sun.color)      # Sun clock
-        self.draw_clock(50, 170, mercury.time, mercury.color)  # Mercury clock
-        self.draw_clock(50, 290, earth.time, earth.color)    # Earth clock
-        
-        # Add labels
-        font = pygame.font.Font(None, 32)
-        labels = ["observer at rest", "rest - mercury", "rest - earth", "(all clocks: 360deg = 0.1s)"]
-        for i, label in enumerate(labels):
-            text = font.render(label, True, (255, 255, 255))
-            self.screen.blit(text, (170, 95 + i * 120))
+        self.draw_clock(50, 170, mercury_time, mercury.color)  # Mercury clock
+        self.draw_clock(50, 290, earth_time, earth.color)    # Earth clock
+        # their labels are part of the HUD (render_text)
     def run(self):
         while True:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    self.scheduler.stop()
+                    if self.autosave:
+                        self.autosave.save(self.system)
                     pygame.quit()
                     sys.exit()
-            self.system.verlet_step()
+                self.view.handle(event)
+                self.scheduler.handle(event)
+            # what to draw: positions (between the last two steps when paced), trails, HUD values
+            if self.autosave and self.autosave.due():
+                with self.scheduler.paused():
+                    self.autosave.save(self.system)
+            frame = self.scheduler.frame(self.system)
+            self.view.update(self.system.bodies, frame.position)
             self.screen.fill((0, 0, 0))
-            if self.system.bodies[0].time > 7000000:
-                self.system.dt = 100000
-            if self.system.bodies[0].time > 400000000:
-                self.system.dt = 10000
             
-            for i,body in enumerate(self.system.bodies):
-                pos = self.world_to_screen(body.position)
-                radius = max(2, int(np.log2(body.mass) - 20)/6)
-                #if body == self.system.bodies[0]:
-                #    radius = 1
+            # where each planet would be on its own (dilated) clock, under the planet
+            self.sprites.update(self.system.bodies)
+            dilated = frame.values[3]
+            for i, pos in enumerate(self.world_to_screen(dilated).tolist()):
                 if i != 0:
-                    pygame.draw.circle(self.screen, (200,200,200), self.world_to_screen(body.dilated_position), radius)
-                pygame.draw.circle(self.screen, body.color, pos, radius)
-            self.render_text() 
-            self.render_clocks()
+                    pygame.draw.circle(self.screen, (200,200,200), pos, self.sprites.radii[i])
+            self.sprites.draw(self.screen, self.view, self.system.bodies, frame.position)
+            self.render_clocks(frame.values)
+            if self.hud.begin():
+                self.render_text(frame.values)
+            self.hud.draw(self.screen)
             pygame.display.flip()
-            self.clock.tick(60000)
 
 if __name__ == "__main__":
-    sim = Simulator()
+    # the window's modules are only loaded here, importing the script for its
+    # GravitationalSystem (headless.py, ensemble.py) never touches pygame
+    import cli
+    import pygame
+    import render
+    import replay
+    import scheduler
+    import worker
+    args = cli.parser("time dilation demo").parse_args()
+    sim = Simulator(threaded=args.threaded, checkpoint_path=args.checkpoint, replay_path=args.replay)
     sim.run()
@@ -0,0 +1,84 @@
+#massless test particles (asteroids, spacecraft, dust)
+#tracers feel the massive bodies but pull on nothing, not even each other, so
+#they live in their own arrays outside the BodyStore: the bodies' force
+#kernels never see them, and a step costs O(N M) for M tracers around N bodies
+#on top of the bodies' own O(N^2), instead of O((N + M)^2) as ordinary bodies
+#usage:
+#    system.tracers = tracers.belt(system, 100000)
+#    system.verlet_step()   # steps the tracers too (nbody.GravitationalSystem.advance)
+import numpy as np
+
+class Tracers:
+    # position, velocity, acceleration: (M, dim) arrays (add() replaces them,
+    # re-fetch after adding). color: what they are drawn in.
+    # Each step the system takes, its tracers take a velocity verlet step
+    # against the bodies' positions at both ends of it, whatever integrator
+    # moves the bodies (second order then, like verlet itself). Accelerations
+    # come from system.calculate_tracer_acceleration (newtonian pull of the
+    # bodies); the ones at the end of a step are reused by the next, as
+    # integrators.Integrator does, while the bodies' masses and time stay the same
+    def __init__(self, position=None, velocity=None, dim=3, color=(160, 160, 160)):
+        self.position = np.zeros((0, dim)) if position is None else np.array(position, dtype=float)
+        dim = self.position.shape[1]
+        self.velocity = np.zeros((len(self.position), dim)) if velocity is None else np.array(velocity, dtype=float)
+        self.acceleration = np.zeros_like(self.position)
+        self.color = color
+        self.force_evaluations = 0
+        self._key = None
+
+    def __len__(self):
+        return len(self.position)
+
+    def add(self, position, velocity):
+        position = np.asarray(position, dtype=float).reshape(-1, self.position.shape[1])
+        self.position = np.concatenate([self.position, position])
+        self.velocity = np.concatenate([self.velocity, np.asarray(velocity, dtype=float).reshape(position.shape)])
+        self.acceleration = np.concatenate([self.acceleration, np.zeros_like(position)])
+        self._key = None
+
+    def invalidate(self):
+        self._key = None
+
+    def evaluate(self, system):
+        self.force_evaluations += 1
+        return system.calculate_tracer_acceleration(self.position)
+
+    def prepare(self, system):
+        # accelerations at the start of the system's next step, recomputed only
+        # if the bodies' masses, the time or the tracers changed
+        key = (system.bodies.version, system.time)
+        if self._key != key:
+            self.acceleration = self.evaluate(system)
+            self._key = key
+
+    def step(self, system, dt):
+        # once the bodies have taken their step of dt, from where prepare() left off
+        self.position += self.velocity * dt + 0.5 * self.acceleration * dt**2
+        accelerations = self.evaluate(system)
+        self.velocity += 0.5 * (self.acceleration + accelerations) * dt
+        self.acceleration = accelerations
+        self._key = (system.bodies.version, system.time)
+
+def belt(system, count, inner=3.3e11, outer=4.9e11, primary=0, inclination=0.1, seed=None,
+         color=(160, 160, 160)):
+    # count tracers on circular orbits around body `primary` between radii inner
+    # and outer (m, by default the main asteroid belt, 2.2 to 3.3 au), inclined
+    # by up to `inclination` radians (uniform in area, random longitudes);
+    # in 2d systems the belt is flat and inclination is ignored
+    rng = np.random.default_rng(seed)
+    bodies = system.bodies
+    dim = bodies.position.shape[1]
+    radius = np.sqrt(rng.uniform(inner**2, outer**2, count))
+    angle = rng.uniform(0, 2 * np.pi, count)
+    tilt = rng.uniform(-inclination, inclination, count) if dim == 3 else np.zeros(count)
+    speed = np.sqrt(system.G * bodies.mass[primary] / radius)
+    position = np.zeros((count, dim))
+    position[:, 0] = radius * np.cos(angle)
+    position[:, 1] = radius * np.sin(angle)
+    # the velocity turned out of the plane about the radius: the node is here
+    velocity = np.zeros((count, dim))
+    velocity[:, 0] = -speed * np.sin(angle) * np.cos(tilt)
+    velocity[:, 1] = speed * np.cos(angle) * np.cos(tilt)
+    if dim == 3:
+        velocity[:, 2] = speed * np.sin(tilt)
+    return Tracers(position + bodies.position[primary], velocity + bodies.velocity[primary], color=color)
@@ -0,0 +1,151 @@
+#preallocated ring buffers for body trails
+#one (capacity, length, dim) array holds every body's last `length` trail points,
+#recording a step is one vectorized write, nothing is allocated per step
+import numpy as np
+
+class TrailBuffer:
+    def __init__(self, capacity, length, dim=3, stride=1):
+        self.length = length
+        self.dim = dim
+        # record() keeps every stride-th call only
+        self.stride = stride
+        self._data = np.zeros((capacity, length, dim))
+        # per body: next slot to write, number of valid slots and points ever written
+        self._head = np.zeros(capacity, dtype=np.int64)
+        self._count = np.zeros(capacity, dtype=np.int64)
+        self._written = np.zeros(capacity, dtype=np.int64)
+        self._rows = np.arange(capacity)
+        self._calls = 0
+        self._n = 0
+        # bumped whenever trails are replaced or dropped (fill, clear), renderers redraw
+        self.generation = 0
+
+    def __len__(self):
+        return self._n
+
+    def grow(self, capacity):
+        for name in ("_data", "_head", "_count", "_written"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._n] = old[:self._n]
+            setattr(self, name, new)
+        self._rows = np.arange(capacity)
+
+    def append_row(self):
+        # a new body, with an empty trail
+        if self._n == len(self._data):
+            self.grow(max(1, 2 * len(self._data)))
+        self._head[self._n] = 0
+        self._count[self._n] = 0
+        self._written[self._n] = 0
+        self._n += 1
+
+    def move_row(self, source, target):
+        # body `source` now lives at `target` (BodyStore.remove's swap with the last row)
+        self._data[target] = self._data[source]
+        self._head[target] = self._head[source]
+        self._count[target] = self._count[source]
+        self._written[target] = self._written[source]
+
+    def pop_row(self):
+        self._n -= 1
+
+    def record(self, positions):
+        # positions (N,dim): one new point for every body, O(N) and no allocation
+        self._calls += 1
+        if self.length == 0 or self._calls % self.stride:
+            return
+        n = self._n
+        head = self._head[:n]
+        self._data[self._rows[:n], head] = positions
+        np.add(head, 1, out=head)
+        np.remainder(head, self.length, out=head)
+        count = self._count[:n]
+        np.add(count, 1, out=count)
+        np.minimum(count, self.length, out=count)
+        written = self._written[:n]
+        np.add(written, 1, out=written)
+
+    def push(self, i, point):
+        # one new point for body i only, e.g. a perihelion marker
+        if self.length == 0:
+            return
+        head = self._head[i]
+        self._data[i, head] = point
+        self._head[i] = (head + 1) % self.length
+        self._count[i] = min(self._count[i] + 1, self.length)
+        self._written[i] += 1
+
+    def clear(self, i=None):
+        # drops every body's trail (or body i's); renderers redraw, as after fill()
+        if i is None:
+            self._head[:] = 0
+            self._count[:] = 0
+        else:
+            self._head[i] = 0
+            self._count[i] = 0
+        self.generation += 1
+
+    def fill(self, points):
+        # replaces every body's trail with points (k, N, dim), oldest first (the
+        # last `length` of them are kept), e.g. recorded frames after a seek
+        if self.length == 0:
+            return
+        n = self._n
+        k = min(len(points), self.length)
+        self._data[:n, :k] = np.swapaxes(points[len(points) - k:], 0, 1)
+        self._head[:n] = k % self.length
+        self._count[:n] = k
+        self._written[:n] += k
+        self.generation += 1
+
+    def count(self, i):
+        return int(self._count[i])
+
+    def written(self):
+        # (N,) points ever written per body, lets a renderer find what is new
+        return self._written[:self._n]
+
+    def newest(self, index):
+        # (len(index), dim) newest point of each body in index (all must have one)
+        return self._data[index, (self._head[index] - 1) % self.length]
+
+    def latest(self, i, k):
+        # body i's newest k points (k <= count(i)), oldest first
+        head = self._head[i]
+        if k <= head:
+            return self._data[i, head - k:head]
+        return np.concatenate((self._data[i, self.length - (k - head):], self._data[i, :head]))
+
+    def points(self, i):
+        # zero-copy view of body i's valid points, oldest first until the buffer
+        # wraps, after that in slot order (fine for drawing dots)
+        return self._data[i, :self._count[i]]
+
+    def ordered(self, i):
+        # body i's points oldest first (a copy once the buffer has wrapped)
+        count = self._count[i]
+        if count < self.length:
+            return self._data[i, :count]
+        head = self._head[i]
+        return np.concatenate((self._data[i, head:], self._data[i, :head]))
+
+    def copy(self, out=None):
+        # a TrailBuffer with the same contents, written into out's arrays when
+        # they are big enough (snapshots for another thread, see worker.py)
+        n = self._n
+        if out is None or len(out._data) < n or out._data.shape[1:] != self._data.shape[1:]:
+            out = TrailBuffer(max(n, 1), self.length, self.dim, self.stride)
+        out._data[:n] = self._data[:n]
+        out._head[:n] = self._head[:n]
+        out._count[:n] = self._count[:n]
+        out._written[:n] = self._written[:n]
+        out._calls = self._calls
+        out._n = n
+        out.generation = self.generation
+        return out
+
+    def view(self):
+        # zero-copy (N, length, dim) buffer and (N,) valid counts for renderers:
+        # body i's valid points are buffer[i, :counts[i]]
+        return self._data[:self._n], self._count[:self._n]
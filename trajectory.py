@@ -0,0 +1,220 @@
+#append-only memory-mapped trajectory files
+#TrajectoryWriter streams sampled times, positions and (optionally) velocities
+#into a preallocated file, Trajectory reads it back zero-copy, so a multi-GB
+#run is never loaded into RAM: only the pages actually looked at are read.
+#layout: a small header page (magic, number of frames written so far, json
+#description) followed by fixed-size chunks of `chunk` frames each:
+#    time (chunk,) | position (chunk, n, dim) | velocity (chunk, n, dim)
+#the times of a chunk are contiguous, so the time index (every frame's time)
+#is read without touching the positions. The file grows a whole chunk at a
+#time, a sample is a memory copy into the mapped chunk (the OS writes it out
+#in the background) and never a system call
+#usage:
+#    writer = trajectory.TrajectoryWriter("run.traj", system.bodies)
+#    system.run(until=..., callback=writer.record, every=100)
+#    writer.close()
+#    run = trajectory.Trajectory("run.traj")
+#    run.times, run.position(i), run.body(3), run.at(t)
+import json
+import numpy as np
+
+MAGIC = b"NBTRAJ\x00\x01"
+# the header is padded to whole pages
+PAGE = 4096
+# magic, frames written, length of the json description
+PREFIX = 24
+
+def _chunk_dtype(chunk, n, dim, velocities):
+    fields = [("time", np.float64, (chunk,)), ("position", np.float64, (chunk, n, dim))]
+    if velocities:
+        fields.append(("velocity", np.float64, (chunk, n, dim)))
+    return np.dtype(fields)
+
+class TrajectoryWriter:
+    # bodies: the BodyStore sampled (its size must not change while recording),
+    # its masses and colors go into the header for viewers. metadata: anything
+    # else json can hold (scenario, dt, scale, ...). chunk: frames the file
+    # grows by at a time
+    def __init__(self, path, bodies, chunk=1024, velocities=True, metadata=None):
+        self.path = path
+        self.n = len(bodies)
+        self.dim = bodies.dim
+        self.chunk = chunk
+        self.velocities = velocities
+        self.frames = 0
+        description = {
+            "n": self.n, "dim": self.dim, "chunk": chunk, "velocities": velocities,
+            "metadata": dict(metadata or {}, mass=bodies.mass.tolist(),
+                             color=[list(body.color) for body in bodies]),
+        }
+        text = json.dumps(description).encode()
+        self._offset = -(-(PREFIX + len(text)) // PAGE) * PAGE
+        self._dtype = _chunk_dtype(chunk, self.n, self.dim, velocities)
+        self._file = open(path, "w+b")
+        self._file.write(MAGIC + np.int64(0).tobytes() + np.int64(len(text)).tobytes() + text)
+        self._file.truncate(self._offset)
+        self._count = np.memmap(self._file, dtype=np.int64, mode="r+", offset=len(MAGIC), shape=(1,))
+        self._chunks = 0
+        self._current = None
+        self._fields = None
+
+    def _grow(self):
+        # one more chunk at the end of the file, mapped for writing
+        offset = self._offset + self._chunks * self._dtype.itemsize
+        self._file.truncate(offset + self._dtype.itemsize)
+        self._current = np.memmap(self._file, dtype=self._dtype, mode="r+", offset=offset, shape=(1,))
+        # the chunk's fields, looked up once rather than on every append
+        self._fields = [self._current[name][0] for name in self._dtype.names]
+        self._chunks += 1
+
+    def append(self, time, position, velocity=None):
+        # one frame: position (and velocity) (n, dim)
+        slot = self.frames % self.chunk
+        if slot == 0:
+            self._grow()
+        fields = self._fields
+        fields[0][slot] = time
+        fields[1][slot] = position
+        if self.velocities:
+            fields[2][slot] = velocity
+        self.frames += 1
+        # last, so a reader of a live file never sees a frame half written
+        self._count[0] = self.frames
+
+    def record(self, system):
+        # a frame of the system's current state, fits GravitationalSystem.run's callback
+        bodies = system.bodies
+        if len(bodies) != self.n:
+            raise ValueError(f"{self.path}: recording {self.n} bodies, the system now has {len(bodies)}")
+        self.append(system.time, bodies.position, bodies.velocity)
+
+    def flush(self):
+        if self._current is not None:
+            self._current.flush()
+        self._count.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        self._current = None
+        self._fields = None
+        self._count = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class Trajectory:
+    # read-only, zero-copy view of a trajectory file (a live one too, see refresh())
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            prefix = f.read(PREFIX)
+            if prefix[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path}: not a trajectory file")
+            length = int(np.frombuffer(prefix, np.int64, 1, len(MAGIC) + 8)[0])
+            description = json.loads(f.read(length))
+        self.n = description["n"]
+        self.dim = description["dim"]
+        self.chunk = description["chunk"]
+        self.velocities = description["velocities"]
+        self.metadata = description["metadata"]
+        self._offset = -(-(PREFIX + length) // PAGE) * PAGE
+        self._dtype = _chunk_dtype(self.chunk, self.n, self.dim, self.velocities)
+        self._data = None
+        self._times = None
+        self.frames = 0
+        self.refresh()
+
+    def refresh(self):
+        # picks up frames written since (the writer may still be running)
+        frames = int(np.fromfile(self.path, np.int64, 1, offset=len(MAGIC))[0])
+        if frames != self.frames or self._data is None:
+            chunks = -(-frames // self.chunk)
+            self._data = np.memmap(self.path, dtype=self._dtype, mode="r", offset=self._offset,
+                                   shape=(chunks,)) if chunks else None
+            self.frames = frames
+            self._times = None
+        return self.frames
+
+    def __len__(self):
+        return self.frames
+
+    def _locate(self, i):
+        if not -self.frames <= i < self.frames:
+            raise IndexError(f"frame {i} out of range ({self.frames} frames)")
+        return divmod(i % self.frames, self.chunk)
+
+    @property
+    def times(self):
+        # (frames,) time of every frame, the index seeks go through; a small
+        # copy (8 bytes a frame) made once, it only reads the time blocks
+        if self._times is None:
+            if self._data is None:
+                self._times = np.zeros(0)
+            else:
+                self._times = np.ascontiguousarray(self._data["time"]).reshape(-1)[:self.frames]
+        return self._times
+
+    def time(self, i):
+        chunk, slot = self._locate(i)
+        return float(self._data[chunk]["time"][slot])
+
+    def position(self, i):
+        # (n, dim) zero-copy view of frame i's positions
+        chunk, slot = self._locate(i)
+        return self._data[chunk]["position"][slot]
+
+    def velocity(self, i):
+        if not self.velocities:
+            raise ValueError(f"{self.path}: no velocities recorded")
+        chunk, slot = self._locate(i)
+        return self._data[chunk]["velocity"][slot]
+
+    def positions(self, start=0, stop=None, field="position"):
+        # (k, n, dim) frames start..stop: a view when they lie in one chunk,
+        # a copy otherwise
+        stop = self.frames if stop is None else min(stop, self.frames)
+        if start >= stop:
+            return np.zeros((0, self.n, self.dim))
+        first, last = start // self.chunk, (stop - 1) // self.chunk
+        if first == last:
+            return self._data[first][field][start % self.chunk:start % self.chunk + stop - start]
+        return np.concatenate([self._data[c][field][max(start - c * self.chunk, 0):min(stop - c * self.chunk, self.chunk)]
+                               for c in range(first, last + 1)])
+
+    def body(self, j, start=0, stop=None, field="position"):
+        # (k, dim) one body over frames start..stop (reads only that body's rows)
+        stop = self.frames if stop is None else min(stop, self.frames)
+        if self._data is None or start >= stop:
+            return np.zeros((0, self.dim))
+        rows = self._data[field][:, :, j].reshape(-1, self.dim)
+        return np.array(rows[start:stop])
+
+    def index(self, t):
+        # the last frame at or before time t (0 before the first one)
+        return max(int(np.searchsorted(self.times, t, side="right")) - 1, 0)
+
+    def at(self, t, out=None):
+        # (n, dim) positions at time t, linearly interpolated between the frames
+        # around it (clamped to the first and last frame)
+        i = self.index(t)
+        times = self.times
+        if out is None:
+            out = np.empty((self.n, self.dim))
+        if i + 1 >= self.frames or t <= times[i]:
+            np.copyto(out, self.position(i))
+            return out
+        alpha = (t - times[i]) / (times[i + 1] - times[i])
+        before = self.position(i)
+        np.subtract(self.position(i + 1), before, out=out)
+        out *= alpha
+        out += before
+        return out
+
+    def close(self):
+        self._data = None
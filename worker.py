@@ -0,0 +1,176 @@
+#physics on a background thread
+#the worker steps the system as fast as it can (or at a fixed pace) and
+#publishes snapshots of what there is to draw; the pygame thread only ever
+#reads the latest snapshot, so a slow frame does not slow the physics and a
+#slow step does not freeze the window. The numpy force kernels release the
+#GIL, so stepping and drawing overlap
+import threading
+import time
+import numpy as np
+from scheduler import DAY, Frame
+try:
+    import pygame
+except ImportError:  # headless runs only need the physics
+    pygame = None
+
+class PhysicsWorker:
+    # Per frame, in place of FrameScheduler.frame (same interface):
+    #     frame = worker.frame(system)   # waits for the next frame time, then
+    #     ... draw frame ...             # the latest snapshot (a scheduler.Frame)
+    # Snapshots are double buffered: the worker writes one Frame while the
+    # pygame thread draws the other, and never writes the one handed out by
+    # the last frame() call, so a frame is immutable while it is drawn. The
+    # worker publishes when the last snapshot has been picked up, or at least
+    # every `interval` seconds, so copying costs at most one copy per frame
+    # plus 1/interval a second, not one per step.
+    # capture(system) -> Frame.values runs on the worker thread, the only
+    # place the system may be read while the worker runs.
+    # pace as for FrameScheduler: None steps as fast as possible, else
+    # simulated seconds per wall-clock second (no interpolation: the steps are
+    # usually far shorter than a frame). Keys as for FrameScheduler.
+    # how often the measured speed is refreshed, s
+    WINDOW = 0.5
+
+    def __init__(self, system, fps=60, pace=None, capture=None, interval=1 / 240):
+        self.system = system
+        self.fps = fps
+        self.pace = pace
+        self.capture = capture
+        self.interval = interval
+        # steps between the last two frames handed out
+        self.steps = 0
+        # simulated seconds per wall-clock second and steps per second, over
+        # the last WINDOW
+        self.speed = 0.0
+        self.rate = 0.0
+        self._buffers = (Frame(), Frame())
+        self._front = None
+        self._held = None
+        self._taken = True
+        self._published = 0.0
+        self._lock = threading.Lock()
+        # held by the worker around every step, see paused()
+        self._stepping = threading.Lock()
+        self._stop = threading.Event()
+        self._error = None
+        self._thread = None
+        # steps taken by the worker
+        self._steps = 0
+        # wall-clock and simulated time the pace is measured from
+        self._paced = None
+        self._next = None
+        self._last = 0
+        self._since = None
+        self._window = (0.0, 0)
+
+    def start(self):
+        # publishes the starting state, then steps on a daemon thread
+        self._paced = (time.perf_counter(), self.system.time)
+        self._publish()
+        self._thread = threading.Thread(target=self._run, name="physics", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        system = self.system
+        try:
+            while not self._stop.is_set():
+                pace = self.pace
+                if pace is not None:
+                    wall, simulated = self._paced
+                    ahead = (system.time - simulated) / pace - (time.perf_counter() - wall)
+                    if ahead > 1e-3:
+                        time.sleep(min(ahead, 0.05))
+                        continue
+                with self._stepping:
+                    system.verlet_step()
+                    self._steps += 1
+                    if self._taken or time.perf_counter() - self._published >= self.interval:
+                        self._publish()
+        except BaseException as error:  # handed to the pygame thread by frame()
+            self._error = error
+
+    def _publish(self):
+        system = self.system
+        with self._lock:
+            frame = self._buffers[0] if self._buffers[0] is not self._held else self._buffers[1]
+            positions = system.bodies.position
+            if frame.position is None or frame.position.shape != positions.shape:
+                frame.position = np.empty_like(positions)
+            np.copyto(frame.position, positions)
+            frame.trails = system.bodies.trails.copy(frame.trails)
+            if system.tracers is None:
+                frame.tracers = None
+            else:
+                tracers = system.tracers.position
+                if frame.tracers is None or frame.tracers.shape != tracers.shape:
+                    frame.tracers = np.empty_like(tracers)
+                np.copyto(frame.tracers, tracers)
+            frame.time = system.time
+            frame.steps = self._steps
+            frame.values = self.capture(system) if self.capture is not None else None
+            self._front = frame
+            self._taken = False
+            self._published = time.perf_counter()
+
+    def paused(self):
+        # `with worker.paused():` holds the worker between two steps, so the
+        # pygame thread may read the live system (e.g. to save a checkpoint)
+        return self._stepping
+
+    def latest(self):
+        # the newest snapshot, which stays untouched until the next call
+        if self._error is not None:
+            raise self._error
+        with self._lock:
+            self._held = self._front
+            self._taken = True
+        return self._held
+
+    def frame(self, system=None):
+        # paces the pygame loop at fps (the physics no longer does), then the
+        # latest snapshot
+        now = time.perf_counter()
+        if self._next is not None and self._next - now > 1e-3:
+            time.sleep(self._next - now)
+            now = time.perf_counter()
+        self._next = max(now, (self._next or now)) + 1.0 / self.fps
+        frame = self.latest()
+        self.steps = frame.steps - self._last
+        self._last = frame.steps
+        if self._since is None:
+            self._since, self._window = now, (frame.time, frame.steps)
+        elif now - self._since >= self.WINDOW:
+            self.speed = (frame.time - self._window[0]) / (now - self._since)
+            self.rate = (frame.steps - self._window[1]) / (now - self._since)
+            self._since, self._window = now, (frame.time, frame.steps)
+        return frame
+
+    def set_pace(self, pace):
+        # the pace is measured from now on
+        self._paced = (time.perf_counter(), self.system.time)
+        self.pace = pace
+
+    def days_per_second(self):
+        # simulated days per wall-clock second
+        return self.speed / DAY
+
+    def handle(self, event):
+        # True when the event was a speed control
+        if event.type != pygame.KEYDOWN:
+            return False
+        if event.key == pygame.K_COMMA and (self.pace or self.speed):
+            self.set_pace((self.pace or self.speed) / 2)
+        elif event.key == pygame.K_PERIOD and self.pace is not None:
+            self.set_pace(self.pace * 2)
+        elif event.key == pygame.K_SLASH:
+            self.set_pace(None)
+        else:
+            return False
+        return True